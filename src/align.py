@@ -0,0 +1,229 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- align.py
+Created on Oct 17, 2026
+
+Align the sensors of a session onto one uniform time grid. Each sensor is
+linearly interpolated (or matched to its nearest sample within a
+tolerance) at the grid timestamps, which absorbs the Shimmer timestamp
+jitter. Grid points that fall in a dropout longer than max_gap are left
+NaN and the dropouts are reported per sensor.
+
+Usage:
+python align.py <Timestamp_Aligned path> [out.csv]
+
+Dependencies:
+numpy, pandas
+'''
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import binary_io
+import utils
+
+# grid spacing of the Shimmer rate [ms]
+ALIGN_PERIOD_MS = 1000.0 / utils.SHIMMER_FS
+# nearest sample must be within half a period
+ALIGN_TOLERANCE_MS = ALIGN_PERIOD_MS / 2
+# dropouts longer than this (about 5 samples) are not interpolated [ms]
+ALIGN_MAX_GAP_MS = 100.0
+SENSOR_LOCS = ["HIP", "LA", "RA", "DEV"]
+
+def sorted_unique(index, values):
+    '''
+    The strictly increasing timestamps and their rows, the first row is
+    kept for repeated timestamps.
+
+    Keyword arguments:
+    index -- the timestamps
+    values -- (samples, channels) array
+
+    '''
+    index = np.asarray(index, dtype=np.float64)
+    ts, first_pos = np.unique(index, return_index=True)
+    
+    return ts, values[first_pos]
+
+def find_gaps(index, max_gap=ALIGN_MAX_GAP_MS):
+    '''
+    The (last sample before, first sample after) timestamps of every
+    dropout longer than max_gap.
+
+    Keyword arguments:
+    index -- strictly increasing timestamps
+    max_gap -- the longest gap that is not a dropout [ms]
+
+    '''
+    index = np.asarray(index)
+    pos = np.flatnonzero(np.diff(index) > max_gap)
+    
+    return zip(index[pos], index[pos + 1])
+
+def uniform_grid(start, end, period=ALIGN_PERIOD_MS):
+    '''
+    Timestamps from start to end (inclusive) every period.
+
+    Keyword arguments:
+    start -- first timestamp
+    end -- last timestamp
+    period -- the grid spacing
+
+    '''
+    return start + period * np.arange(int(np.floor((end - start) / period)) + 1)
+
+def interpolate_onto(ts, values, grid, max_gap=ALIGN_MAX_GAP_MS):
+    '''
+    Linear interpolation of all channels at once onto the grid. Grid points
+    outside ts or inside a dropout longer than max_gap are NaN.
+
+    Keyword arguments:
+    ts -- strictly increasing timestamps
+    values -- (samples, channels) array
+    grid -- the timestamps to interpolate at
+    max_gap -- the longest gap that is interpolated [ms]
+
+    '''
+    out = np.full((len(grid), values.shape[1]), np.nan)
+    if len(ts) < 2:
+        return out
+    # sample before each grid point, clipped so pos + 1 is valid
+    pos = np.clip(np.searchsorted(ts, grid, side='right') - 1, 0, len(ts) - 2)
+    left, right = ts[pos], ts[pos + 1]
+    valid = (grid >= ts[0]) & (grid <= ts[-1]) & (right - left <= max_gap)
+    weight = ((grid - left) / (right - left))[valid, None]
+    out[valid] = values[pos[valid]] * (1 - weight) + values[pos[valid] + 1] * weight
+    
+    return out
+
+def nearest_onto(ts, values, grid, tolerance=ALIGN_TOLERANCE_MS):
+    '''
+    As-of match of all channels at once: each grid point takes the nearest
+    sample within tolerance, otherwise NaN.
+
+    Keyword arguments:
+    ts -- strictly increasing timestamps
+    values -- (samples, channels) array
+    grid -- the timestamps to match
+    tolerance -- the largest distance to a matched sample [ms]
+
+    '''
+    out = np.full((len(grid), values.shape[1]), np.nan)
+    if len(ts) == 0:
+        return out
+    after = np.clip(np.searchsorted(ts, grid), 1, len(ts) - 1) if len(ts) > 1 else np.zeros(len(grid), int)
+    before = np.maximum(after - 1, 0)
+    pos = np.where(np.abs(grid - ts[before]) <= np.abs(ts[after] - grid), before, after)
+    valid = np.abs(ts[pos] - grid) <= tolerance
+    out[valid] = values[pos[valid]]
+    
+    return out
+
+def align(frames, period=ALIGN_PERIOD_MS, method="interpolate", tolerance=ALIGN_TOLERANCE_MS, \
+          max_gap=ALIGN_MAX_GAP_MS, span="intersection"):
+    '''
+    Put several sensors on one uniform grid. Returns the aligned frame,
+    indexed by the grid with "<sensor_loc> <channel>" columns, and the
+    dropouts of each sensor.
+
+    Keyword arguments:
+    frames -- dict of sensor_loc -> data frame
+    period -- the grid spacing [ms]
+    method -- "interpolate" or "nearest"
+    tolerance -- for "nearest", the largest distance to a matched sample [ms]
+    max_gap -- for "interpolate", the longest gap that is interpolated;
+               longer gaps are reported for both methods [ms]
+    span -- "intersection" covers the time all sensors recorded, "union"
+            the time any sensor recorded
+
+    '''
+    if method not in ("interpolate", "nearest"):
+        raise ValueError("unknown alignment method: %s" %(method))
+    if span not in ("intersection", "union"):
+        raise ValueError("unknown alignment span: %s" %(span))
+    if not frames:
+        raise ValueError("no sensor frames to align")
+    sensor_locs = sorted(frames)
+    for sensor_loc in sensor_locs:
+        if len(frames[sensor_loc]) == 0:
+            raise ValueError("no samples to align for %s" %(sensor_loc))
+        # NaN sorts after every timestamp and would corrupt the grid and the gaps
+        n_nan = np.isnan(np.asarray(frames[sensor_loc].index, dtype=np.float64)).sum()
+        if n_nan:
+            raise ValueError("%d NaN timestamps in %s" %(n_nan, sensor_loc))
+    series = dict((sensor_loc, sorted_unique(frames[sensor_loc].index, frames[sensor_loc].values)) \
+                  for sensor_loc in sensor_locs)
+    starts = [series[sensor_loc][0][0] for sensor_loc in sensor_locs]
+    ends = [series[sensor_loc][0][-1] for sensor_loc in sensor_locs]
+    if span == "intersection":
+        start, end = max(starts), min(ends)
+    else:
+        start, end = min(starts), max(ends)
+    if end < start:
+        raise ValueError("the sensors do not overlap in time")
+    grid = uniform_grid(start, end, period)
+    
+    blocks, columns, gaps = [], [], {}
+    for sensor_loc in sensor_locs:
+        ts, values = series[sensor_loc]
+        if method == "interpolate":
+            blocks.append(interpolate_onto(ts, values, grid, max_gap))
+        else:
+            blocks.append(nearest_onto(ts, values, grid, tolerance))
+        columns.extend(sensor_loc + " " + str(col) for col in frames[sensor_loc].columns)
+        gaps[sensor_loc] = find_gaps(ts, max_gap)
+        for gap_start, gap_end in gaps[sensor_loc]:
+            print "%s dropout of %.1lf ms at %lf" %(sensor_loc, gap_end - gap_start, gap_start)
+    
+    aligned_df = pd.DataFrame(np.hstack(blocks), index=pd.Index(grid, name=frames[sensor_locs[0]].index.name), \
+                              columns=columns)
+    return aligned_df, gaps
+
+def align_session(path, sensor_locs=SENSOR_LOCS, out_fname=None, **kwargs):
+    '''
+    Align the oriented and filtered files of a session. Sensors without a
+    file are skipped. Returns the align() result.
+
+    Keyword arguments:
+    path -- the session's Timestamp_Aligned directory
+    sensor_locs -- the sensors to align
+    out_fname -- optional csv to write the aligned frame to
+    kwargs -- passed to align()
+
+    '''
+    filtered_path = os.path.join(os.path.split(path)[0], "Filtered_Ankle_Corrected")
+    frames = {}
+    for sensor_loc in sensor_locs:
+        fname = os.path.join(filtered_path, sensor_loc + "_oriented_filtered.csv")
+        if binary_io.existing(fname) is not None:
+            frames[sensor_loc] = utils.read_shimmer(fname)
+    
+    aligned_df, gaps = align(frames, **kwargs)
+    if out_fname is not None:
+        aligned_df.to_csv(out_fname)
+    return aligned_df, gaps
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(1)
+    align_session(sys.argv[1], out_fname=sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,297 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- batch.py
+Created on Oct 17, 2026
+
+Run the orient/filter and chop stages over every session of the
+Participant_Data tree on a process pool. A session's chop job is only
+submitted once its LA, RA, HIP and DEV jobs have finished successfully,
+and a failing job only affects its own session. Stages whose inputs are
+unchanged since their last successful run are skipped (see rebuild.py).
+A job whose times could not be replayed or confidently detected reports
+needs_review instead of failing; its candidates are saved in the notes
+for an interactive run (see utils.NeedsReview).
+With --sequential the sessions run one at a time in this process while
+the next sessions' files are read in the background (see prefetch.py).
+The cohort catalog in the Participant_Data directory is updated at the
+start of a run and a session's entries again after each of its jobs, so
+the files a job wrote (filtered outputs, trials) are listed for the jobs
+that follow; the lookups inside the jobs only read it (see catalog.py).
+
+Usage:
+python batch.py <Participant_Data path> [workers] [--force] [--dry-run] [--sequential]
+
+Dependencies:
+pandas
+'''
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from collections import namedtuple
+
+import catalog
+import main
+import prefetch
+import rebuild
+import utils
+
+SENSOR_STAGES = ["LA", "RA", "HIP", "DEV"]
+CHOP_STAGE = "CHOP"
+CHOP_SENSOR_LOCS = ["LA", "RA", "DEV"]
+
+Job = namedtuple("Job", ["session", "stage", "func", "args"])
+JobResult = namedtuple("JobResult", ["session", "stage", "status", "seconds", "error"])
+
+def find_sessions(root):
+    '''
+    Find every Timestamp_Aligned session directory below root.
+
+    Keyword arguments:
+    root -- the Participant_Data directory
+
+    '''
+    sessions = []
+    for dirpath, dirnames, _ in os.walk(root):
+        if "Timestamp_Aligned" in dirnames:
+            sessions.append(os.path.join(dirpath, "Timestamp_Aligned"))
+        # sessions are not nested, skip the data directories themselves
+        dirnames[:] = [d for d in dirnames if d not in ("Timestamp_Aligned", \
+                                                        "Filtered_Ankle_Corrected", "Trials")]
+    
+    return sorted(sessions)
+
+def build_jobs(path, stages=SENSOR_STAGES, frames=None):
+    '''
+    The orient and filter jobs of one session. Jobs run headless, replaying
+    the section times saved by an earlier interactive run.
+
+    Keyword arguments:
+    path -- the session's Timestamp_Aligned directory
+    stages -- the sensor locations to process
+    frames -- already read sensor files, sensor_loc -> data frame
+
+    '''
+    frames = {} if frames is None else frames
+    funcs = {"LA": (main.orient_filter_shank, (path, "LA", True, True, frames.get("LA"))),
+             "RA": (main.orient_filter_shank, (path, "RA", True, True, frames.get("RA"))),
+             "HIP": (main.orient_filter_COM, (path, None, True, True, frames.get("HIP"))),
+             "DEV": (main.orient_filter_assistive_device, (path, None, True, True, frames.get("DEV")))}
+    
+    return [Job(path, stage, funcs[stage][0], funcs[stage][1]) for stage in stages]
+
+def build_chop_job(path):
+    '''
+    The chop job of one session, run after its filter jobs.
+
+    Keyword arguments:
+    path -- the session's Timestamp_Aligned directory
+
+    '''
+    return Job(path, CHOP_STAGE, main.chop_data, (path, CHOP_SENSOR_LOCS, True))
+
+def run_job(job):
+    '''
+    Run one job and report its status ("ok", "needs_review" or "failed")
+    and wall time instead of raising.
+
+    Keyword arguments:
+    job -- the Job to run
+
+    '''
+    start = time.time()
+    try:
+        job.func(*job.args)
+        rebuild.record(job.session, job.stage)
+        update_session_catalog(job.session)
+    except utils.NeedsReview as e:
+        return JobResult(job.session, job.stage, "needs_review", time.time() - start, str(e))
+    except Exception:
+        return JobResult(job.session, job.stage, "failed", time.time() - start, \
+                         traceback.format_exc())
+    
+    return JobResult(job.session, job.stage, "ok", time.time() - start, None)
+
+def print_result(result):
+    '''
+    Print a one line job report, plus the traceback of a failed job or
+    the reason a job needs review.
+
+    Keyword arguments:
+    result -- the JobResult
+
+    '''
+    print "[%-12s] %-5s %8.2lfs  %s" %(result.status, result.stage, result.seconds, result.session)
+    if result.error is not None:
+        print result.error
+
+def update_catalog(root):
+    '''
+    Create or update the cohort catalog of root.
+
+    Keyword arguments:
+    root -- the Participant_Data directory
+
+    '''
+    cohort = catalog.Catalog(root)
+    print "catalog: %d files indexed, %d removed" %(cohort.update())
+    cohort.close()
+
+def update_session_catalog(path):
+    '''
+    Update the catalog entries of one session, if it is in a catalog.
+
+    Keyword arguments:
+    path -- the session's Timestamp_Aligned directory
+
+    '''
+    cohort = catalog.find_catalog(path)
+    if cohort is None:
+        return
+    try:
+        cohort.update(os.path.dirname(os.path.abspath(path)))
+    finally:
+        cohort.close()
+
+def run_cohort(root, workers=None, stages=SENSOR_STAGES, chop=True, poll_interval=0.5, \
+               force=False, dry_run=False):
+    '''
+    Process every session below root on a pool of worker processes.
+    Returns the JobResults in completion order, or with dry_run the
+    (session, stages) that would run.
+
+    Keyword arguments:
+    root -- the Participant_Data directory
+    workers -- number of worker processes, defaults to the cpu count
+    stages -- the sensor locations to orient and filter
+    chop -- chop each session into trials after its sensors are filtered
+    poll_interval -- seconds between checks for finished jobs
+    force -- rerun stages whose inputs are unchanged
+    dry_run -- only report the stages that would run
+
+    '''
+    sessions = find_sessions(root)
+    print "run_cohort(): %d sessions below %s" %(len(sessions), root)
+    # the planning only reads the catalog, each job updates its session's entries
+    if not dry_run:
+        update_catalog(root)
+    plans = [(path, rebuild.plan(path, stages, chop, force)) for path in sessions]
+    if dry_run:
+        for path, todo in plans:
+            print "%s: %s" %(path, ", ".join(todo) if todo else "up to date")
+        return plans
+    
+    pool = multiprocessing.Pool(workers)
+    results = []
+    # session -> outstanding filter AsyncResults
+    pending = {}
+    chop_pending = []
+    for path, todo in plans:
+        if not todo:
+            continue
+        if todo == [CHOP_STAGE]:
+            chop_pending.append(pool.apply_async(run_job, (build_chop_job(path),)))
+            continue
+        todo_stages = [stage for stage in todo if stage != CHOP_STAGE]
+        pending[path] = [pool.apply_async(run_job, (job,)) for job in build_jobs(path, todo_stages)]
+    
+    try:
+        while pending or chop_pending:
+            time.sleep(poll_interval)
+            for path in list(pending):
+                if not all(res.ready() for res in pending[path]):
+                    continue
+                session_results = [res.get() for res in pending.pop(path)]
+                for result in session_results:
+                    print_result(result)
+                results.extend(session_results)
+                if not chop:
+                    continue
+                if all(result.status == "ok" for result in session_results):
+                    chop_pending.append(pool.apply_async(run_job, (build_chop_job(path),)))
+                else:
+                    result = JobResult(path, CHOP_STAGE, "skipped", 0.0, None)
+                    print_result(result)
+                    results.append(result)
+            
+            for res in [res for res in chop_pending if res.ready()]:
+                chop_pending.remove(res)
+                print_result(res.get())
+                results.append(res.get())
+    finally:
+        pool.close()
+        pool.join()
+    
+    failed = [result for result in results if result.status != "ok"]
+    review = [result for result in results if result.status == "needs_review"]
+    print "run_cohort(): %d jobs, %d not ok (%d need review), %d sessions up to date" \
+        %(len(results), len(failed), len(review), len([todo for _, todo in plans if not todo]))
+    return results
+
+def run_sequential(root, stages=SENSOR_STAGES, chop=True, force=False, \
+                   depth=prefetch.PREFETCH_DEPTH, max_bytes=prefetch.PREFETCH_MAX_BYTES):
+    '''
+    Process the sessions below root one at a time in this process, reading
+    the next sessions' files in the background. Returns the JobResults.
+
+    Keyword arguments:
+    root -- the Participant_Data directory
+    stages -- the sensor locations to orient and filter
+    chop -- chop each session into trials after its sensors are filtered
+    force -- rerun stages whose inputs are unchanged
+    depth -- the most sessions read ahead
+    max_bytes -- the memory budget of the sessions read ahead
+
+    '''
+    sessions = find_sessions(root)
+    print "run_sequential(): %d sessions below %s" %(len(sessions), root)
+    update_catalog(root)
+    plans = dict((path, rebuild.plan(path, stages, chop, force)) for path in sessions)
+    todo_sessions = [path for path in sessions if plans[path]]
+    results = []
+    for path, frames in prefetch.SessionPrefetcher(todo_sessions, depth, max_bytes=max_bytes, stages=plans):
+        todo_stages = [stage for stage in plans[path] if stage != CHOP_STAGE]
+        session_results = [run_job(job) for job in build_jobs(path, todo_stages, frames)]
+        if CHOP_STAGE in plans[path]:
+            if all(result.status == "ok" for result in session_results):
+                session_results.append(run_job(build_chop_job(path)))
+            else:
+                session_results.append(JobResult(path, CHOP_STAGE, "skipped", 0.0, None))
+        for result in session_results:
+            print_result(result)
+        results.extend(session_results)
+    
+    failed = [result for result in results if result.status != "ok"]
+    review = [result for result in results if result.status == "needs_review"]
+    print "run_sequential(): %d jobs, %d not ok (%d need review), %d sessions up to date" \
+        %(len(results), len(failed), len(review), len(sessions) - len(todo_sessions))
+    return results
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(1)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if "--sequential" in sys.argv:
+        run_sequential(args[0], force="--force" in sys.argv)
+        sys.exit(0)
+    run_cohort(args[0], int(args[1]) if len(args) > 1 else None, \
+               force="--force" in sys.argv, dry_run="--dry-run" in sys.argv)
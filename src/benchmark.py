@@ -0,0 +1,328 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- benchmark.py
+Created on Oct 17, 2026
+
+Stage level benchmarks on synthetic recordings (see synthetic.py). Each
+stage is timed at several recording lengths and the results are saved as
+json so a later run can be compared against a saved baseline. The float32
+precision mode is timed against float64 and its deviation is checked
+against utils.FLOAT32_TOLERANCE, and the fft filtering engine is timed
+against sosfiltfilt and checked against utils.FFT_FILTER_TOLERANCE.
+
+Usage:
+python benchmark.py <results.json> [baseline.json]
+python benchmark.py --check-precision <Shimmer csv> [sensor_loc]
+
+Dependencies:
+numpy, pandas, scipy
+'''
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import scipy
+
+import utils
+import pipeline
+import synthetic
+
+# recording lengths [minutes]
+SIZES_MIN = [10, 60, 240]
+REPEATS = 3
+# a stage is a regression if it is this much slower than the baseline
+REGRESSION_RATIO = 1.25
+# stages faster than this in the baseline are too noisy to compare [s]
+REGRESSION_MIN_SECONDS = 0.005
+
+def time_stage(func, repeats=REPEATS, setup=None):
+    '''
+    Best wall time of repeats calls of func [s].
+
+    Keyword arguments:
+    func -- the stage, called with the result of setup() if given
+    repeats -- number of timed calls
+    setup -- optional untimed function returning the argument for func
+
+    '''
+    best = None
+    for _ in range(repeats):
+        arg = setup() if setup is not None else None
+        start = time.time()
+        func(arg) if setup is not None else func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    
+    return best
+
+def stage_benchmarks(df, fname, tmp_path):
+    '''
+    The (name, func, setup) stages to time on one recording.
+
+    Keyword arguments:
+    df -- the recording
+    fname -- its csv, used as the header source
+    tmp_path -- directory for output files
+
+    '''
+    fs = utils.SHIMMER_FS
+    horiz_df = df.iloc[:int(synthetic.CALIBRATION_SEC * fs)]
+    vert_df = df.iloc[int(synthetic.CALIBRATION_SEC * fs):int(2 * synthetic.CALIBRATION_SEC * fs)]
+    axes_df = pd.DataFrame({"orig": ["Z", "Y", "X"], "modifier": [-1, 1, 1]}, \
+                           index=pd.Index(["X", "Y", "Z"], name="new"))
+    queries = np.linspace(df.index[0], df.index[-1], 4)
+    trial_times = (df.index[len(df) // 5], df.index[2 * len(df) // 5], \
+                   df.index[3 * len(df) // 5], df.index[4 * len(df) // 5])
+    out_fname = os.path.join(tmp_path, "out.csv")
+    
+    return [("closest_timestamp", lambda: [utils.closest_timestamp(df.index, q) for q in queries], None),
+            ("TimestampLookup", lambda: utils.TimestampLookup(df.index).nearest(queries), None),
+            ("compute_avg_accel_norm", lambda: utils.compute_avg_accel_norm(df), None),
+            ("apply_filter", lambda d: utils.apply_filter(d, "LA"), df.copy),
+            ("orient_shank", lambda: utils.orient_shank(horiz_df, vert_df, df, "LA"), None),
+            ("orient_COM", lambda: utils.orient_COM(df), None),
+            ("orient_assistive_device", lambda: utils.orient_assistive_device(df, axes_df), None),
+            ("chop_dependent_data", lambda: utils.chop_dependent_data(fname, out_fname, out_fname, \
+                                                                      trial_times), None),
+            ("write_data", lambda: utils.write_data(fname, out_fname, df), None),
+            ("read_shimmer", lambda: utils.read_shimmer(fname, use_cache=False), None)]
+
+def precision_deviation(fname, sensor_loc="LA"):
+    '''
+    Max abs deviation of the float32 orient_filter() output of a recording
+    from the float64 output, relative to each channel's float64 peak
+    magnitude.
+
+    Keyword arguments:
+    fname -- a Shimmer csv
+    sensor_loc -- selects the filters
+
+    '''
+    precision = utils._precision
+    outputs = {}
+    try:
+        for mode in ["float64", "float32"]:
+            utils.set_precision(mode)
+            df = utils.read_shimmer(fname, use_cache=False)
+            outputs[mode] = pipeline.orient_filter(df, sensor_loc, utils.COM_ROTATION)[0].values
+    finally:
+        utils.set_precision(precision)
+    
+    ref = outputs["float64"]
+    deviation = np.abs(outputs["float32"].astype(np.float64) - ref).max(axis=0) / np.abs(ref).max(axis=0)
+    return float(deviation.max())
+
+def check_precision(fname, sensor_loc="LA", tolerance=utils.FLOAT32_TOLERANCE):
+    '''
+    Raise ValueError if the float32 output of a recording deviates from the
+    float64 output by more than tolerance (see precision_deviation()).
+    Returns the deviation.
+
+    Keyword arguments:
+    fname -- a Shimmer csv
+    sensor_loc -- selects the filters
+    tolerance -- allowed relative deviation
+
+    '''
+    deviation = precision_deviation(fname, sensor_loc)
+    if deviation > tolerance:
+        raise ValueError("float32 output of %s deviates by %.3g, tolerance %.3g" \
+                         %(fname, deviation, tolerance))
+    return deviation
+
+def precision_benchmarks(fname, repeats=REPEATS):
+    '''
+    Time reading (from the cache) plus orient_filter() in float64 and
+    float32 precision. Returns the result rows, with the frame and working
+    memory of each mode, and the float32 deviation from precision_deviation().
+
+    Keyword arguments:
+    fname -- the recording's csv
+    repeats -- timed calls per mode, the best is kept
+
+    '''
+    precision = utils._precision
+    rows = []
+    try:
+        for mode in ["float64", "float32"]:
+            utils.set_precision(mode)
+            run = lambda: pipeline.orient_filter(utils.read_shimmer(fname), "LA", utils.COM_ROTATION)[0]
+            out_df = run()
+            n_rows = len(out_df)
+            seconds = time_stage(run, repeats)
+            rows.append({"stage": "orient_filter " + mode, "rows": n_rows, "seconds": seconds, \
+                         "rows_per_sec": n_rows / seconds if seconds > 0 else None, \
+                         "frame_mb": out_df.values.nbytes / 1e6, \
+                         "work_mb": pipeline.estimate_bytes(n_rows, False) / 1e6})
+    finally:
+        utils.set_precision(precision)
+    
+    return rows, precision_deviation(fname)
+
+def engine_benchmarks(df, repeats=REPEATS):
+    '''
+    Time utils.filter_channels() with the sos and fft engines for the HIP
+    and LA filters. Returns the result rows and the fft engine's max abs
+    deviation from sos relative to each channel's peak magnitude.
+
+    Keyword arguments:
+    df -- the recording
+    repeats -- timed calls per engine, the best is kept
+
+    '''
+    labels = utils.accel_labels + utils.gyro_labels
+    setup = lambda: np.array(df[labels].values, dtype=np.float64, order='F')
+    rows, deviation = [], 0.0
+    for sensor_loc in ["HIP", "LA"]:
+        outputs = {}
+        for engine in utils.FILTER_ENGINES:
+            run = lambda buf: utils.filter_channels(buf, sensor_loc, engine=engine)
+            outputs[engine] = run(setup())
+            seconds = time_stage(run, repeats, setup)
+            rows.append({"stage": "filter_channels %s %s" %(sensor_loc, engine), "rows": len(df), \
+                         "seconds": seconds, "rows_per_sec": len(df) / seconds if seconds > 0 else None})
+        ref = outputs["sos"]
+        deviation = max(deviation, float((np.abs(outputs["fft"] - ref).max(axis=0) \
+                                          / np.abs(ref).max(axis=0)).max()))
+    
+    return rows, deviation
+
+def run_benchmarks(sizes_min=SIZES_MIN, repeats=REPEATS):
+    '''
+    Time every stage at every recording length. Returns the results dict.
+
+    Keyword arguments:
+    sizes_min -- recording lengths [minutes]
+    repeats -- timed calls per stage, the best is kept
+
+    '''
+    results = {"meta": {"python": platform.python_version(),
+                        "numpy": np.__version__,
+                        "pandas": pd.__version__,
+                        "scipy": scipy.__version__,
+                        "machine": platform.machine(),
+                        "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+               "results": [],
+               "precision": [],
+               "engine": []}
+    tmp_path = tempfile.mkdtemp()
+    try:
+        for minutes in sizes_min:
+            fname = os.path.join(tmp_path, "LA_%dmin.csv" %(minutes))
+            synthetic.generate(fname, minutes * 60.0)
+            df = utils.read_shimmer(fname, use_cache=False)
+            for name, func, setup in stage_benchmarks(df, fname, tmp_path):
+                seconds = time_stage(func, repeats, setup)
+                results["results"].append({"stage": name, "minutes": minutes, "rows": len(df), \
+                                           "seconds": seconds, \
+                                           "rows_per_sec": len(df) / seconds if seconds > 0 else None})
+                print "%-24s %5d min %9d rows %9.4lfs" %(name, minutes, len(df), seconds)
+            
+            rows, deviation = precision_benchmarks(fname, repeats)
+            for row in rows:
+                row["minutes"] = minutes
+                results["results"].append(row)
+                print "%-24s %5d min %9d rows %9.4lfs %8.1lf MB frame %8.1lf MB work" \
+                    %(row["stage"], minutes, row["rows"], row["seconds"], row["frame_mb"], row["work_mb"])
+            results["precision"].append({"minutes": minutes, "max_deviation": deviation, \
+                                         "tolerance": utils.FLOAT32_TOLERANCE})
+            print "float32 max deviation %5d min %.3g (tolerance %.3g)" \
+                %(minutes, deviation, utils.FLOAT32_TOLERANCE)
+            
+            rows, deviation = engine_benchmarks(df, repeats)
+            for row in rows:
+                row["minutes"] = minutes
+                results["results"].append(row)
+                print "%-24s %5d min %9d rows %9.4lfs" %(row["stage"], minutes, row["rows"], row["seconds"])
+            results["engine"].append({"minutes": minutes, "max_deviation": deviation, \
+                                      "tolerance": utils.FFT_FILTER_TOLERANCE})
+            print "fft engine max deviation %5d min %.3g (tolerance %.3g)" \
+                %(minutes, deviation, utils.FFT_FILTER_TOLERANCE)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    
+    return results
+
+def save_results(results, fname):
+    '''
+    Save benchmark results as json.
+
+    Keyword arguments:
+    results -- the run_benchmarks() dict
+    fname -- the output file
+
+    '''
+    fout = open(fname, "w")
+    json.dump(results, fout, indent=1, sort_keys=True)
+    fout.close()
+
+def compare(results, baseline_fname, ratio=REGRESSION_RATIO):
+    '''
+    Print and return the stages that are more than ratio times slower than
+    in a saved baseline, as (stage, minutes, baseline seconds, seconds).
+    Stages under REGRESSION_MIN_SECONDS in the baseline are skipped.
+
+    Keyword arguments:
+    results -- the run_benchmarks() dict
+    baseline_fname -- json saved by save_results()
+    ratio -- slowdown allowed before a stage is a regression
+
+    '''
+    fin = open(baseline_fname, "r")
+    baseline = json.load(fin)
+    fin.close()
+    base_times = dict(((res["stage"], res["minutes"]), res["seconds"]) for res in baseline["results"])
+    
+    regressions = []
+    for res in results["results"]:
+        base = base_times.get((res["stage"], res["minutes"]))
+        if base is None or base < REGRESSION_MIN_SECONDS:
+            continue
+        if res["seconds"] > ratio * base:
+            regressions.append((res["stage"], res["minutes"], base, res["seconds"]))
+            print "REGRESSION %-24s %5d min %9.4lfs -> %9.4lfs" \
+                %(res["stage"], res["minutes"], base, res["seconds"])
+    
+    return regressions
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(1)
+    if sys.argv[1] == "--check-precision":
+        deviation = check_precision(sys.argv[2], *sys.argv[3:4])
+        print "float32 max deviation %.3g (tolerance %.3g)" %(deviation, utils.FLOAT32_TOLERANCE)
+        sys.exit(0)
+    results = run_benchmarks()
+    save_results(results, sys.argv[1])
+    if len(sys.argv) > 2 and compare(results, sys.argv[2]):
+        sys.exit(2)
+    if any(res["max_deviation"] > res["tolerance"] for res in results["precision"]):
+        print "float32 deviation above utils.FLOAT32_TOLERANCE"
+        sys.exit(3)
+    if any(res["max_deviation"] > res["tolerance"] for res in results["engine"]):
+        print "fft engine deviation above utils.FFT_FILTER_TOLERANCE"
+        sys.exit(4)
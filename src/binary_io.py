@@ -0,0 +1,347 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- binary_io.py
+Created on Oct 17, 2026
+
+Compact binary output. A recording written as <name>.csv can instead be
+stored as three files next to it:
+<name>.npy -- the data columns, column-major (columns, rows), float64
+              or float32, memory mapped on read
+<name>.index.npy -- the index, in its own dtype
+<name>.npy.json -- the original 4-line Shimmer header, index name, columns
+Reading it back gives the frame that was written with the same index and
+columns. read_shimmer() and write_data() use it transparently when the
+output format is "binary" or "binary32", set with set_output_format() or
+the SENSOR_OUTPUT_FORMAT environment variable. ChunkWriter writes the same
+files from a stream of chunks in bounded memory (see stream_filter.py).
+
+Usage:
+python binary_io.py <Participant_Data path> [binary|binary32] [--remove-csv]
+
+Dependencies:
+numpy, pandas
+'''
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+OUTPUT_FORMAT_ENV = "SENSOR_OUTPUT_FORMAT"
+OUTPUT_DTYPES = {"binary": np.float64, "binary32": np.float32}
+# directories whose csv outputs convert_tree() converts
+OUTPUT_DIRNAMES = ["Filtered_Ankle_Corrected", "Orientation_Parameters", "Trials"]
+
+_output_format = os.environ.get(OUTPUT_FORMAT_ENV, "csv")
+if _output_format != "csv" and _output_format not in OUTPUT_DTYPES:
+    raise ValueError("unknown %s: %s" %(OUTPUT_FORMAT_ENV, _output_format))
+
+def set_output_format(output_format):
+    '''
+    Select the format write_data() uses: "csv", "binary" or "binary32".
+
+    Keyword arguments:
+    output_format -- the format
+
+    '''
+    global _output_format
+    if output_format != "csv" and output_format not in OUTPUT_DTYPES:
+        raise ValueError("unknown output format: %s" %(output_format))
+    _output_format = output_format
+
+def output_format():
+    '''
+    The format write_data() uses.
+
+    Keyword arguments:
+
+    '''
+    return _output_format
+
+def binary_fnames(fname):
+    '''
+    The data, index and sidecar files that stand in for a csv.
+
+    Keyword arguments:
+    fname -- the csv name
+
+    '''
+    base = os.path.splitext(fname)[0]
+    
+    return base + ".npy", base + ".index.npy", base + ".npy.json"
+
+def existing(fname):
+    '''
+    fname if it exists, else its binary data file if that was written,
+    else None.
+
+    Keyword arguments:
+    fname -- the csv name
+
+    '''
+    if os.path.isfile(fname):
+        return fname
+    data_fname, _, meta_fname = binary_fnames(fname)
+    if os.path.isfile(meta_fname):
+        return data_fname
+    return None
+
+def list_recordings(path):
+    '''
+    The sorted csv names of the recordings in a directory, whether each was
+    written as a csv or in the binary format. The binary data, index and
+    sidecar files are listed once, under their csv name.
+
+    Keyword arguments:
+    path -- the directory
+
+    '''
+    fnames = set()
+    for fil in os.listdir(path):
+        if fil.endswith(".csv"):
+            fnames.add(fil)
+        elif fil.endswith(".npy.json"):
+            fnames.add(fil[:-len(".npy.json")] + ".csv")
+    
+    return sorted(fnames)
+
+def remove(fname):
+    '''
+    Remove the binary files of a csv name, if any.
+
+    Keyword arguments:
+    fname -- the csv name
+
+    '''
+    for binary_fname in reversed(binary_fnames(fname)):
+        if os.path.isfile(binary_fname):
+            os.remove(binary_fname)
+
+def write(fname, df, header, dtype=np.float64):
+    '''
+    Write df in the binary format in place of the csv fname. The sidecar is
+    written last, so a partly written recording is never read.
+
+    Keyword arguments:
+    fname -- the csv name
+    df -- the data to write
+    header -- the 4-line Shimmer header
+    dtype -- np.float64 or np.float32 for the data columns
+
+    '''
+    data_fname, index_fname, meta_fname = binary_fnames(fname)
+    remove(fname)
+    np.save(index_fname, np.asarray(df.index))
+    np.save(data_fname, np.ascontiguousarray(df.values.T, dtype=dtype))
+    meta = {"index_name": df.index.name,
+            "columns": [str(col) for col in df.columns],
+            "dtype": np.dtype(dtype).name,
+            "rows": len(df),
+            "header": header}
+    fout = open(meta_fname, "w")
+    json.dump(meta, fout, indent=1)
+    fout.close()
+
+class ChunkWriter(object):
+    '''
+    Write a recording in the binary format chunk by chunk. The rows are
+    appended to row-major scratch files, and close() transposes them into
+    the column-major data file one column at a time through memory maps,
+    then writes the sidecar, so memory does not depend on the length.
+
+    Keyword arguments:
+    fname -- the csv name
+    header -- the 4-line Shimmer header
+    dtype -- np.float64 or np.float32 for the data columns
+
+    '''
+    def __init__(self, fname, header, dtype=np.float64):
+        self.fname = fname
+        self.header = header
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self.columns = self.index_name = self.index_dtype = None
+        data_fname, index_fname, _ = binary_fnames(fname)
+        remove(fname)
+        self.data_scratch = data_fname + ".part"
+        self.index_scratch = index_fname + ".part"
+        self.data_out = open(self.data_scratch, "wb")
+        self.index_out = open(self.index_scratch, "wb")
+
+    def write(self, df):
+        '''
+        Append the rows of a chunk.
+
+        Keyword arguments:
+        df -- the chunk, with the columns of the first chunk
+
+        '''
+        if self.columns is None:
+            self.columns = [str(col) for col in df.columns]
+            self.index_name = df.index.name
+            self.index_dtype = np.asarray(df.index).dtype
+        np.ascontiguousarray(df.index, dtype=self.index_dtype).tofile(self.index_out)
+        np.ascontiguousarray(df.values, dtype=self.dtype).tofile(self.data_out)
+        self.rows += len(df)
+
+    def close(self):
+        '''
+        Write the data, index and sidecar files and remove the scratch files.
+
+        Keyword arguments:
+
+        '''
+        self.data_out.close()
+        self.index_out.close()
+        data_fname, index_fname, meta_fname = binary_fnames(self.fname)
+        n_columns = len(self.columns) if self.columns is not None else 0
+        index_dtype = self.index_dtype if self.index_dtype is not None else np.float64
+        try:
+            if self.rows:
+                rows = np.memmap(self.data_scratch, dtype=self.dtype, mode='r', shape=(self.rows, n_columns))
+                index = np.memmap(self.index_scratch, dtype=index_dtype, mode='r', shape=(self.rows,))
+            else:
+                rows = np.empty((0, n_columns), dtype=self.dtype)
+                index = np.empty(0, dtype=index_dtype)
+            np.save(index_fname, index)
+            data = np.lib.format.open_memmap(data_fname, mode='w+', dtype=self.dtype, \
+                                             shape=(n_columns, self.rows))
+            for j in range(n_columns):
+                data[j] = rows[:, j]
+            data.flush()
+            del data, rows, index
+        finally:
+            os.remove(self.data_scratch)
+            os.remove(self.index_scratch)
+        meta = {"index_name": self.index_name,
+                "columns": self.columns if self.columns is not None else [],
+                "dtype": self.dtype.name,
+                "rows": self.rows,
+                "header": self.header}
+        fout = open(meta_fname, "w")
+        json.dump(meta, fout, indent=1)
+        fout.close()
+
+def read_meta(fname):
+    '''
+    The sidecar of a binary recording.
+
+    Keyword arguments:
+    fname -- the csv name
+
+    '''
+    fin = open(binary_fnames(fname)[2], "r")
+    meta = json.load(fin)
+    fin.close()
+    
+    return meta
+
+def read(fname, mmap=True, dtype=None):
+    '''
+    Read a binary recording. With mmap the frame is backed by a copy-on-write
+    memory map of the data file; if dtype differs from the stored dtype the
+    data is cast from the map, so only the cast copy is held in memory.
+
+    Keyword arguments:
+    fname -- the csv name
+    mmap -- memory map instead of reading the data
+    dtype -- dtype of the data columns, None keeps the stored dtype
+
+    '''
+    data_fname, index_fname, _ = binary_fnames(fname)
+    meta = read_meta(fname)
+    mmap_mode = 'c' if mmap or dtype is not None else None
+    index = np.load(index_fname, mmap_mode=mmap_mode)
+    data = np.load(data_fname, mmap_mode=mmap_mode)
+    if dtype is not None:
+        data = data.astype(dtype, copy=False) if mmap else np.array(data, dtype=dtype)
+    
+    return pd.DataFrame(data.T, index=pd.Index(index, name=meta["index_name"]), \
+                        columns=meta["columns"], copy=False)
+
+def read_header(fname):
+    '''
+    The 4-line Shimmer header of a binary recording.
+
+    Keyword arguments:
+    fname -- the csv name
+
+    '''
+    return [str(line) for line in read_meta(fname)["header"]]
+
+def convert(fname, dtype=np.float64, remove_csv=False):
+    '''
+    Convert an existing csv output to the binary format. The written files
+    are read back and compared with the csv before it is removed.
+
+    Keyword arguments:
+    fname -- the csv output
+    dtype -- np.float64 or np.float32 for the data columns
+    remove_csv -- remove the csv once the binary copy is verified
+
+    '''
+    # imported here since utils imports this module
+    import utils
+    df = utils.read_shimmer(fname, use_cache=False)
+    write(fname, df, utils.read_header(fname), dtype)
+    
+    check_df = read(fname, mmap=False)
+    # Index.equals() ignores the dtype, e.g. an int64 index read back as float64
+    same = check_df.index.equals(df.index) and check_df.index.dtype == df.index.dtype \
+        and list(check_df.columns) == list(df.columns) and check_df.index.name == df.index.name \
+        and np.array_equal(check_df.values, df.values.astype(dtype))
+    if not same:
+        raise ValueError("binary copy of %s does not match" %(fname))
+    if remove_csv:
+        os.remove(fname)
+
+def convert_tree(root, dtype=np.float64, remove_csv=False):
+    '''
+    Convert the csv outputs of every session below root. Returns the
+    converted file names.
+
+    Keyword arguments:
+    root -- the Participant_Data directory
+    dtype -- np.float64 or np.float32 for the data columns
+    remove_csv -- remove each csv once its binary copy is verified
+
+    '''
+    converted = []
+    for dirpath, _, filenames in os.walk(root):
+        if os.path.basename(dirpath) not in OUTPUT_DIRNAMES:
+            continue
+        for fil in sorted(filenames):
+            # META files are inputs that get_trial_prefixes() looks for
+            if not fil.endswith(".csv") or "META" in fil:
+                continue
+            fname = os.path.join(dirpath, fil)
+            print "Converting " + fname
+            convert(fname, dtype, remove_csv)
+            converted.append(fname)
+    
+    return converted
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(1)
+    output_format = sys.argv[2] if len(sys.argv) > 2 and not sys.argv[2].startswith("--") else "binary"
+    convert_tree(sys.argv[1], OUTPUT_DTYPES[output_format], "--remove-csv" in sys.argv)
@@ -0,0 +1,337 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- catalog.py
+Created on Oct 17, 2026
+
+Cohort catalog. A SQLite database in the Participant_Data directory
+indexes every session's raw sensor files, orientation parameters,
+filtered outputs, trial META files and trial files with their row counts
+and time ranges. update() only re-reads files whose size or mtime
+changed, and trial numbers come from the sorted META prefixes of a
+session, so "all T2 LA trials" is a single query instead of a tree walk.
+
+Usage:
+python catalog.py <Participant_Data path>
+
+Dependencies:
+numpy
+'''
+import os
+import sqlite3
+import sys
+
+import numpy as np
+
+import binary_io
+
+CATALOG_FNAME = "catalog.sqlite"
+# seconds a writer waits for another process holding the database lock
+CATALOG_TIMEOUT = 60.0
+SESSION_DIRNAMES = ["Timestamp_Aligned", "Filtered_Ankle_Corrected", "Trials"]
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    session TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    sensor_loc TEXT,
+    prefix TEXT,
+    trial INTEGER,
+    format TEXT,
+    mtime REAL,
+    size INTEGER,
+    rows INTEGER,
+    start_ts REAL,
+    end_ts REAL
+);
+CREATE INDEX IF NOT EXISTS files_session ON files (session, kind);
+CREATE INDEX IF NOT EXISTS files_trial ON files (kind, trial, sensor_loc);
+'''
+
+def classify(dirname, fil):
+    '''
+    The (kind, sensor_loc, prefix, format) of a session file, or None if it
+    is not catalogued. kind is one of raw, axes, orientation, notes,
+    filtered, meta or trial.
+
+    Keyword arguments:
+    dirname -- the name of the file's directory, e.g. Trials
+    fil -- the file name
+
+    '''
+    if fil.endswith(".index.npy"):
+        return None
+    base, ext = os.path.splitext(fil)
+    fmt = {".csv": "csv", ".npy": "binary"}.get(ext)
+    if dirname == "Timestamp_Aligned":
+        if fil == "DEV_axes.txt":
+            return ("axes", "DEV", None, "txt")
+        if fmt == "csv":
+            return ("raw", base, None, fmt)
+    elif dirname == "Orientation_Parameters":
+        if fil.endswith("_notes.txt"):
+            return ("notes", base.split("_")[0], None, "txt")
+        if fmt is not None:
+            return ("orientation", base.split("_")[0], None, fmt)
+    elif dirname == "Filtered_Ankle_Corrected":
+        if fil == "chopping_notes.txt":
+            return ("notes", "HIP", None, "txt")
+        if fmt is not None and base.endswith("_oriented_filtered"):
+            return ("filtered", base.split("_")[0], None, fmt)
+    elif dirname == "Trials" and fmt is not None and "_" in base:
+        prefix, sensor_loc = base.rsplit("_", 1)
+        if sensor_loc == "META":
+            return ("meta", None, prefix, fmt)
+        return ("trial", sensor_loc, prefix, fmt)
+    return None
+
+def csv_info(fname):
+    '''
+    The (rows, first timestamp, last timestamp) of a Shimmer csv without
+    parsing it; None for what cannot be read.
+
+    Keyword arguments:
+    fname -- the csv
+
+    '''
+    fin = open(fname, "rb")
+    n_lines = 0
+    last = ""
+    for block in iter(lambda: fin.read(1024 * 1024), ""):
+        n_lines += block.count("\n")
+        last = (last + block)[-4096:]
+    fin.seek(0)
+    lines = [fin.readline() for _ in range(5)]
+    fin.close()
+    
+    rows = max(n_lines - 4, 0)
+    start_ts = end_ts = None
+    try:
+        start_ts = float(lines[4].split(",")[0])
+        end_ts = float(last.rstrip().rsplit("\n", 1)[-1].split(",")[0])
+    except (IndexError, ValueError):
+        pass
+    return rows, start_ts, end_ts
+
+def binary_info(fname):
+    '''
+    The (rows, first timestamp, last timestamp) of a binary output.
+
+    Keyword arguments:
+    fname -- the csv name the binary files stand in for
+
+    '''
+    meta = binary_io.read_meta(fname)
+    index = np.load(binary_io.binary_fnames(fname)[1], mmap_mode='r')
+    if len(index) == 0:
+        return meta["rows"], None, None
+    
+    return meta["rows"], float(index[0]), float(index[-1])
+
+class Catalog(object):
+    '''
+    The catalog of the sessions below root, stored in root/catalog.sqlite.
+
+    Keyword arguments:
+    root -- the Participant_Data directory
+    readonly -- only query an existing catalog, never create or update it
+
+    '''
+    def __init__(self, root, readonly=False):
+        self.root = os.path.abspath(root)
+        self.fname = os.path.join(self.root, CATALOG_FNAME)
+        self.readonly = readonly
+        self.conn = sqlite3.connect(self.fname, timeout=CATALOG_TIMEOUT)
+        self.conn.row_factory = sqlite3.Row
+        if not readonly:
+            self.conn.executescript(SCHEMA)
+
+    def close(self):
+        '''
+        Close the database.
+
+        Keyword arguments:
+
+        '''
+        self.conn.close()
+
+    def session_key(self, session_path):
+        '''
+        A session's key: its directory relative to root.
+
+        Keyword arguments:
+        session_path -- the directory holding Timestamp_Aligned
+
+        '''
+        return os.path.relpath(os.path.abspath(session_path), self.root).replace(os.sep, "/")
+
+    def update(self, session_path=None):
+        '''
+        Bring the catalog up to date with the files on disk, re-reading only
+        files whose size or mtime changed. Returns the number of files
+        (re)indexed and removed.
+
+        Keyword arguments:
+        session_path -- only update this session, default every session below root
+
+        '''
+        if self.readonly:
+            raise ValueError("catalog %s was opened read-only" %(self.fname))
+        if session_path is not None:
+            session_paths = [os.path.abspath(session_path)]
+        else:
+            session_paths = [dirpath for dirpath, dirnames, _ in os.walk(self.root) \
+                             if "Timestamp_Aligned" in dirnames]
+        
+        n_indexed = n_removed = 0
+        with self.conn:
+            for session_path in session_paths:
+                indexed, removed = self.update_session(session_path)
+                n_indexed += indexed
+                n_removed += removed
+        return n_indexed, n_removed
+
+    def update_session(self, session_path):
+        '''
+        Update the files of one session, see update().
+
+        Keyword arguments:
+        session_path -- the directory holding Timestamp_Aligned
+
+        '''
+        session = self.session_key(session_path)
+        known = dict((row["path"], (row["mtime"], row["size"])) for row in \
+                     self.conn.execute("SELECT path, mtime, size FROM files WHERE session = ?", (session,)))
+        seen = set()
+        n_indexed = 0
+        for dirpath, _, filenames in os.walk(session_path):
+            for fil in filenames:
+                info = classify(os.path.basename(dirpath), fil)
+                if info is None:
+                    continue
+                kind, sensor_loc, prefix, fmt = info
+                fname = os.path.join(dirpath, fil)
+                # binary outputs are catalogued under the csv name they stand in for
+                if fmt == "binary":
+                    fname = os.path.splitext(fname)[0] + ".csv"
+                    if not os.path.isfile(binary_io.binary_fnames(fname)[2]):
+                        continue
+                    st = os.stat(binary_io.binary_fnames(fname)[2])
+                else:
+                    st = os.stat(fname)
+                path = os.path.relpath(fname, self.root).replace(os.sep, "/")
+                seen.add(path)
+                if known.get(path) == (st.st_mtime, st.st_size):
+                    continue
+                
+                rows = start_ts = end_ts = None
+                if fmt == "csv" and kind != "meta":
+                    rows, start_ts, end_ts = csv_info(fname)
+                elif fmt == "binary":
+                    rows, start_ts, end_ts = binary_info(fname)
+                self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, NULL, ?, ?, ?, ?, ?, ?)", \
+                                  (path, session, kind, sensor_loc, prefix, fmt, st.st_mtime, st.st_size, \
+                                   rows, start_ts, end_ts))
+                n_indexed += 1
+        
+        removed = [path for path in known if path not in seen]
+        self.conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in removed])
+        # T1, T2, ... in the order of the sorted META prefixes
+        prefixes = self.trial_prefixes(session)
+        for trial, prefix in enumerate(prefixes):
+            self.conn.execute("UPDATE files SET trial = ? WHERE session = ? AND prefix = ?", \
+                              (trial + 1, session, prefix))
+        return n_indexed, len(removed)
+
+    def trial_prefixes(self, session):
+        '''
+        The sorted trial prefixes of a session's META files.
+
+        Keyword arguments:
+        session -- the session key or directory
+
+        '''
+        if os.path.isabs(session):
+            session = self.session_key(session)
+        return [row["prefix"] for row in self.conn.execute( \
+            "SELECT prefix FROM files WHERE session = ? AND kind = 'meta' ORDER BY prefix", (session,))]
+
+    def files(self, kind=None, session=None, sensor_loc=None, trial=None):
+        '''
+        The catalogued files matching every given field, as sqlite3.Row with
+        an absolute fname added. E.g. files("trial", trial=2, sensor_loc="LA").
+
+        Keyword arguments:
+        kind -- raw, axes, orientation, notes, filtered, meta or trial
+        session -- the session key or directory
+        sensor_loc -- e.g. LA, HIP, WALKER
+        trial -- the trial number, 1 for the first META prefix
+
+        '''
+        if session is not None and os.path.isabs(session):
+            session = self.session_key(session)
+        fields = [("kind", kind), ("session", session), ("sensor_loc", sensor_loc), ("trial", trial)]
+        where = [(name + " = ?", value) for name, value in fields if value is not None]
+        query = "SELECT * FROM files"
+        if where:
+            query += " WHERE " + " AND ".join(clause for clause, _ in where)
+        rows = self.conn.execute(query + " ORDER BY path", [value for _, value in where]).fetchall()
+        
+        return [dict(row, fname=os.path.join(self.root, *row["path"].split("/"))) for row in rows]
+
+def find_catalog(path, readonly=False):
+    '''
+    The Catalog of the nearest directory at or above path holding a
+    catalog.sqlite, or None.
+
+    Keyword arguments:
+    path -- a directory inside the Participant_Data tree
+    readonly -- open it for queries only, see Catalog
+
+    '''
+    path = os.path.abspath(path)
+    while True:
+        if os.path.isfile(os.path.join(path, CATALOG_FNAME)):
+            return Catalog(path, readonly)
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+def print_summary(catalog):
+    '''
+    Print the number of catalogued files of each kind.
+
+    Keyword arguments:
+    catalog -- the Catalog
+
+    '''
+    for row in catalog.conn.execute("SELECT kind, COUNT(*) AS n, COUNT(DISTINCT session) AS sessions " \
+                                    "FROM files GROUP BY kind ORDER BY kind"):
+        print "%-12s %6d files %5d sessions" %(row["kind"], row["n"], row["sessions"])
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(1)
+    catalog = Catalog(sys.argv[1])
+    print "catalog: %d files indexed, %d removed" %(catalog.update())
+    print_summary(catalog)
+    catalog.close()
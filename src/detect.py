@@ -0,0 +1,279 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- detect.py
+Created on Oct 17, 2026
+
+Automatic detection of the sections the operator otherwise types in by
+hand. Everything works on plain numpy arrays with windowed statistics
+computed from cumulative sums, so an hour of 51.2 Hz data takes a few
+milliseconds.
+
+Dependencies:
+numpy
+'''
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+GRAVITY = 9.80665
+# rolling window used to decide if the sensor is still [s]
+STILL_WINDOW_SEC = 1.0
+# max accel norm std inside a still window [m/s^2]
+STILL_NORM_STD = 0.15
+# max distance of the still window's mean norm from gravity [m/s^2]
+STILL_NORM_TOL = 1.0
+# shortest still segment considered for calibration [s]
+STILL_MIN_SEC = 3.0
+# the sensor axis that points along the shank, i.e. carries gravity when
+# the leg is vertical (0 = X, 1 = Y, 2 = Z). The shank Shimmers are mounted
+# with X along the shank; utils.compute_rotation_matrix() relies on the same
+# mounting when it negates X of the horizontal section's gravity. Each
+# recording is checked against it with shank_axis().
+SHANK_AXIS = 0
+# proposals below this confidence should be checked by a person
+AUTO_CONFIDENCE_MIN = 0.6
+
+# trial detection on the filtered (gravity free) HIP accel
+TRIAL_WINDOW_SEC = 1.0
+TRIAL_HOP_SEC = 0.5
+# min accel RMS of an active window [m/s^2]
+TRIAL_ACTIVE_RMS = 0.6
+# pauses shorter than this are part of the trial, e.g. turns and doors [s]
+TRIAL_MAX_PAUSE_SEC = 10.0
+# shortest bout considered a trial [s]
+TRIAL_MIN_SEC = 30.0
+
+def window_sums(x, w):
+    '''
+    Sums of every length w window along axis 0, one row per window start.
+
+    Keyword arguments:
+    x -- array of shape (samples, ...) 
+    w -- window length in samples
+
+    '''
+    c = np.concatenate([np.zeros((1,) + x.shape[1:]), np.cumsum(x, axis=0)])
+    return c[w:] - c[:-w]
+
+def strided_windows(x, w, hop):
+    '''
+    A read-only (windows, w) view of a 1-D array, one row every hop samples.
+
+    Keyword arguments:
+    x -- 1-D array
+    w -- window length in samples
+    hop -- samples between window starts
+
+    '''
+    x = np.ascontiguousarray(x)
+    nwin = 1 + (len(x) - w) // hop
+    view = as_strided(x, shape=(nwin, w), strides=(x.strides[0] * hop, x.strides[0]))
+    view.flags.writeable = False
+    
+    return view
+
+def runs(mask):
+    '''
+    (start, stop) sample positions of the runs of True in a boolean mask.
+
+    Keyword arguments:
+    mask -- 1-D boolean array
+
+    '''
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))
+
+def still_segments(accel, fs, window_sec=STILL_WINDOW_SEC, max_norm_std=STILL_NORM_STD, \
+                   min_sec=STILL_MIN_SEC):
+    '''
+    Find the segments where the sensor is still. A sample is still if the
+    window centered on it has an accel norm std and a gravity direction
+    spread (total per-axis std) below max_norm_std and a mean norm within
+    STILL_NORM_TOL of gravity. Returns a list of
+    (start, stop, gravity unit vector, norm std) in sample positions.
+
+    Keyword arguments:
+    accel -- array of shape (samples, 3) [m/s^2]
+    fs -- sampling rate [Hz]
+    window_sec -- rolling window length [s]
+    max_norm_std -- stillness threshold [m/s^2]
+    min_sec -- shortest segment returned [s]
+
+    '''
+    accel = np.asarray(accel, dtype=np.float64)
+    w = max(2, int(round(window_sec * fs)))
+    if len(accel) < w:
+        return []
+    norm = np.sqrt(np.einsum('ij,ij->i', accel, accel))
+    mean = window_sums(norm, w) / w
+    var = window_sums(norm * norm, w) / w - mean * mean
+    # a change of gravity direction shows in the per-axis variance
+    axis_mean = window_sums(accel, w) / w
+    axis_var = (window_sums(accel * accel, w) / w - axis_mean * axis_mean).sum(axis=1)
+    still_win = (var < max_norm_std ** 2) & (axis_var < max_norm_std ** 2) & \
+        (np.abs(mean - GRAVITY) < STILL_NORM_TOL)
+    
+    # label each sample by the window centered on it
+    still = np.zeros(len(accel), dtype=bool)
+    still[w // 2:w // 2 + len(still_win)] = still_win
+    
+    segments = []
+    min_len = int(round(min_sec * fs))
+    for start, stop in runs(still):
+        if stop - start < min_len:
+            continue
+        g = accel[start:stop].mean(axis=0)
+        segments.append((start, stop, g / np.linalg.norm(g), norm[start:stop].std()))
+    
+    return segments
+
+def shank_axis(accel):
+    '''
+    The sensor axis along the shank, derived from the data: the axis that
+    carries most of the recording's mean acceleration. The shank is near
+    vertical whenever the participant stands, walks or sits, so gravity
+    along its long axis dominates the mean.
+
+    Keyword arguments:
+    accel -- array of shape (samples, 3) [m/s^2]
+
+    '''
+    return int(np.argmax(np.abs(np.asarray(accel, dtype=np.float64).mean(axis=0))))
+
+def detect_static_sections(accel, index, fs, axis=None):
+    '''
+    Propose the leg horizontal and leg vertical calibration sections for
+    orient_shank(). The vertical section is the still segment whose gravity
+    is best aligned with the shank axis, the horizontal section the one most
+    perpendicular to both. Returns ((horiz_start, horiz_end, vert_start,
+    vert_end), confidence) with index values like choose_subsection(), or
+    (None, 0.0) if no pair of still segments exists. The confidence is 0 if
+    the shank axis derived from the data is not SHANK_AXIS, since the
+    orientation assumes that mounting.
+
+    Keyword arguments:
+    accel -- array of shape (samples, 3) [m/s^2]
+    index -- the sensor index (timestamps)
+    fs -- sampling rate [Hz]
+    axis -- the sensor axis along the shank, default derived with
+            shank_axis()
+
+    '''
+    derived_axis = shank_axis(accel)
+    if derived_axis != SHANK_AXIS:
+        print "detect_static_sections(): the data puts the shank along axis %d, expected %d" \
+            %(derived_axis, SHANK_AXIS)
+    axis = derived_axis if axis is None else axis
+    segments = still_segments(accel, fs)
+    if len(segments) < 2:
+        return None, 0.0
+    
+    alignment = np.array([abs(seg[2][axis]) for seg in segments])
+    vert = int(np.argmax(alignment))
+    # perpendicular to the shank axis and to the chosen vertical gravity
+    perp = np.array([(1 - abs(seg[2][axis])) * (1 - abs(np.dot(seg[2], segments[vert][2]))) \
+                     for seg in segments])
+    perp[vert] = -1
+    horiz = int(np.argmax(perp))
+    
+    min_len = STILL_MIN_SEC * fs
+    quality = []
+    for i in [horiz, vert]:
+        start, stop, _, norm_std = segments[i]
+        stillness = 1 - min(1.0, norm_std / STILL_NORM_STD)
+        duration = min(1.0, (stop - start) / (2 * min_len))
+        quality.append(0.5 + 0.25 * stillness + 0.25 * duration)
+    angle = 1 - abs(np.dot(segments[horiz][2], segments[vert][2]))
+    confidence = float(max(0.0, alignment[vert]) * max(0.0, angle) * quality[0] * quality[1])
+    if derived_axis != SHANK_AXIS:
+        confidence = 0.0
+    
+    index = np.asarray(index)
+    section_times = (index[segments[horiz][0]], index[segments[horiz][1] - 1], \
+                     index[segments[vert][0]], index[segments[vert][1] - 1])
+    
+    return section_times, confidence
+
+def active_bouts(accel, fs):
+    '''
+    Find the bouts of activity in filtered accel. Windows with an accel RMS
+    above TRIAL_ACTIVE_RMS are active, active runs separated by less than
+    TRIAL_MAX_PAUSE_SEC are merged. Returns a list of (start, stop, active
+    fraction) in sample positions.
+
+    Keyword arguments:
+    accel -- filtered accel of shape (samples, 3) [m/s^2]
+    fs -- sampling rate [Hz]
+
+    '''
+    accel = np.asarray(accel, dtype=np.float64)
+    w = max(2, int(round(TRIAL_WINDOW_SEC * fs)))
+    hop = max(1, int(round(TRIAL_HOP_SEC * fs)))
+    if len(accel) < w:
+        return []
+    energy = np.einsum('ij,ij->i', accel, accel)
+    rms = np.sqrt(strided_windows(energy, w, hop).mean(axis=1))
+    active = rms > TRIAL_ACTIVE_RMS
+    
+    # fill pauses shorter than TRIAL_MAX_PAUSE_SEC
+    max_pause = int(round(TRIAL_MAX_PAUSE_SEC * fs / hop))
+    merged = active.copy()
+    win_runs = runs(active)
+    for (_, stop), (next_start, _) in zip(win_runs[:-1], win_runs[1:]):
+        if next_start - stop <= max_pause:
+            merged[stop:next_start] = True
+    
+    bouts = []
+    for start, stop in runs(merged):
+        start_sample = start * hop
+        stop_sample = min(len(accel), (stop - 1) * hop + w)
+        if stop_sample - start_sample >= TRIAL_MIN_SEC * fs:
+            bouts.append((start_sample, stop_sample, active[start:stop].mean()))
+    
+    return bouts
+
+def detect_trials(accel, index, fs):
+    '''
+    Propose the two trial boundaries from the filtered HIP accel: the two
+    longest activity bouts in time order. Returns ((start, end, start2,
+    end2), confidence) with index values, before the TS_OFFSET handling of
+    choose_trial_subsection(), or (None, 0.0) if fewer than two bouts exist.
+
+    Keyword arguments:
+    accel -- filtered accel of shape (samples, 3) [m/s^2]
+    index -- the sensor index (timestamps)
+    fs -- sampling rate [Hz]
+
+    '''
+    bouts = active_bouts(accel, fs)
+    if len(bouts) < 2:
+        return None, 0.0
+    
+    by_length = sorted(bouts, key=lambda bout: bout[1] - bout[0], reverse=True)
+    trials = sorted(by_length[:2])
+    # a third bout as long as the trials makes the choice ambiguous
+    shortest = min(bout[1] - bout[0] for bout in trials)
+    runner_up = by_length[2][1] - by_length[2][0] if len(by_length) > 2 else 0
+    confidence = float(min(trials[0][2], trials[1][2]) * (1 - float(runner_up) / shortest))
+    
+    index = np.asarray(index)
+    trial_times = (index[trials[0][0]], index[trials[0][1] - 1], \
+                   index[trials[1][0]], index[trials[1][1] - 1])
+    
+    return trial_times, confidence
@@ -0,0 +1,243 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- fft_filter.py
+Created on Oct 17, 2026
+
+Frequency domain zero-phase filtering for very long recordings. A chain of
+sos designs applied forwards and backwards, as sosfiltfilt does, has the
+real response |H|^2, i.e. a symmetric FIR kernel (the autocorrelation of
+the chain's impulse response). The kernel is truncated where its tail is
+negligible and applied to all six channels at once with overlap-save FFT
+blocks, so memory stays bounded by the block size and the buffer is
+filtered in place. Both ends are padded with an odd extension like
+filtfilt, and the samples within a kernel half length of either end are
+taken from sosfiltfilt of a short edge section, so the output matches
+scipy.signal.sosfiltfilt everywhere.
+
+Dependencies:
+numpy, scipy
+'''
+import numpy as np
+import scipy.fftpack as fftpack
+import scipy.signal as signal
+
+# dropped kernel tail, relative to the kernel's abs sum
+FFT_KERNEL_TOLERANCE = 1e-9
+# smallest and largest grid the kernel is sampled on
+FFT_MIN_GRID = 2 ** 12
+FFT_MAX_GRID = 2 ** 24
+# overlap-save block length is at least this, and at least
+# FFT_BLOCK_FACTOR times the kernel length
+FFT_MIN_BLOCK = 2 ** 14
+FFT_BLOCK_FACTOR = 8
+# the edge samples are computed with sosfiltfilt over this many kernel half
+# lengths, its transient from the cut end has decayed like the kernel tail
+EDGE_HALVES = 3
+
+# cached (half length, block length, packed kernel spectra) keyed by the caller's key
+_kernels = {}
+
+def next_pow2(n):
+    '''
+    Smallest power of two >= n.
+
+    Keyword arguments:
+    n -- positive integer
+
+    '''
+    return 1 << int(np.ceil(np.log2(max(n, 1))))
+
+def squared_response(chain, n_grid):
+    '''
+    |H|^2 of the sos designs of chain applied in turn, sampled on the
+    n_grid // 2 + 1 rfft frequencies of an n_grid point grid.
+
+    Keyword arguments:
+    chain -- sos designs
+    n_grid -- grid length
+
+    '''
+    w = 2 * np.pi * np.arange(n_grid // 2 + 1) / float(n_grid)
+    response = np.ones(len(w))
+    for sos in chain:
+        response *= np.abs(signal.sosfreqz(sos, worN=w)[1]) ** 2
+    
+    return response
+
+def zero_phase_kernel(chain, tol=FFT_KERNEL_TOLERANCE):
+    '''
+    Symmetric FIR kernel of forward-backward filtering with chain, as a
+    causal array of length 2 * half + 1 centred on index half. The grid is
+    doubled until the time aliased tail is negligible, then the kernel is
+    truncated so the dropped taps sum to at most tol of the abs sum.
+
+    Keyword arguments:
+    chain -- sos designs
+    tol -- dropped tail, relative to the kernel's abs sum
+
+    '''
+    n_grid = FFT_MIN_GRID
+    while True:
+        h = np.fft.irfft(squared_response(chain, n_grid), n_grid)
+        mag = np.abs(h[:n_grid // 2 + 1])
+        # abs sum of the taps beyond each lag, both sides
+        tail = 2 * (mag.sum() - np.cumsum(mag))
+        if tail[n_grid // 4] <= tol * np.abs(h).sum():
+            break
+        if n_grid >= FFT_MAX_GRID:
+            raise ValueError("zero_phase_kernel(): kernel longer than %d taps" %(FFT_MAX_GRID // 2))
+        n_grid *= 2
+    half = int(np.argmax(tail <= tol * np.abs(h).sum()))
+    
+    return np.concatenate([h[n_grid - half:], h[:half + 1]]), half
+
+def prepare_kernels(chains, key=None):
+    '''
+    Real spectra of one kernel per column, all sized to the longest
+    kernel's half length, and the overlap-save block length. Each kernel is
+    centred on sample 0 of the block (wrapped around), so its spectrum is
+    real and is stored in fftpack's packed rfft order. Cached by key.
+
+    Keyword arguments:
+    chains -- sos design chain of each column
+    key -- cache key, e.g. (sensor_loc, fs, cutoffs); None to not cache
+
+    '''
+    if key is not None and key in _kernels:
+        return _kernels[key]
+    
+    kernels = [zero_phase_kernel(chain) for chain in chains]
+    half = max(k_half for _, k_half in kernels)
+    n_block = max(FFT_MIN_BLOCK, next_pow2(FFT_BLOCK_FACTOR * (2 * half + 1)))
+    taps = np.zeros((len(chains), n_block))
+    for j, (kernel, k_half) in enumerate(kernels):
+        taps[j, :k_half + 1] = kernel[k_half:]
+        taps[j, n_block - k_half:] = kernel[:k_half]
+    spectra = np.fft.rfft(taps, axis=1).real
+    # packed order is [r0, re1, im1, re2, im2, ..., r(n/2)], a real
+    # response scales both parts of each bin
+    packed = np.empty_like(taps)
+    packed[:, 0] = spectra[:, 0]
+    packed[:, 1:] = np.repeat(spectra[:, 1:], 2, axis=1)[:, :n_block - 1]
+    prepared = (half, n_block, packed)
+    if key is not None:
+        _kernels[key] = prepared
+    
+    return prepared
+
+def min_rows(half):
+    '''
+    Shortest buffer filter_buffer() takes with kernels of this half length.
+
+    Keyword arguments:
+    half -- kernel half length [samples]
+
+    '''
+    return (EDGE_HALVES + 1) * half
+
+def kernel_min_rows(chains, key=None):
+    '''
+    Shortest buffer filter_buffer() takes with chains [samples].
+
+    Keyword arguments:
+    chains -- sos design chain of each column
+    key -- cache key, see prepare_kernels()
+
+    '''
+    return min_rows(prepare_kernels(chains, key)[0])
+
+def filtfilt_columns(block, chains):
+    '''
+    sosfiltfilt each row of a (channels, samples) block with its chain, as
+    utils.filter_channels() does with the sos engine. Returns a float64 copy.
+
+    Keyword arguments:
+    block -- (channels, samples) float array
+    chains -- sos design chain of each row
+
+    '''
+    out = np.array(block, dtype=np.float64)
+    for j, chain in enumerate(chains):
+        for sos in chain:
+            out[j] = signal.sosfiltfilt(sos, out[j])
+    
+    return out
+
+def filter_buffer(buf, chains, key=None):
+    '''
+    Zero-phase filter each column of a (samples, channels) buffer in place
+    with its chain of sos designs. Blocks of the odd extended signal are
+    read ahead of the rows being written, and the two edge pads are taken
+    before any row is overwritten, so only one block is held at a time. The
+    first and last half samples, where sosfiltfilt's own padding and initial
+    conditions still matter, are replaced by sosfiltfilt of the first and
+    last EDGE_HALVES * half samples, so the whole output matches the sos
+    path. The kernels run in float64, a float32 buf is rounded on the write
+    back.
+
+    Keyword arguments:
+    buf -- float array of shape (samples, channels), modified in place;
+           column-major (order='F') avoids strided reads
+    chains -- sos design chain of each column
+    key -- cache key, see prepare_kernels()
+
+    '''
+    half, n_block, packed = prepare_kernels(chains, key)
+    n_rows = len(buf)
+    if n_rows < min_rows(half):
+        raise ValueError("filter_buffer(): %d samples, need at least %d" %(n_rows, min_rows(half)))
+    
+    # channel-major view, each channel is one contiguous row for column-major buf
+    chans = buf.T
+    # odd extension of half samples at each end, as filtfilt pads
+    first, last = chans[:, :1].astype(np.float64), chans[:, -1:].astype(np.float64)
+    left = 2 * first - chans[:, half:0:-1]
+    right = 2 * last - chans[:, -2:-half - 2:-1]
+    edge = EDGE_HALVES * half
+    head = filtfilt_columns(chans[:, :edge], chains)[:, :half]
+    tail = filtfilt_columns(chans[:, -edge:], chains)[:, -half:]
+    
+    def extended(out, lo, hi):
+        # copy samples lo:hi of the extended signal, left pad + buf + right pad
+        for src, offset in [(left, 0), (chans, half), (right, half + n_rows)]:
+            src_lo, src_hi = max(lo - offset, 0), min(hi - offset, src.shape[1])
+            if src_lo < src_hi:
+                out[:, src_lo + offset - lo:src_hi + offset - lo] = src[:, src_lo:src_hi]
+    
+    # a block holds extended samples start:start + n_block, its outputs
+    # half:n_block - half are not wrapped and are samples start:start + step of buf
+    step = n_block - 2 * half
+    block = np.zeros((len(chains), n_block))
+    extended(block, 0, 2 * half)
+    for start in range(0, n_rows, step):
+        count = min(step, n_rows - start)
+        extended(block[:, 2 * half:2 * half + count], start + 2 * half, start + 2 * half + count)
+        block[:, 2 * half + count:] = 0.0
+        # the next block's overlap, read before these samples are overwritten
+        carry = block[:, count:count + 2 * half].copy()
+        spectrum = fftpack.rfft(block, axis=1, overwrite_x=True)
+        spectrum *= packed
+        out = fftpack.irfft(spectrum, axis=1, overwrite_x=True)
+        chans[:, start:start + count] = out[:, half:half + count]
+        block[:, :2 * half] = carry
+    chans[:, :half] = head
+    chans[:, -half:] = tail
+    
+    return buf
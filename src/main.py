@@ -35,15 +35,28 @@ pandas
 import os
 import pandas as pd
 
+import binary_io
+import catalog
 import utils
+import pipeline
+import profiling
+import resample
+import stream_filter
 from src.utils import closest_timestamp
 
     
-def orient_filter_shank(path, sensor_loc):
+def orient_filter_shank(path, sensor_loc, headless=False, write=True, df=None):
     '''
-    Orient and filter the shank sensors.
+    Orient and filter the shank sensors. Returns the source file name and
+    the oriented and filtered data.
 
     Keyword arguments:
+    path -- the session's Timestamp_Aligned directory
+    sensor_loc -- LA or RA
+    headless -- reuse the saved section times and save the QC figures as png
+                instead of plotting
+    write -- write the _oriented_filtered.csv file
+    df -- the already read sensor file, e.g. from prefetch.py
 
     '''
     fname = os.path.join(path, sensor_loc + ".csv")
@@ -55,48 +68,88 @@ def orient_filter_shank(path, sensor_loc):
     horiz_df_fname = os.path.join(parameter_path, sensor_loc + "_config_orient_horizontal.csv")
     vert_df_fname = os.path.join(parameter_path, sensor_loc + "_config_orient_vertical.csv")
     oriented_filtered_df_fname = os.path.join(filtered_path, sensor_loc + "_oriented_filtered.csv")
+    qc_plot_fname = os.path.join(filtered_path, sensor_loc + "_oriented_filtered.png") if headless else None
+    profiling.set_context(session=session_path, sensor_loc=sensor_loc)
     
     # row 0 is device name, row 1 is signal name, row 2 is Raw or Cal, row 3 is units
-    df = pd.read_csv(fname, skiprows=[0, 2, 3], header=0, index_col=0)
+    if df is None:
+        df = utils.read_shimmer(fname)
+    df, fs, segments, gap_report = resample.prepare(df)
 
     # for debugging to specify files instead of create from user
     #horiz_df = pd.read_csv(horiz_df_fname, skiprows=[0, 2, 3], header=0, index_col=0)
     #vert_df = pd.read_csv(vert_df_fname, skiprows=[0, 2, 3], header=0, index_col=0)
     horiz_df, vert_df = utils.get_user_defined_sections(fname, notes_fname, section_plot_fname, \
-                                                  horiz_df_fname, vert_df_fname, df, sensor_loc)
-    oriented_df = utils.orient_shank(horiz_df, vert_df, df, sensor_loc)
-    oriented_filtered_df = utils.apply_filter(oriented_df.copy(), sensor_loc)
+                                                  horiz_df_fname, vert_df_fname, df, sensor_loc, headless)
+    rotation_mat = utils.compute_rotation_matrix(horiz_df, vert_df, sensor_loc)
+    oriented_filtered_df, _ = pipeline.orient_filter(df, sensor_loc, rotation_mat, plot=not headless, \
+                                                     fs=fs, plot_fname=qc_plot_fname, segments=segments)
     
-    utils.plot_oriented_filtered_data(df, oriented_df, oriented_filtered_df, sensor_loc)
-    utils.write_data(fname, oriented_filtered_df_fname, oriented_filtered_df)
+    if write:
+        utils.write_data(fname, oriented_filtered_df_fname, oriented_filtered_df)
+        if gap_report is not None:
+            resample.write_report(oriented_filtered_df_fname, gap_report)
+    return fname, oriented_filtered_df
   
   
-def orient_filter_COM(path):
+def orient_filter_COM(path, streaming=None, headless=False, write=True, df=None):
     '''
-    Orient and filter the COM sensor.
+    Orient and filter the COM sensor. Returns the source file name and
+    the oriented and filtered data (None when streaming).
 
     Keyword arguments:
+    path -- the session's Timestamp_Aligned directory
+    streaming -- None to load the whole file, or "zero_phase" / "causal" to
+                 filter in bounded memory with stream_filter (no plots, no
+                 resampling, see resample.check_streaming())
+    headless -- save the QC figure as png instead of plotting
+    write -- write the _oriented_filtered.csv file
+    df -- the already read sensor file, e.g. from prefetch.py
 
     '''
     fname = os.path.join(path, "HIP.csv")
     session_path = os.path.split(path)[0]
     filtered_path = os.path.join(session_path, "Filtered_Ankle_Corrected")
     oriented_filtered_df_fname = os.path.join(filtered_path, "HIP_oriented_filtered.csv")
+    qc_plot_fname = os.path.join(filtered_path, "HIP_oriented_filtered.png") if headless else None
+    profiling.set_context(session=session_path, sensor_loc="HIP")
+    
+    resample.check_streaming(streaming)
+    if streaming is not None:
+        # the transform runs once per chunk, so announce the file once here
+        profiling.debug("orient_start", "**Orienting sensor location: COM**\n", sensor_loc="COM")
+        stream_filter.stream_filter(fname, oriented_filtered_df_fname, "HIP", streaming, \
+                                    transform=lambda chunk: utils.orient_COM(chunk, verbose=False))
+        return fname, None
     
     # row 0 is device name, row 1 is signal name, row 2 is Raw or Cal, row 3 is units
-    df = pd.read_csv(fname, skiprows=[0, 2, 3], header=0, index_col=0)
+    if df is None:
+        df = utils.read_shimmer(fname)
+    df, fs, segments, gap_report = resample.prepare(df)
 
-    oriented_df = utils.orient_COM(df)
-    oriented_filtered_df = utils.apply_filter(oriented_df.copy(), "HIP")
+    oriented_filtered_df, _ = pipeline.orient_filter(df, "HIP", utils.COM_ROTATION, plot=not headless, \
+                                                     fs=fs, plot_fname=qc_plot_fname, segments=segments)
     
-    utils.plot_oriented_filtered_data(df, oriented_df, oriented_filtered_df, "HIP")
-    utils.write_data(fname, oriented_filtered_df_fname, oriented_filtered_df)
+    if write:
+        utils.write_data(fname, oriented_filtered_df_fname, oriented_filtered_df)
+        if gap_report is not None:
+            resample.write_report(oriented_filtered_df_fname, gap_report)
+    return fname, oriented_filtered_df
  
-def orient_filter_assistive_device(path):
+def orient_filter_assistive_device(path, streaming=None, headless=False, write=True, df=None):
     '''
-    Orient and filter the assistive device sensor.
+    Orient and filter the assistive device sensor. Returns the source file
+    name and the oriented and filtered data (None when streaming), or None
+    if the participant has no walker or cane file.
 
     Keyword arguments:
+    path -- the session's Timestamp_Aligned directory
+    streaming -- None to load the whole file, or "zero_phase" / "causal" to
+                 filter in bounded memory with stream_filter (no plots, no
+                 resampling, see resample.check_streaming())
+    headless -- save the QC figure as png instead of plotting
+    write -- write the _oriented_filtered.csv file
+    df -- the already read WALKER or CANE file, e.g. from prefetch.py
 
     '''
     walker_or_cane = "WALKER"
@@ -107,28 +160,56 @@ def orient_filter_assistive_device(path):
     session_path = os.path.split(path)[0]
     filtered_path = os.path.join(session_path, "Filtered_Ankle_Corrected")
     oriented_filtered_df_fname = os.path.join(filtered_path, "DEV_oriented_filtered.csv")
+    qc_plot_fname = os.path.join(filtered_path, "DEV_oriented_filtered.png") if headless else None
+    profiling.set_context(session=session_path, sensor_loc="DEV")
+    
+    resample.check_streaming(streaming)
+    if streaming is not None:
+        if not os.path.isfile(fname):
+            fname = os.path.join(path, "CANE.csv")
+            walker_or_cane = "CANE"
+            if not os.path.isfile(fname):
+                profiling.debug("no_device", "Walker or cane file DNE for this participant")
+                return None
+        axes_mat = utils.compile_axes(axes_fname)
+        # the transform runs once per chunk, so announce the file once here
+        profiling.debug("orient_start", "**Orienting sensor location: DEV**\n", sensor_loc="DEV")
+        profiling.debug("axes_mat", "axes_mat\n%s" %(axes_mat), axes_mat=axes_mat.tolist())
+        stream_filter.stream_filter(fname, oriented_filtered_df_fname, walker_or_cane, streaming, \
+                                    transform=lambda chunk: utils.orient_assistive_device(chunk, axes_mat, \
+                                                                                         verbose=False))
+        return fname, None
     
     # row 0 is device name, row 1 is signal name, row 2 is Raw or Cal, row 3 is units
-    try: # try opening walker
-        df = pd.read_csv(fname, skiprows=[0, 2, 3], header=0, index_col=0)
-    except IOError: # try opening cane
-        fname = os.path.join(path, "CANE.csv")
-        try:
-            df = pd.read_csv(fname, skiprows=[0, 2, 3], header=0, index_col=0)
+    if df is not None:
+        if not os.path.isfile(fname):
+            fname = os.path.join(path, "CANE.csv")
             walker_or_cane = "CANE"
-        except IOError:
-            print "Walker or cane file DNE for this participant"
-            return
-    axes_df = pd.read_csv(axes_fname, header=0, index_col=0)
+    else:
+        try: # try opening walker
+            df = utils.read_shimmer(fname)
+        except IOError: # try opening cane
+            fname = os.path.join(path, "CANE.csv")
+            try:
+                df = utils.read_shimmer(fname)
+                walker_or_cane = "CANE"
+            except IOError:
+                profiling.debug("no_device", "Walker or cane file DNE for this participant")
+                return None
+    axes_mat = utils.compile_axes(axes_fname)
     
-    print "axes_df"
-    print axes_df
+    profiling.debug("axes_mat", "axes_mat\n%s" %(axes_mat), axes_mat=axes_mat.tolist())
     
-    oriented_df = utils.orient_assistive_device(df, axes_df)
-    oriented_filtered_df = utils.apply_filter(oriented_df.copy(), walker_or_cane)
+    df, fs, segments, gap_report = resample.prepare(df)
+    oriented_filtered_df, _ = pipeline.orient_filter(df, walker_or_cane, axes_mat, \
+                                                     plot=not headless, fs=fs, plot_fname=qc_plot_fname, \
+                                                     segments=segments)
     
-    utils.plot_oriented_filtered_data(df, oriented_df, oriented_filtered_df, walker_or_cane)
-    utils.write_data(fname, oriented_filtered_df_fname, oriented_filtered_df)   
+    if write:
+        utils.write_data(fname, oriented_filtered_df_fname, oriented_filtered_df)
+        if gap_report is not None:
+            resample.write_report(oriented_filtered_df_fname, gap_report)
+    return fname, oriented_filtered_df
     
     
 def chop_dev_data_after_others(path, sensor_loc):
@@ -138,15 +219,64 @@ def chop_dev_data_after_others(path, sensor_loc):
     the COM file and grab the first and the last timestamps for each trial
     Then chop DEV to the closest timestamps to the COM timestamps
     Chop the data files to trim them down and specify start timestamp for COM.
+    If chop_data() saved the trial times in chopping_notes those are used
+    and the chopped COM files are not read.
 
     Keyword arguments:
+    path -- the session's Timestamp_Aligned directory
+    sensor_loc -- the sensor to chop, e.g. DEV
 
     '''
     session_path = os.path.split(path)[0]
     filtered_path = os.path.join(session_path, "Filtered_Ankle_Corrected")
     trials_path = os.path.join(session_path, "Trials")
-    meta_files = os.listdir(trials_path)
-    hip_T1_fname = hip_T2_fname = None
+    prefix, prefix2 = get_trial_prefixes(trials_path)
+    
+    trial_times = utils.read_notes(os.path.join(filtered_path, "chopping_notes.txt"))
+    if trial_times is None:
+        hip_T1_fname, hip_T2_fname = get_hip_trial_fnames(trials_path)
+        assert(hip_T1_fname is not None)
+        assert(hip_T2_fname is not None)
+        
+        hip_T1_chopped_fname = os.path.join(trials_path, hip_T1_fname)
+        hip_T2_chopped_fname = os.path.join(trials_path, hip_T2_fname)
+        # cheating! just grab previously chopped dfs and start/end times for each file
+        hip_T1_df = utils.read_shimmer(hip_T1_chopped_fname)
+        hip_T2_df = utils.read_shimmer(hip_T2_chopped_fname)
+        
+        # the cheat instead of calling get_user_defined_trial_times()
+        trial_times = [hip_T1_df.index[0], hip_T1_df.index[-1], 
+                       hip_T2_df.index[0], hip_T2_df.index[-1]]
+    
+    loc_fname = os.path.join(filtered_path, sensor_loc + "_oriented_filtered.csv")
+    # not all participants use an assistive device
+    if binary_io.existing(loc_fname) is not None:
+        chopped_df_fname = os.path.join(trials_path, prefix + "_" + sensor_loc + ".csv")
+        chopped_df_fname2 = os.path.join(trials_path, prefix2 + "_" + sensor_loc + ".csv")
+        utils.chop_dependent_data(loc_fname, chopped_df_fname, chopped_df_fname2, trial_times)
+            
+            
+def get_trial_prefixes(trials_path):
+    '''
+    The trial name prefixes of a session, taken from its sorted META files.
+    They are looked up in the cohort catalog if there is one and its META
+    files still exist (see catalog.py; batch updates it), otherwise by
+    listing the Trials directory. The catalog is only read.
+
+    Keyword arguments:
+    trials_path -- the session's Trials directory
+
+    '''
+    cohort = catalog.find_catalog(trials_path, readonly=True)
+    if cohort is not None:
+        session_path = os.path.dirname(os.path.abspath(trials_path))
+        prefixes = cohort.trial_prefixes(session_path)
+        meta_fnames = [row["fname"] for row in cohort.files("meta", session_path)]
+        cohort.close()
+        if prefixes and all(os.path.isfile(fname) for fname in meta_fnames):
+            return tuple((prefixes + [None])[:2])
+    
+    meta_files = sorted(os.listdir(trials_path))
     prefix = prefix2 = None
     for fil in meta_files:
         if "META" in fil:
@@ -154,50 +284,54 @@ def chop_dev_data_after_others(path, sensor_loc):
                 prefix = fil[:-9]
             else:
                 prefix2 = fil[:-9]
+    
+    return prefix, prefix2
+
+def get_hip_trial_fnames(trials_path):
+    '''
+    The first and second chopped HIP trial files of a session, from the
+    cohort catalog if it lists both and they still exist, otherwise by
+    their sorted file names. The catalog is only read.
+
+    Keyword arguments:
+    trials_path -- the session's Trials directory
+
+    '''
+    cohort = catalog.find_catalog(trials_path, readonly=True)
+    if cohort is not None:
+        session_path = os.path.dirname(os.path.abspath(trials_path))
+        fnames = [cohort.files("trial", session_path, "HIP", trial) for trial in [1, 2]]
+        cohort.close()
+        # binary outputs are catalogued under their csv name
+        if all(fnames) and all(binary_io.existing(rows[0]["fname"]) is not None for rows in fnames):
+            return fnames[0][0]["fname"], fnames[1][0]["fname"]
+    
+    hip_T1_fname = hip_T2_fname = None
+    # csv names, so the binary index and sidecar files are not matched
+    for fil in binary_io.list_recordings(trials_path):
         if "HIP" in fil:
             if fil[4]  == "1" or fil[4] == "3":
                 hip_T1_fname = fil
             elif fil[4] == "2" or fil[4] == "4":
                 hip_T2_fname = fil
-    assert(hip_T1_fname is not None)
-    assert(hip_T2_fname is not None)
-    
-    hip_T1_chopped_fname = os.path.join(trials_path, hip_T1_fname)
-    hip_T2_chopped_fname = os.path.join(trials_path, hip_T2_fname)
-    # cheating! just grab previously chopped dfs and start/end times for each file
-    hip_T1_df = pd.read_csv(hip_T1_chopped_fname, skiprows=[0, 2, 3], header=0, index_col=0)
-    hip_T2_df = pd.read_csv(hip_T2_chopped_fname, skiprows=[0, 2, 3], header=0, index_col=0)
     
-    # the cheat instead of calling get_user_defined_trial_times()
-    trial_times = [hip_T1_df.index[0], hip_T1_df.index[-1], 
-                   hip_T2_df.index[0], hip_T2_df.index[-1]]
-    
-    loc_fname = os.path.join(filtered_path, sensor_loc + "_oriented_filtered.csv")
-    # not all participants use an assistive device
-    if os.path.isfile(loc_fname):
-        chopped_df_fname = os.path.join(trials_path, prefix + "_" + sensor_loc + ".csv")
-        chopped_df_fname2 = os.path.join(trials_path, prefix2 + "_" + sensor_loc + ".csv")
-        utils.chop_dependent_data(loc_fname, chopped_df_fname, chopped_df_fname2, trial_times)
-            
-            
-def chop_data(path, dependent_sensor_locs):
+    return hip_T1_fname, hip_T2_fname
+
+def chop_data(path, dependent_sensor_locs, headless=False):
     '''
     Chop the data files to trim them down and specify start timestamp for COM.
 
     Keyword arguments:
+    path -- the session's Timestamp_Aligned directory
+    dependent_sensor_locs -- sensors chopped to the HIP trial times
+    headless -- reuse the saved trial times and skip plotting
 
     '''
     session_path = os.path.split(path)[0]
     filtered_path = os.path.join(session_path, "Filtered_Ankle_Corrected")
     trials_path = os.path.join(session_path, "Trials")
-    meta_files = os.listdir(trials_path)
-    prefix = prefix2 = None
-    for fil in meta_files:
-        if "META" in fil:
-            if prefix is None:
-                prefix = fil[:-9]
-            else:
-                prefix2 = fil[:-9]
+    prefix, prefix2 = get_trial_prefixes(trials_path)
+    profiling.set_context(session=session_path, sensor_loc="HIP")
     com_fname = os.path.join(filtered_path, "HIP_oriented_filtered.csv")
     chopped_plot_fname = os.path.join(filtered_path, "HIP_chopped.png")
     notes_fname = os.path.join(filtered_path, "chopping_notes.txt")
@@ -205,12 +339,13 @@ def chop_data(path, dependent_sensor_locs):
     chopped_df_fname2 = os.path.join(trials_path, prefix2 + "_HIP.csv")
     
     trial_times = utils.get_user_defined_trial_times(com_fname, notes_fname, chopped_plot_fname, \
-                                       chopped_df_fname, chopped_df_fname2)
+                                       chopped_df_fname, chopped_df_fname2, headless)
     
     for sensor_loc in dependent_sensor_locs:
         loc_fname = os.path.join(filtered_path, sensor_loc + "_oriented_filtered.csv")
+        profiling.set_context(sensor_loc=sensor_loc)
         # not all participants use an assistive device
-        if os.path.isfile(loc_fname):
+        if binary_io.existing(loc_fname) is not None:
             chopped_df_fname = os.path.join(trials_path, prefix + "_" + sensor_loc + ".csv")
             chopped_df_fname2 = os.path.join(trials_path, prefix2 + "_" + sensor_loc + ".csv")
             utils.chop_dependent_data(loc_fname, chopped_df_fname, chopped_df_fname2, trial_times)
@@ -0,0 +1,104 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- parallel_filter.py
+Created on Oct 17, 2026
+
+Process-parallel zero-phase filtering of one long recording. The six
+channels are copied into a shared memory buffer, and worker processes
+forked for the call each filter whole channels in place with the same
+sosfiltfilt chain as the serial path, so the result is identical. SciPy's
+filters hold the GIL on the Python 2 builds this runs on, so threads
+cannot filter channels at the same time; separate processes can. Time
+blocks are not split, since filtering a block with overlap only matches
+the whole-channel filter approximately (see stream_filter.py).
+
+Dependencies:
+numpy, scipy
+'''
+import ctypes
+import multiprocessing
+from multiprocessing import sharedctypes
+
+import numpy as np
+import scipy.signal as signal
+
+# the buffer the worker processes filter, set by _init_worker()
+_shared_buf = None
+
+def can_fork_workers():
+    '''
+    True if this process may start worker processes. The workers of a
+    multiprocessing.Pool, e.g. batch.py's, are daemonic and may not.
+
+    Keyword arguments:
+
+    '''
+    return not multiprocessing.current_process().daemon
+
+def _init_worker(shared, shape, dtype):
+    global _shared_buf
+    _shared_buf = np.frombuffer(shared, dtype=dtype).reshape(shape, order='F')
+
+def filter_column(buf, j, chain):
+    '''
+    Zero-phase filter column j of buf in place with each sos design of chain
+    in turn.
+
+    Keyword arguments:
+    buf -- (samples, channels) float array
+    j -- the column
+    chain -- sos designs applied in order
+
+    '''
+    column = buf[:, j]
+    for sos in chain:
+        column = signal.sosfiltfilt(sos, column)
+    buf[:, j] = column
+
+def _filter_shared_column(args):
+    j, chain = args
+    filter_column(_shared_buf, j, chain)
+
+def filter_buffer(buf, chains, workers):
+    '''
+    Filter each column of buf with its chain on up to workers processes and
+    write the result back into buf. The buffer is copied into shared memory
+    once, so it is held twice while the workers run.
+
+    Keyword arguments:
+    buf -- float array of shape (samples, channels), modified in place
+    chains -- per column, the sos designs applied in order
+    workers -- worker process count
+
+    '''
+    dtype = buf.dtype
+    shared = sharedctypes.RawArray(ctypes.c_char, buf.size * dtype.itemsize)
+    shared_buf = np.frombuffer(shared, dtype=dtype).reshape(buf.shape, order='F')
+    shared_buf[:] = buf
+    
+    pool = multiprocessing.Pool(min(workers, len(chains)), _init_worker, (shared, buf.shape, dtype))
+    try:
+        pool.map(_filter_shared_column, list(enumerate(chains)), chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    buf[:] = shared_buf
+    
+    return buf
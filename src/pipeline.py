@@ -0,0 +1,183 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- pipeline.py
+Created on Oct 17, 2026
+
+Fused orient and filter pipeline. The six IMU channels are loaded once
+into a contiguous buffer, rotated and filtered in place, and the output
+frame is built on top of that buffer. The original and oriented copies
+are only kept when plotting; the off-screen QC figure only keeps a
+decimated envelope of each stage.
+
+Dependencies:
+numpy, pandas
+'''
+import numpy as np
+import pandas as pd
+
+import utils
+import profiling
+import qc_plot
+
+# rows rotated per block, bounds the temporary used by the in-place rotation
+ROTATE_CHUNK_ROWS = 65536
+
+def record_memory(report, stage, rec):
+    '''
+    Append and print the memory use after a stage: the RSS at its end and
+    the stage's own peak, measured by its profiling.stage (see there).
+
+    Keyword arguments:
+    report -- list of (stage, rss MB, stage peak MB)
+    stage -- the stage name
+    rec -- the finished profiling.stage, created with measure_peak=True
+
+    '''
+    rss = profiling.rss_mb()
+    report.append((stage, rss, rec.peak_mb))
+    profiling.debug("memory", "Memory after %-8s rss %s MB, stage peak %.1lf MB (%s)" \
+                    %(stage, "?" if rss is None else "%.1lf" %(rss), rec.peak_mb, rec.peak_source), \
+                    memory_stage=stage, rss_mb=rss, peak_mb=rec.peak_mb)
+
+def estimate_bytes(n_rows, plot):
+    '''
+    Estimated memory used by orient_filter() on top of the input frame.
+
+    Keyword arguments:
+    n_rows -- number of samples
+    plot -- whether the original and oriented copies are kept
+
+    '''
+    channels = len(utils.accel_labels) + len(utils.gyro_labels)
+    buf = n_rows * channels * np.dtype(utils.work_dtype()).itemsize
+    # sosfiltfilt holds about four float64 temporaries of a three channel block
+    filt = 4 * n_rows * 3 * 8
+    copies = 2 * buf if plot else 0
+    
+    return buf + filt + copies
+
+def transform_in_place(block, mat, chunk_rows=ROTATE_CHUNK_ROWS):
+    '''
+    Replace each row v of a (samples, 3) block by mat.v, chunk_rows at a time.
+    Signed permutations (axis swaps) are applied by indexing, which is exact.
+
+    Keyword arguments:
+    block -- (samples, 3) float array, modified in place
+    mat -- 3x3 matrix
+    chunk_rows -- rows per temporary
+
+    '''
+    mat = np.asarray(mat, dtype=np.float64)
+    if utils.is_signed_permutation(mat):
+        perm = np.abs(mat).argmax(axis=1)
+        signs = mat[np.arange(3), perm]
+        for start in range(0, len(block), chunk_rows):
+            rows = block[start:start + chunk_rows]
+            rows[:] = rows[:, perm] * signs
+    else:
+        for start in range(0, len(block), chunk_rows):
+            rows = block[start:start + chunk_rows]
+            rows[:] = np.dot(rows, mat.T)
+    
+    return block
+
+def orient_filter(df, sensor_loc, accel_mat, gyro_mat=None, plot=False, max_bytes=None, \
+                  fs=utils.SHIMMER_FS, plot_fname=None, segments=None):
+    '''
+    Orient and filter one sensor with a single working buffer. Returns the
+    oriented and filtered frame and the per stage memory report. If df has
+    columns besides the IMU channels the result is written into a copy of
+    df, with the other columns; df itself is never modified.
+
+    Keyword arguments:
+    df -- the sensor data
+    sensor_loc -- HIP, WALKER, LA, RA or CANE, selects the filters
+    accel_mat -- 3x3 rotation applied to the accel channels
+    gyro_mat -- 3x3 rotation applied to the gyro channels, defaults to accel_mat
+    plot -- keep the original and oriented data and plot them
+    max_bytes -- memory budget; plotting is dropped first, then MemoryError
+    fs -- sampling rate [Hz]
+    plot_fname -- write a decimated QC figure to this png instead, see qc_plot
+    segments -- (start, stop) row ranges filtered separately, e.g. split
+                at long dropouts by resample.prepare(); default all rows
+
+    '''
+    profiling.debug("orient_filter_start", "**Orienting and filtering sensor location: " + sensor_loc + "**\n", \
+                    sensor_loc=sensor_loc)
+    if gyro_mat is None:
+        gyro_mat = accel_mat
+    if max_bytes is not None:
+        if plot and estimate_bytes(len(df), plot) > max_bytes:
+            profiling.debug("memory_budget", "orient_filter(): memory budget exceeded, not plotting", \
+                            max_bytes=max_bytes)
+            plot = False
+        if estimate_bytes(len(df), plot) > max_bytes:
+            raise MemoryError("orient_filter() needs about %d bytes, budget is %d" \
+                              %(estimate_bytes(len(df), plot), max_bytes))
+    
+    report = []
+    # decimated original, rotated and filtered channels for the QC figure
+    stage_envelopes = []
+    labels = utils.accel_labels + utils.gyro_labels
+    with profiling.stage("load", len(df), measure_peak=True) as rec:
+        # one column-major buffer in the working precision, each channel is
+        # contiguous along time
+        buf = utils.load_buffer(df, labels, utils.work_dtype())
+        orig_df = df[labels].copy() if plot else None
+        if plot_fname is not None:
+            stage_envelopes.append(qc_plot.channel_envelopes(df.index, buf))
+        rec.track(buf, orig_df)
+    record_memory(report, "load", rec)
+    
+    with profiling.stage("orient", len(df), measure_peak=True) as rec:
+        transform_in_place(buf[:, :3], accel_mat)
+        transform_in_place(buf[:, 3:], gyro_mat)
+        oriented_df = pd.DataFrame(buf.copy(order='F'), index=df.index, columns=labels) if plot else None
+        if plot_fname is not None:
+            stage_envelopes.append(qc_plot.channel_envelopes(df.index, buf))
+        rec.track(buf, orig_df, oriented_df)
+    record_memory(report, "orient", rec)
+    
+    with profiling.stage("apply_filter", len(df), measure_peak=True, sensor_loc=sensor_loc) as rec:
+        for start, stop in segments if segments is not None else [(0, len(buf))]:
+            utils.filter_channels(buf[start:stop], sensor_loc, fs)
+        if plot_fname is not None:
+            stage_envelopes.append(qc_plot.channel_envelopes(df.index, buf))
+        rec.track(buf, orig_df, oriented_df)
+    record_memory(report, "filter", rec)
+    
+    with profiling.stage("output", len(df), measure_peak=True) as rec:
+        if list(df.columns) == labels:
+            # buf.T is C-contiguous, so it becomes the frame's block without a copy
+            out_df = pd.DataFrame(buf, index=df.index, columns=labels, copy=False)
+            rec.track(buf, orig_df, oriented_df)
+        else:
+            out_df = df.copy()
+            out_df[labels] = buf
+            rec.track(buf, orig_df, oriented_df, out_df)
+    record_memory(report, "output", rec)
+    
+    if plot:
+        utils.plot_oriented_filtered_data(orig_df, oriented_df, out_df, sensor_loc)
+    if plot_fname is not None:
+        with profiling.stage("plot", len(df)):
+            qc_plot.save_oriented_filtered_plot(stage_envelopes, sensor_loc, plot_fname)
+    
+    return out_df, report
@@ -0,0 +1,205 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- prefetch.py
+Created on Oct 17, 2026
+
+Background prefetch of session input files for sequential batch runs.
+While one session is oriented, filtered and written, the Shimmer files of
+the next sessions are read on a thread pool. At most depth sessions are
+buffered, and a session is only started while the buffered input stays
+under max_bytes, so prefetching cannot run away with memory. The budget
+is on the estimated size of the parsed frames, rows x columns x itemsize
+of the working precision, not on the size of the files on disk. Only the
+files of the stages planned for a session are read.
+
+Dependencies:
+numpy
+pandas
+'''
+import collections
+import os
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+import binary_io
+import shimmer_cache
+import utils
+
+PREFETCH_DEPTH = 2
+PREFETCH_WORKERS = 4
+# budget for the buffered sessions, measured as the in-memory size of their frames
+PREFETCH_MAX_BYTES = 2 * 1024 ** 3
+# data lines sampled to estimate the row count of a csv
+SAMPLE_LINES = 1000
+SENSOR_FNAMES = [("LA", "LA.csv"), ("RA", "RA.csv"), ("HIP", "HIP.csv"), \
+                 ("DEV", "WALKER.csv"), ("DEV", "CANE.csv")]
+
+def session_files(path, stages=None):
+    '''
+    The sensor files of a session that exist, as sensor_loc -> file name.
+    DEV is the WALKER file, or the CANE file if there is no walker.
+
+    Keyword arguments:
+    path -- the session's Timestamp_Aligned directory
+    stages -- only these sensor locations, default all
+
+    '''
+    files = {}
+    for sensor_loc, fname in SENSOR_FNAMES:
+        if stages is not None and sensor_loc not in stages:
+            continue
+        fname = os.path.join(path, fname)
+        if sensor_loc not in files and binary_io.existing(fname) is not None:
+            files[sensor_loc] = fname
+    
+    return files
+
+def npy_shape(fname):
+    '''
+    The shape of a .npy file, read from its header.
+
+    Keyword arguments:
+    fname -- the .npy file
+
+    '''
+    return np.load(fname, mmap_mode='r').shape
+
+def csv_shape(fname):
+    '''
+    Estimated (rows, columns) of a Shimmer csv, index included. The rows
+    are extrapolated from the length of the first data lines.
+
+    Keyword arguments:
+    fname -- the Shimmer csv
+
+    '''
+    fin = open(fname, "rb")
+    header = [fin.readline() for _ in range(4)]
+    sample = [line for line in (fin.readline() for _ in range(SAMPLE_LINES)) if line]
+    fin.close()
+    n_columns = header[1].count(",") + 1
+    if len(sample) < SAMPLE_LINES:
+        return len(sample), n_columns
+    data_bytes = os.path.getsize(fname) - sum(len(line) for line in header)
+    
+    return int(data_bytes * len(sample) / sum(len(line) for line in sample)), n_columns
+
+def frame_bytes(fname):
+    '''
+    Estimated in-memory size of a sensor file once read by
+    utils.read_shimmer(): a float64 index plus the channels in the working
+    precision. The shape comes from the binary recording or the cache
+    entry if there is one, else it is estimated from the csv.
+
+    Keyword arguments:
+    fname -- the csv name
+
+    '''
+    if not os.path.isfile(fname):
+        n_columns, n_rows = npy_shape(binary_io.binary_fnames(fname)[0])
+    else:
+        entry = shimmer_cache.entry_path(fname) if shimmer_cache.is_cached_source(fname) else None
+        if entry is not None and os.path.isfile(os.path.join(entry, "data.npy")):
+            n_columns, n_rows = npy_shape(os.path.join(entry, "data.npy"))
+        else:
+            n_rows, n_columns = csv_shape(fname)
+            n_columns -= 1
+    
+    return n_rows * (np.dtype(np.float64).itemsize + n_columns * np.dtype(utils.work_dtype()).itemsize)
+
+class SessionPrefetcher(object):
+    '''
+    Iterate over (path, {sensor_loc: data frame}) of the sessions in order,
+    reading the next sessions in the background.
+
+    Keyword arguments:
+    sessions -- the sessions' Timestamp_Aligned directories
+    depth -- the most sessions buffered ahead, including the next one
+    workers -- number of reader threads
+    max_bytes -- the frames of the sessions read ahead and of the one
+                 being processed must fit in this, see frame_bytes(); a
+                 session is always read when nothing else is held, even if
+                 it alone is larger
+    stages -- path -> the sensor locations to read, e.g. the rebuild.plan()
+              stages; default every sensor file
+
+    '''
+    def __init__(self, sessions, depth=PREFETCH_DEPTH, workers=PREFETCH_WORKERS, \
+                 max_bytes=PREFETCH_MAX_BYTES, stages=None):
+        self.sessions = collections.deque(sessions)
+        self.depth = depth
+        self.max_bytes = max_bytes
+        self.stages = stages
+        self.pool = ThreadPool(workers)
+        # (path, bytes, {sensor_loc: AsyncResult}) in session order
+        self.pending = collections.deque()
+        # estimated frame bytes of the pending sessions and the one being processed
+        self.buffered_bytes = 0
+
+    def submit(self):
+        '''
+        Start reading sessions while the depth and memory budget allow.
+
+        Keyword arguments:
+
+        '''
+        while self.sessions and (not self.pending or len(self.pending) < self.depth):
+            path = self.sessions[0]
+            files = session_files(path, None if self.stages is None else self.stages.get(path, []))
+            n_bytes = sum(frame_bytes(fname) for fname in files.values())
+            if self.buffered_bytes and self.buffered_bytes + n_bytes > self.max_bytes:
+                break
+            self.sessions.popleft()
+            reads = dict((sensor_loc, self.pool.apply_async(utils.read_shimmer, (fname,))) \
+                         for sensor_loc, fname in files.items())
+            self.pending.append((path, n_bytes, reads))
+            self.buffered_bytes += n_bytes
+
+    def __iter__(self):
+        try:
+            self.submit()
+            while self.pending:
+                path, n_bytes, reads = self.pending.popleft()
+                # a failed read is left to the consumer, which reads the file itself
+                frames = {}
+                for sensor_loc, res in reads.items():
+                    try:
+                        frames[sensor_loc] = res.get()
+                    except Exception as e:
+                        print "SessionPrefetcher: could not read %s %s: %s" %(path, sensor_loc, e)
+                self.submit()
+                yield path, frames
+                # the consumer is done with this session's frames
+                frames = reads = None
+                self.buffered_bytes -= n_bytes
+                self.submit()
+        finally:
+            self.close()
+
+    def close(self):
+        '''
+        Stop the reader threads.
+
+        Keyword arguments:
+
+        '''
+        self.pool.terminate()
+        self.pool.join()
@@ -0,0 +1,312 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- profiling.py
+Created on Oct 17, 2026
+
+Per stage instrumentation. Wrap a stage with the stage() context manager
+or the profiled() decorator to record its wall time, CPU time, rows,
+rows per second, peak and final resident set size as one json line,
+tagged with the current session and sensor. The stage's own peak is
+measured by resetting the kernel's RSS high-water mark when the stage
+starts and reading it when it ends (Linux); where that is not possible
+it falls back to the largest array buffers the stage reports with
+track(). Debug output goes through debug(), which logs a record instead
+of printing while profiling is on. Profiling is off unless enable() is
+called or the SENSOR_PROFILE_LOG environment variable names a log file,
+and when off a stage costs one flag check.
+
+Dependencies:
+pandas
+'''
+import functools
+import json
+import os
+import resource
+import time
+
+import pandas as pd
+
+PROFILE_LOG_ENV = "SENSOR_PROFILE_LOG"
+
+_log_fname = os.environ.get(PROFILE_LOG_ENV)
+# session and sensor_loc added to every record
+_context = {}
+# stages measuring their peak, outermost first, see stage.__enter__()
+_open_stages = []
+# None until the first reset_peak() finds out if the high-water mark can be reset
+_can_reset_peak = None
+
+def enable(log_fname):
+    '''
+    Start appending stage records to a json lines file.
+
+    Keyword arguments:
+    log_fname -- the log file
+
+    '''
+    global _log_fname
+    _log_fname = log_fname
+    # worker processes started from here inherit the setting
+    os.environ[PROFILE_LOG_ENV] = log_fname
+
+def disable():
+    '''
+    Stop recording stages.
+
+    Keyword arguments:
+
+    '''
+    global _log_fname
+    _log_fname = None
+    os.environ.pop(PROFILE_LOG_ENV, None)
+
+def is_enabled():
+    '''
+    True if stages are being recorded.
+
+    Keyword arguments:
+
+    '''
+    return _log_fname is not None
+
+def set_context(**fields):
+    '''
+    Set the fields, e.g. session and sensor_loc, added to later records.
+
+    Keyword arguments:
+    fields -- field values, None removes a field
+
+    '''
+    for key, value in fields.items():
+        if value is None:
+            _context.pop(key, None)
+        else:
+            _context[key] = value
+
+def rss_mb():
+    '''
+    Current resident set size [MB], None where /proc is not available.
+
+    Keyword arguments:
+
+    '''
+    try:
+        fin = open("/proc/self/statm", "r")
+        pages = int(fin.read().split()[1])
+        fin.close()
+    except (IOError, OSError):
+        return None
+    
+    return pages * resource.getpagesize() / 1024.0 ** 2
+
+def reset_peak():
+    '''
+    Reset the kernel's RSS high-water mark (VmHWM) to the current RSS.
+    Returns False where /proc/self/clear_refs is not available or writable.
+
+    Keyword arguments:
+
+    '''
+    global _can_reset_peak
+    if _can_reset_peak is False:
+        return False
+    try:
+        fout = open("/proc/self/clear_refs", "w")
+        fout.write("5")
+        fout.close()
+        _can_reset_peak = True
+    except (IOError, OSError):
+        _can_reset_peak = False
+    
+    return _can_reset_peak
+
+def hwm_mb():
+    '''
+    The RSS high-water mark since the last reset_peak() [MB], None where
+    /proc is not available.
+
+    Keyword arguments:
+
+    '''
+    try:
+        fin = open("/proc/self/status", "r")
+        lines = fin.readlines()
+        fin.close()
+    except (IOError, OSError):
+        return None
+    for line in lines:
+        if line.startswith("VmHWM:"):
+            return int(line.split()[1]) / 1024.0
+    return None
+
+def cpu_seconds():
+    '''
+    User plus system CPU time of the process [s].
+
+    Keyword arguments:
+
+    '''
+    times = os.times()
+    return times[0] + times[1]
+
+def debug(name, message, **fields):
+    '''
+    Debug output: a record in the log while profiling is on, otherwise the
+    message is printed.
+
+    Keyword arguments:
+    name -- the record name
+    message -- the text printed, also stored in the record
+    fields -- extra json serializable fields
+
+    '''
+    if _log_fname is None:
+        print message
+        return
+    event(name, message=message, **fields)
+
+def event(name, **fields):
+    '''
+    Write one record to the log, e.g. in place of a debug print.
+
+    Keyword arguments:
+    name -- the record name
+    fields -- extra json serializable fields
+
+    '''
+    if _log_fname is None:
+        return
+    record = dict(_context)
+    record.update(fields)
+    record["stage"] = name
+    record["pid"] = os.getpid()
+    record["time"] = time.time()
+    # a single short append per record keeps lines from several workers whole
+    fout = open(_log_fname, "a")
+    fout.write(json.dumps(record, sort_keys=True) + "\n")
+    fout.close()
+
+class stage(object):
+    '''
+    Context manager recording one stage. Set .rows inside the block if the
+    row count is not known up front. After the block .peak_mb holds the
+    stage's peak RSS [MB], or with .peak_source "buffers" the largest total
+    of the arrays passed to track(); it is measured while profiling is on
+    or if measure_peak is set.
+
+    Keyword arguments:
+    name -- the stage name, e.g. read, orient, apply_filter, plot, write_data, chop
+    rows -- rows processed by the stage
+    measure_peak -- measure the peak even while profiling is off
+
+    '''
+    def __init__(self, name, rows=None, measure_peak=False, **fields):
+        self.name = name
+        self.rows = rows
+        self.fields = fields
+        self.measure_peak = measure_peak
+        self.peak_mb = None
+        self.peak_source = None
+        self.buffer_bytes = 0
+
+    def __enter__(self):
+        if _log_fname is None and not self.measure_peak:
+            return self
+        self.start_cpu = cpu_seconds()
+        self.start = time.time()
+        # nested stages share the one high-water mark: fold it into the
+        # enclosing stages before resetting it for this one
+        current = hwm_mb()
+        for outer in _open_stages:
+            outer.running_peak = max(outer.running_peak, current)
+        if reset_peak():
+            self.peak_source = "hwm"
+            self.running_peak = hwm_mb()
+            _open_stages.append(self)
+        else:
+            self.peak_source = "buffers"
+        return self
+
+    def track(self, *arrays):
+        '''
+        Report arrays the stage holds at the same time, the peak where the
+        high-water mark cannot be reset. None entries are skipped.
+
+        Keyword arguments:
+        arrays -- numpy arrays or DataFrames
+
+        '''
+        if self.peak_source != "buffers":
+            return
+        # memory_usage() sizes a frame's blocks without building .values
+        n_bytes = sum(arr.memory_usage(index=False).sum() if isinstance(arr, pd.DataFrame) \
+                      else getattr(arr, "nbytes", 0) for arr in arrays if arr is not None)
+        self.buffer_bytes = max(self.buffer_bytes, n_bytes)
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self.peak_source == "hwm":
+            _open_stages.remove(self)
+            self.peak_mb = max(self.running_peak, hwm_mb())
+        elif self.peak_source == "buffers":
+            self.peak_mb = self.buffer_bytes / 1024.0 ** 2
+        # not measured, or profiling was turned on inside the block
+        if _log_fname is None or self.peak_source is None:
+            return False
+        wall = time.time() - self.start
+        fields = dict(self.fields)
+        fields.update({"wall_sec": wall,
+                       "cpu_sec": cpu_seconds() - self.start_cpu,
+                       "rows": self.rows,
+                       "rows_per_sec": self.rows / wall if self.rows and wall > 0 else None,
+                       "peak_mb": self.peak_mb,
+                       "peak_source": self.peak_source,
+                       "rss_mb": rss_mb(),
+                       "ok": exc_type is None})
+        event(self.name, **fields)
+        return False
+
+def _count_rows(args, result):
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    for arg in args:
+        if isinstance(arg, pd.DataFrame):
+            return len(arg)
+    return None
+
+def profiled(name):
+    '''
+    Decorator recording every call of a function as a stage. The rows are
+    taken from a DataFrame result or else the first DataFrame argument.
+
+    Keyword arguments:
+    name -- the stage name
+
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _log_fname is None:
+                return func(*args, **kwargs)
+            with stage(name) as rec:
+                result = func(*args, **kwargs)
+                rec.rows = _count_rows(args, result)
+            return result
+        return wrapper
+    return decorator
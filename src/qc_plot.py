@@ -0,0 +1,162 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- qc_plot.py
+Created on Oct 17, 2026
+
+Off-screen QC figures. Each channel is decimated to a min/max envelope of
+about one bin per pixel column, so a figure of an hour long recording
+draws a few thousand points per line and still shows every spike. Figures
+are rendered with the Agg canvas directly, without pyplot, so they never
+block and are safe to produce from worker processes.
+
+Dependencies:
+numpy, matplotlib, utils
+'''
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# utils imports this module too, so its labels are read at call time
+import utils
+
+PLOT_WIDTH_PX = 1600
+PLOT_ROW_HEIGHT_PX = 300
+PLOT_DPI = 100
+
+def envelope(values, n_bins):
+    '''
+    Positions of the samples kept by min/max decimation: the minimum and
+    maximum of each of n_bins equal bins, plus the first and last sample,
+    in time order.
+
+    Keyword arguments:
+    values -- 1d array
+    n_bins -- number of bins, about the plot width in pixels
+
+    '''
+    n = len(values)
+    if n <= 2 * n_bins:
+        return np.arange(n)
+    bin_len = -(-n // n_bins)
+    n_full = n // bin_len
+    body = values[:n_full * bin_len].reshape(n_full, bin_len)
+    starts = np.arange(n_full) * bin_len
+    pos = [[0], starts + body.argmin(axis=1), starts + body.argmax(axis=1), [n - 1]]
+    if n_full * bin_len < n:
+        tail = values[n_full * bin_len:]
+        pos.append([n_full * bin_len + tail.argmin(), n_full * bin_len + tail.argmax()])
+    
+    return np.unique(np.concatenate(pos))
+
+def channel_envelopes(index, block, width_px=PLOT_WIDTH_PX):
+    '''
+    The decimated (x, y) of each column of a (samples, channels) block.
+
+    Keyword arguments:
+    index -- the timestamps
+    block -- (samples, channels) array
+    width_px -- the pixel width budget
+
+    '''
+    index = np.asarray(index)
+    envelopes = []
+    for j in range(block.shape[1]):
+        column = np.ascontiguousarray(block[:, j])
+        pos = envelope(column, width_px)
+        envelopes.append((index[pos], column[pos]))
+    
+    return envelopes
+
+def new_figure(n_rows, width_px=PLOT_WIDTH_PX):
+    '''
+    A figure with its own Agg canvas, independent of the pyplot backend.
+
+    Keyword arguments:
+    n_rows -- number of stacked subplots
+    width_px -- figure width in pixels
+
+    '''
+    fig = Figure(figsize=(width_px / float(PLOT_DPI), n_rows * PLOT_ROW_HEIGHT_PX / float(PLOT_DPI)), \
+                 dpi=PLOT_DPI)
+    FigureCanvasAgg(fig)
+    
+    return fig
+
+def save_acceleration_plot(df, sensor_loc, fname, section_times=None, labels=None, \
+                           width_px=PLOT_WIDTH_PX):
+    '''
+    Off-screen version of utils.plot_acceleration_data().
+
+    Keyword arguments:
+    df -- the sensor data
+    sensor_loc -- the sensor location, used in the title
+    fname -- the png to write
+    section_times -- optional (start, end, start, end) sections to shade
+    labels -- names of the two sections
+    width_px -- figure width in pixels
+
+    '''
+    fig = new_figure(1, width_px)
+    ax = fig.add_subplot(111)
+    envelopes = channel_envelopes(df.index, df[utils.accel_labels].values, width_px)
+    for (x, y), axis in zip(envelopes, ["X", "Y", "Z"]):
+        ax.plot(x, y, label=axis + '-axis', linewidth=0.5, antialiased=False)
+    
+    if section_times is not None and labels is not None:
+        ax.axvspan(section_times[0], section_times[1], facecolor='b', alpha=0.5)
+        ax.text(section_times[0], -11, labels[0], style='italic', bbox={'facecolor':'b', 'alpha':0.8, 'pad':10})
+        ax.axvspan(section_times[2], section_times[3], facecolor='g', alpha=0.5)
+        ax.text(section_times[2], -11, labels[1], style='italic', bbox={'facecolor':'g', 'alpha':0.8, 'pad':10})
+    
+    ax.set_xlabel('Timestamp')
+    ax.set_ylabel('Acceleration [m/s^2]')
+    ax.set_title('Sensor location: %s' %(sensor_loc))
+    ax.legend()
+    fig.savefig(fname)
+
+def save_oriented_filtered_plot(stage_envelopes, sensor_loc, fname, width_px=PLOT_WIDTH_PX):
+    '''
+    Off-screen version of utils.plot_oriented_filtered_data(): the original,
+    rotated and filtered accel and gyro channels in one png.
+
+    Keyword arguments:
+    stage_envelopes -- the channel_envelopes() of the six channels after
+                       each stage, in the order original, rotated, filtered
+    sensor_loc -- the sensor location, used in the title
+    fname -- the png to write
+    width_px -- figure width in pixels
+
+    '''
+    fig = new_figure(6, width_px)
+    stages = ["original", "rotated", "filtered"]
+    for j, label in enumerate(utils.accel_labels + utils.gyro_labels):
+        ax = fig.add_subplot(6, 1, j + 1)
+        for stage, envelopes in zip(stages, stage_envelopes):
+            x, y = envelopes[j]
+            ax.plot(x, y, label=label[-1] + ' ' + stage, linewidth=0.5, antialiased=False)
+        ax.legend(loc='upper right', fontsize='small')
+        if j == 0:
+            ax.set_title('Sensor location: %s' %(sensor_loc))
+        if j == 2:
+            ax.set_ylabel('Acceleration [m/s^2]')
+        if j == 5:
+            ax.set_ylabel('Angular velocity [deg/s]')
+            ax.set_xlabel('Timestamp')
+    fig.savefig(fname)
@@ -0,0 +1,268 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- rebuild.py
+Created on Oct 17, 2026
+
+Incremental rebuilds. Each stage of a session (LA, RA, HIP, DEV, CHOP)
+has a fingerprint over everything its outputs depend on: the content hash
+of the input csv, the saved section or trial times, the apply_filter()
+cutoff table, the orientation (DEV_axes.txt for DEV) and, for CHOP, the
+hashes of the filtered files and the trial prefixes. After a stage runs
+its fingerprint and outputs are recorded in
+Filtered_Ankle_Corrected/.fingerprints/<stage>.json and the stage is
+skipped while the fingerprint is unchanged and the outputs are the ones
+it wrote: an output whose size or mtime changed is hashed and compared
+with the recorded hash, so one edited or truncated on disk is rebuilt.
+
+Dependencies:
+pandas
+'''
+import hashlib
+import json
+import os
+
+import numpy as np
+
+import binary_io
+import utils
+import main
+import resample
+
+# bump to invalidate every recorded fingerprint, e.g. after a processing change
+FINGERPRINT_VERSION = 2
+SENSOR_STAGES = ["LA", "RA", "HIP", "DEV"]
+CHOP_STAGE = "CHOP"
+
+# (path, size, mtime) -> sha1, so a file is hashed once per process
+_hashes = {}
+
+def file_hash(fname):
+    '''
+    sha1 of a file's content, None if it does not exist. A csv output
+    written in the binary format is hashed by its data file.
+
+    Keyword arguments:
+    fname -- the file
+
+    '''
+    fname = binary_io.existing(fname)
+    if fname is None:
+        return None
+    st = os.stat(fname)
+    key = (os.path.abspath(fname), st.st_size, st.st_mtime)
+    if key not in _hashes:
+        sha = hashlib.sha1()
+        fin = open(fname, "rb")
+        for block in iter(lambda: fin.read(1024 * 1024), ""):
+            sha.update(block)
+        fin.close()
+        _hashes[key] = sha.hexdigest()
+    
+    return _hashes[key]
+
+def session_paths(path):
+    '''
+    The filtered, orientation parameter and trials directories of a session.
+
+    Keyword arguments:
+    path -- the session's Timestamp_Aligned directory
+
+    '''
+    session_path = os.path.split(path)[0]
+    filtered_path = os.path.join(session_path, "Filtered_Ankle_Corrected")
+    
+    return filtered_path, os.path.join(filtered_path, "Orientation_Parameters"), \
+        os.path.join(session_path, "Trials")
+
+def assistive_device_fname(path):
+    '''
+    The session's WALKER or CANE csv and its sensor_loc, or (None, None).
+
+    Keyword arguments:
+    path -- the session's Timestamp_Aligned directory
+
+    '''
+    for walker_or_cane in ["WALKER", "CANE"]:
+        fname = os.path.join(path, walker_or_cane + ".csv")
+        if os.path.isfile(fname):
+            return fname, walker_or_cane
+    return None, None
+
+def stage_inputs(path, stage):
+    '''
+    Everything the outputs of a stage depend on, and the list of its outputs.
+
+    Keyword arguments:
+    path -- the session's Timestamp_Aligned directory
+    stage -- LA, RA, HIP, DEV or CHOP
+
+    '''
+    filtered_path, parameter_path, trials_path = session_paths(path)
+    inputs = {"version": FINGERPRINT_VERSION, "stage": stage, "fs": utils.SHIMMER_FS, \
+              "filter_order": utils.FILTER_ORDER, "resample": resample.settings(), \
+              "output_format": binary_io.output_format(), "precision": np.dtype(utils.work_dtype()).name}
+    if stage in ("LA", "RA"):
+        notes_fname = os.path.join(parameter_path, stage + "_notes.txt")
+        inputs["input"] = file_hash(os.path.join(path, stage + ".csv"))
+        inputs["section_times"] = utils.read_notes(notes_fname)
+        inputs["cutoffs"] = utils.FILTER_CUTOFFS[stage]
+        inputs["filter_engine"] = utils.filter_engine(stage)
+        outputs = [os.path.join(filtered_path, stage + "_oriented_filtered.csv"), notes_fname, \
+                   utils.notes_sidecar_fname(notes_fname), \
+                   os.path.join(parameter_path, stage + "_config_orient_horizontal.csv"), \
+                   os.path.join(parameter_path, stage + "_config_orient_vertical.csv")]
+    elif stage == "HIP":
+        inputs["input"] = file_hash(os.path.join(path, "HIP.csv"))
+        inputs["cutoffs"] = utils.FILTER_CUTOFFS["HIP"]
+        inputs["filter_engine"] = utils.filter_engine("HIP")
+        inputs["rotation"] = utils.COM_ROTATION.tolist()
+        outputs = [os.path.join(filtered_path, "HIP_oriented_filtered.csv")]
+    elif stage == "DEV":
+        fname, walker_or_cane = assistive_device_fname(path)
+        inputs["input"] = file_hash(fname) if fname is not None else None
+        inputs["cutoffs"] = utils.FILTER_CUTOFFS.get(walker_or_cane)
+        inputs["filter_engine"] = utils.filter_engine(walker_or_cane)
+        inputs["axes"] = file_hash(os.path.join(path, "DEV_axes.txt"))
+        # not all participants use an assistive device
+        outputs = [os.path.join(filtered_path, "DEV_oriented_filtered.csv")] if fname else []
+    elif stage == CHOP_STAGE:
+        notes_fname = os.path.join(filtered_path, "chopping_notes.txt")
+        prefixes = main.get_trial_prefixes(trials_path) if os.path.isdir(trials_path) else (None, None)
+        inputs["trial_times"] = utils.read_notes(notes_fname)
+        inputs["prefixes"] = prefixes
+        inputs["ts_offset"] = utils.TS_OFFSET
+        outputs = [notes_fname]
+        for sensor_loc in SENSOR_STAGES:
+            filtered_fname = os.path.join(filtered_path, sensor_loc + "_oriented_filtered.csv")
+            inputs[sensor_loc] = file_hash(filtered_fname)
+            if inputs[sensor_loc] is not None and None not in prefixes:
+                outputs.extend(os.path.join(trials_path, prefix + "_" + sensor_loc + ".csv") \
+                               for prefix in prefixes)
+    else:
+        raise ValueError("unknown stage: %s" %(stage))
+    if stage in SENSOR_STAGES and outputs and resample.is_enabled():
+        outputs.append(utils.gap_report_fname(outputs[0]))
+    
+    return inputs, outputs
+
+def fingerprint(inputs):
+    '''
+    sha1 of the json of a stage's inputs.
+
+    Keyword arguments:
+    inputs -- the stage_inputs() dict
+
+    '''
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True)).hexdigest()
+
+def manifest_fname(path, stage):
+    '''
+    Where the fingerprint of a stage is recorded.
+
+    Keyword arguments:
+    path -- the session's Timestamp_Aligned directory
+    stage -- LA, RA, HIP, DEV or CHOP
+
+    '''
+    return os.path.join(session_paths(path)[0], ".fingerprints", stage + ".json")
+
+def output_unchanged(fname, stat, sha):
+    '''
+    True if an output is still the file a stage recorded: same size and
+    mtime, or else the same content hash.
+
+    Keyword arguments:
+    fname -- the recorded output
+    stat -- the recorded [size, mtime], None to compare the hash only
+    sha -- the recorded content hash
+
+    '''
+    if not os.path.isfile(fname):
+        return False
+    st = os.stat(fname)
+    if stat is not None and [st.st_size, st.st_mtime] == stat:
+        return True
+    return file_hash(fname) == sha
+
+def is_up_to_date(path, stage):
+    '''
+    True if the stage's recorded fingerprint matches its current inputs and
+    all of its recorded outputs are unchanged (see output_unchanged()).
+
+    Keyword arguments:
+    path -- the session's Timestamp_Aligned directory
+    stage -- LA, RA, HIP, DEV or CHOP
+
+    '''
+    fname = manifest_fname(path, stage)
+    if not os.path.isfile(fname):
+        return False
+    fin = open(fname, "r")
+    manifest = json.load(fin)
+    fin.close()
+    
+    inputs, _ = stage_inputs(path, stage)
+    if manifest["fingerprint"] != fingerprint(inputs):
+        return False
+    outputs = manifest["outputs"]
+    stats = manifest.get("output_stats", [None] * len(outputs))
+    return all(output_unchanged(output, stat, sha) \
+               for output, stat, sha in zip(outputs, stats, manifest["output_hashes"]))
+
+def record(path, stage):
+    '''
+    Record the fingerprint and the output hashes, sizes and mtimes of a
+    stage that just ran.
+
+    Keyword arguments:
+    path -- the session's Timestamp_Aligned directory
+    stage -- LA, RA, HIP, DEV or CHOP
+
+    '''
+    inputs, outputs = stage_inputs(path, stage)
+    outputs = [binary_io.existing(output) for output in outputs if binary_io.existing(output)]
+    manifest = {"fingerprint": fingerprint(inputs), "inputs": inputs, \
+                "outputs": outputs, "output_hashes": [file_hash(output) for output in outputs], \
+                "output_stats": [[os.stat(output).st_size, os.stat(output).st_mtime] for output in outputs]}
+    
+    fname = manifest_fname(path, stage)
+    if not os.path.isdir(os.path.dirname(fname)):
+        os.makedirs(os.path.dirname(fname))
+    fout = open(fname, "w")
+    json.dump(manifest, fout, indent=1, sort_keys=True)
+    fout.close()
+
+def plan(path, stages=SENSOR_STAGES, chop=True, force=False):
+    '''
+    The stages of a session that would run. CHOP runs whenever one of the
+    sensor stages runs, since it depends on their outputs.
+
+    Keyword arguments:
+    path -- the session's Timestamp_Aligned directory
+    stages -- the sensor stages considered
+    chop -- consider the CHOP stage
+    force -- rebuild everything
+
+    '''
+    todo = [stage for stage in stages if force or not is_up_to_date(path, stage)]
+    if chop and (force or todo or not is_up_to_date(path, CHOP_STAGE)):
+        todo.append(CHOP_STAGE)
+    
+    return todo
@@ -0,0 +1,215 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- resample.py
+Created on Oct 17, 2026
+
+Uniform resampling and gap handling before filtering. The sampling rate is
+measured from the index, the recording is interpolated onto a uniform
+grid at that rate, dropouts up to max_gap are interpolated and longer
+ones split the recording into segments that are filtered separately (see
+pipeline.orient_filter). A json gap report is written next to each
+output. Enabled with enable() or the SENSOR_RESAMPLE=1 environment
+variable; otherwise recordings are filtered as read, at utils.SHIMMER_FS.
+
+Dependencies:
+numpy, pandas
+'''
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import align
+import detect
+import utils
+
+RESAMPLE_ENV = "SENSOR_RESAMPLE"
+# dropouts up to this long are interpolated, longer ones split the recording [ms]
+RESAMPLE_MAX_GAP_MS = 100.0
+# segments shorter than this are dropped, too short to filter [s]
+RESAMPLE_MIN_SEGMENT_SEC = 1.0
+# the grid rate is the measured rate rounded to this many decimals [Hz], so
+# the filter design caches keyed by fs get one entry per device rate, not
+# one per file
+RESAMPLE_FS_DECIMALS = 2
+
+_enabled = os.environ.get(RESAMPLE_ENV, "0") == "1"
+
+def enable():
+    '''
+    Resample recordings before filtering.
+
+    Keyword arguments:
+
+    '''
+    global _enabled
+    _enabled = True
+
+def disable():
+    '''
+    Filter recordings as read.
+
+    Keyword arguments:
+
+    '''
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    '''
+    True if recordings are resampled before filtering.
+
+    Keyword arguments:
+
+    '''
+    return _enabled
+
+def settings():
+    '''
+    The resampling settings that change the outputs, or None when not
+    resampling.
+
+    Keyword arguments:
+
+    '''
+    if not _enabled:
+        return None
+    return {"max_gap_ms": RESAMPLE_MAX_GAP_MS, "min_segment_sec": RESAMPLE_MIN_SEGMENT_SEC, \
+            "fs_decimals": RESAMPLE_FS_DECIMALS}
+
+def check_streaming(streaming):
+    '''
+    Raise ValueError if a sensor is to be streamed while resampling is
+    enabled; stream_filter reads fixed size chunks and would filter gapped
+    data as contiguous.
+
+    Keyword arguments:
+    streaming -- None, "zero_phase" or "causal"
+
+    '''
+    if streaming is not None and _enabled:
+        raise ValueError("streaming does not resample, unset %s or load the whole file" %(RESAMPLE_ENV))
+
+def measure_fs(index):
+    '''
+    The sampling rate [Hz] from the median timestamp step [ms].
+
+    Keyword arguments:
+    index -- strictly increasing timestamps [ms]
+
+    '''
+    return 1000.0 / np.median(np.diff(index))
+
+def resample(df, fs=None, max_gap=RESAMPLE_MAX_GAP_MS, min_segment_sec=RESAMPLE_MIN_SEGMENT_SEC):
+    '''
+    Interpolate a recording onto a uniform grid. Returns the resampled frame,
+    without the grid points in long dropouts, and the gap report with the
+    measured rate and the (start, stop) row positions of each segment.
+
+    Keyword arguments:
+    df -- the recording, indexed by timestamp [ms]
+    fs -- the grid rate [Hz], defaults to the measured rate rounded to
+          RESAMPLE_FS_DECIMALS
+    max_gap -- the longest dropout that is interpolated [ms]
+    min_segment_sec -- shorter segments are dropped [s]
+
+    '''
+    ts, values = align.sorted_unique(df.index, df.values)
+    measured_fs = measure_fs(ts)
+    fs = round(measured_fs, RESAMPLE_FS_DECIMALS) if fs is None else fs
+    grid = align.uniform_grid(ts[0], ts[-1], 1000.0 / fs)
+    resampled = align.interpolate_onto(ts, values, grid, max_gap)
+    
+    steps = np.diff(ts)
+    gaps = align.find_gaps(ts, max_gap)
+    segments, dropped = [], []
+    for start, stop in detect.runs(~np.isnan(resampled).any(axis=1)):
+        if stop - start < min_segment_sec * fs:
+            dropped.append((start, stop))
+        else:
+            segments.append((start, stop))
+    keep = np.zeros(len(grid), dtype=bool)
+    for start, stop in segments:
+        keep[start:stop] = True
+    positions = np.cumsum(keep) - 1
+    
+    out_df = pd.DataFrame(resampled[keep].astype(values.dtype), \
+                          index=pd.Index(grid[keep], name=df.index.name), columns=df.columns)
+    report = {"nominal_fs": utils.SHIMMER_FS,
+              "measured_fs": measured_fs,
+              "fs": fs,
+              "input_rows": len(df),
+              "output_rows": len(out_df),
+              "duplicate_timestamps": len(df) - len(ts),
+              "max_gap_ms": max_gap,
+              "interpolated_gaps": int(np.sum((steps > 1.5 * 1000.0 / fs) & (steps <= max_gap))),
+              "long_gaps": [{"start": float(start), "end": float(end), "ms": float(end - start)} \
+                            for start, end in gaps],
+              "segments": [{"start": float(grid[start]), "end": float(grid[stop - 1]), \
+                            "rows": int(stop - start)} for start, stop in segments],
+              "dropped_segments": [{"start": float(grid[start]), "end": float(grid[stop - 1]), \
+                                    "rows": int(stop - start)} for start, stop in dropped],
+              "segment_rows": [(int(positions[start]), int(positions[stop - 1]) + 1) \
+                               for start, stop in segments]}
+    
+    print "resample(): measured %.3lf Hz, %d interpolated gaps, %d long gaps, %d segments" \
+        %(measured_fs, report["interpolated_gaps"], len(gaps), len(segments))
+    return out_df, report
+
+def prepare(df):
+    '''
+    The recording, rate and segments to orient and filter: the resample()
+    result if resampling is enabled, otherwise df as read at
+    utils.SHIMMER_FS as one segment. Returns (df, fs, segments, report),
+    report is None when not resampling.
+
+    Keyword arguments:
+    df -- the recording
+
+    '''
+    if not is_enabled():
+        return df, utils.SHIMMER_FS, None, None
+    out_df, report = resample(df)
+    
+    return out_df, report["fs"], report["segment_rows"], report
+
+def report_fname(out_fname):
+    '''
+    The gap report written next to an output.
+
+    Keyword arguments:
+    out_fname -- the output csv
+
+    '''
+    return utils.gap_report_fname(out_fname)
+
+def write_report(out_fname, report):
+    '''
+    Write the gap report of an output.
+
+    Keyword arguments:
+    out_fname -- the output csv
+    report -- the resample() report
+
+    '''
+    fout = open(report_fname(out_fname), "w")
+    json.dump(report, fout, indent=1, sort_keys=True)
+    fout.close()
@@ -0,0 +1,132 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- session.py
+Created on Oct 17, 2026
+
+Single pass session pipeline. Every sensor of a session is oriented and
+filtered into memory, the trials are chosen on the in-memory HIP data and
+HIP, LA, RA and DEV are chopped together. The _oriented_filtered.csv files
+are only written on request, so nothing is read back from disk.
+
+Usage:
+python session.py <Timestamp_Aligned path>
+
+Dependencies:
+pandas
+'''
+import os
+import sys
+
+import utils
+import main
+import profiling
+
+SENSOR_LOCS = ["HIP", "LA", "RA", "DEV"]
+
+class SessionPipeline(object):
+    '''
+    Orient, filter and chop one session in memory.
+
+    Keyword arguments:
+    path -- the session's Timestamp_Aligned directory
+    headless -- replay or detect section and trial times, QC figures are
+                saved as png instead of plotted
+    write_filtered -- also write the intermediate _oriented_filtered.csv files
+
+    '''
+    def __init__(self, path, headless=False, write_filtered=False):
+        self.path = path
+        self.headless = headless
+        self.write_filtered = write_filtered
+        session_path = os.path.split(path)[0]
+        self.filtered_path = os.path.join(session_path, "Filtered_Ankle_Corrected")
+        self.trials_path = os.path.join(session_path, "Trials")
+        # sensor_loc -> (source file name, oriented and filtered data)
+        self.filtered = {}
+        self.trial_times = None
+
+    def process(self, sensor_loc):
+        '''
+        Orient and filter one sensor into memory.
+
+        Keyword arguments:
+        sensor_loc -- HIP, LA, RA or DEV
+
+        '''
+        if sensor_loc == "HIP":
+            result = main.orient_filter_COM(self.path, headless=self.headless, \
+                                            write=self.write_filtered)
+        elif sensor_loc == "DEV":
+            result = main.orient_filter_assistive_device(self.path, headless=self.headless, \
+                                                         write=self.write_filtered)
+        else:
+            result = main.orient_filter_shank(self.path, sensor_loc, self.headless, \
+                                              write=self.write_filtered)
+        # not all participants use an assistive device
+        if result is not None:
+            self.filtered[sensor_loc] = result
+
+    def chop(self):
+        '''
+        Choose the trial times on the HIP data and write the trials of every
+        processed sensor.
+
+        Keyword arguments:
+
+        '''
+        if "HIP" not in self.filtered:
+            raise ValueError("HIP must be processed before chopping")
+        hip_fname, hip_df = self.filtered["HIP"]
+        notes_fname = os.path.join(self.filtered_path, "chopping_notes.txt")
+        chopped_plot_fname = os.path.join(self.filtered_path, "HIP_chopped.png")
+        self.trial_times = utils.choose_trial_times(hip_df, notes_fname, chopped_plot_fname, \
+                                                    self.headless)
+        
+        prefixes = main.get_trial_prefixes(self.trials_path)
+        for sensor_loc, (fname, df) in sorted(self.filtered.items()):
+            profiling.set_context(sensor_loc=sensor_loc)
+            if sensor_loc == "HIP":
+                trials = (df[self.trial_times[0]:self.trial_times[1]], \
+                          df[self.trial_times[2]:self.trial_times[3]])
+            else:
+                trials = utils.chop_trials(df, self.trial_times)
+            for prefix, trial_df in zip(prefixes, trials):
+                chopped_df_fname = os.path.join(self.trials_path, prefix + "_" + sensor_loc + ".csv")
+                utils.write_data(fname, chopped_df_fname, trial_df)
+
+    def run(self, sensor_locs=SENSOR_LOCS):
+        '''
+        Process the sensors and chop them into trials.
+
+        Keyword arguments:
+        sensor_locs -- the sensors to process, must include HIP
+
+        '''
+        for sensor_loc in sensor_locs:
+            self.process(sensor_loc)
+        self.chop()
+        
+        return self.trial_times
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(1)
+    SessionPipeline(sys.argv[1], headless=True).run()
@@ -0,0 +1,251 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- shimmer_cache.py
+Created on Oct 17, 2026
+
+On-disk cache of parsed Shimmer csv files. Only the raw sensor recordings
+in a Timestamp_Aligned directory are cached; the pipeline's own outputs
+(filtered files, trials) are written once and read rarely, so caching them
+would only double their disk use. Each entry lives in a .shimmer_cache
+directory next to the source file and is keyed by the source path, size
+and mtime. The numeric columns are stored column-major in a .npy file that
+is memory mapped on load, so a cached recording is not parsed or copied
+again.
+
+Dependencies:
+numpy, pandas
+'''
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIRNAME = ".shimmer_cache"
+# per cache directory, least recently used entries are evicted above this
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+# only sources in this directory are cached
+RAW_DIRNAME = "Timestamp_Aligned"
+# entries are written to a tmp dir with this prefix and renamed when complete
+TMP_PREFIX = "tmp-"
+# tmp dirs older than this were left by a killed process and are removed
+TMP_MAX_AGE_SEC = 3600
+
+def is_cached_source(fname):
+    '''
+    True if fname is a raw sensor recording, the only files that are cached.
+
+    Keyword arguments:
+    fname -- the Shimmer csv
+
+    '''
+    return os.path.basename(os.path.dirname(os.path.abspath(fname))) == RAW_DIRNAME
+
+def cache_dir(fname):
+    '''
+    The cache directory used for a source file.
+
+    Keyword arguments:
+    fname -- the Shimmer csv
+
+    '''
+    return os.path.join(os.path.dirname(os.path.abspath(fname)), CACHE_DIRNAME)
+
+def entry_path(fname):
+    '''
+    The cache entry path of a source file, keyed by path, size and mtime.
+
+    Keyword arguments:
+    fname -- the Shimmer csv
+
+    '''
+    fname = os.path.abspath(fname)
+    st = os.stat(fname)
+    key = hashlib.sha1("%s|%d|%r" %(fname, st.st_size, st.st_mtime)).hexdigest()[:16]
+    
+    return os.path.join(cache_dir(fname), os.path.basename(fname) + "-" + key)
+
+def load(fname, dtype=None):
+    '''
+    Load a cached recording as a DataFrame backed by a copy-on-write memory
+    map. Returns None if the file is not cached, the entry is stale or it was
+    stored in a lower precision than dtype. Float data in another dtype is
+    cast from the map, so only the cast copy is held in memory.
+
+    Keyword arguments:
+    fname -- the Shimmer csv
+    dtype -- float dtype of the data columns, None keeps the stored dtype
+
+    '''
+    if not is_cached_source(fname) or not os.path.isfile(fname):
+        return None
+    entry = entry_path(fname)
+    meta_fname = os.path.join(entry, "meta.json")
+    if not os.path.isfile(meta_fname):
+        return None
+    
+    fin = open(meta_fname, "r")
+    meta = json.load(fin)
+    fin.close()
+    stored = np.dtype(meta.get("dtype", "float64"))
+    if dtype is not None and stored.kind == "f" and stored.itemsize < np.dtype(dtype).itemsize:
+        return None
+    # mark the entry as recently used for eviction
+    os.utime(meta_fname, None)
+    
+    index = np.load(os.path.join(entry, "index.npy"), mmap_mode='c')
+    data = np.load(os.path.join(entry, "data.npy"), mmap_mode='c')
+    if dtype is not None and stored.kind == "f":
+        data = data.astype(dtype, copy=False)
+    # data is stored (columns, rows) so data.T maps straight onto one pandas block
+    return pd.DataFrame(data.T, index=pd.Index(index, name=meta["index_name"]), \
+                        columns=meta["columns"], copy=False)
+
+def store(fname, df, header):
+    '''
+    Store a parsed recording in the cache. Sources that are not raw sensor
+    recordings (see is_cached_source()) and frames with non-numeric or mixed
+    dtype columns are not cached. Stale entries for the same source and tmp
+    dirs left by killed processes are removed and the cache directory is
+    trimmed to CACHE_MAX_BYTES.
+
+    Keyword arguments:
+    fname -- the Shimmer csv df was parsed from
+    df -- the parsed recording
+    header -- the raw 4-line Shimmer header
+
+    '''
+    if not is_cached_source(fname):
+        return False
+    dtypes = set(df.dtypes)
+    if len(dtypes) != 1 or list(dtypes)[0].kind not in "fiu":
+        return False
+    
+    entry = entry_path(fname)
+    invalidate(fname)
+    path = cache_dir(fname)
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    
+    tmp = tempfile.mkdtemp(prefix=TMP_PREFIX, dir=path)
+    try:
+        np.save(os.path.join(tmp, "index.npy"), np.asarray(df.index))
+        np.save(os.path.join(tmp, "data.npy"), np.ascontiguousarray(df.values.T))
+        meta = {"source": os.path.abspath(fname),
+                "index_name": df.index.name,
+                "columns": [str(col) for col in df.columns],
+                "dtype": list(dtypes)[0].name,
+                "header": header}
+        fout = open(os.path.join(tmp, "meta.json"), "w")
+        json.dump(meta, fout)
+        fout.close()
+        os.rename(tmp, entry)
+    except (IOError, OSError):
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    
+    sweep_tmp(path, TMP_MAX_AGE_SEC)
+    evict(path, CACHE_MAX_BYTES)
+    return True
+
+def invalidate(fname):
+    '''
+    Remove every cache entry of a source file, whatever its size and mtime.
+
+    Keyword arguments:
+    fname -- the Shimmer csv
+
+    '''
+    path = cache_dir(fname)
+    if not os.path.isdir(path):
+        return
+    prefix = os.path.basename(fname) + "-"
+    for entry in os.listdir(path):
+        if entry.startswith(prefix) and len(entry) == len(prefix) + 16:
+            shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+
+def clear(path):
+    '''
+    Remove the whole cache next to the files in a directory.
+
+    Keyword arguments:
+    path -- directory containing Shimmer csv files
+
+    '''
+    shutil.rmtree(os.path.join(path, CACHE_DIRNAME), ignore_errors=True)
+
+def sweep_tmp(path, max_age):
+    '''
+    Remove the tmp dirs of entries that were never completed, e.g. because
+    the writing process was killed. Younger tmp dirs may still be written.
+
+    Keyword arguments:
+    path -- the cache directory
+    max_age -- age of the oldest tmp dir kept [s]
+
+    '''
+    now = time.time()
+    for entry in os.listdir(path):
+        if not entry.startswith(TMP_PREFIX):
+            continue
+        entry = os.path.join(path, entry)
+        # another process may complete or remove it meanwhile
+        try:
+            if now - os.path.getmtime(entry) > max_age:
+                shutil.rmtree(entry, ignore_errors=True)
+        except OSError:
+            continue
+
+def evict(path, max_bytes):
+    '''
+    Remove least recently used entries until the cache directory fits max_bytes.
+    Entries still being written (tmp dirs) are neither counted nor removed.
+
+    Keyword arguments:
+    path -- the cache directory
+    max_bytes -- total size allowed for the directory
+
+    '''
+    entries = []
+    total = 0
+    for entry in os.listdir(path):
+        if entry.startswith(TMP_PREFIX):
+            continue
+        entry = os.path.join(path, entry)
+        meta_fname = os.path.join(entry, "meta.json")
+        if not os.path.isfile(meta_fname):
+            continue
+        # another process may rename or remove an entry while it is measured
+        try:
+            size = sum(os.path.getsize(os.path.join(entry, fil)) for fil in os.listdir(entry))
+            entries.append((os.path.getmtime(meta_fname), size, entry))
+        except OSError:
+            continue
+        total += size
+    
+    entries.sort()
+    while total > max_bytes and entries:
+        _, size, entry = entries.pop(0)
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
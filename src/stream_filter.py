@@ -0,0 +1,191 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- stream_filter.py
+Created on Oct 17, 2026
+
+Bounded-memory filtering of very long Shimmer recordings. The csv is read
+in chunks, filtered with the apply_filter() chain and written out chunk by
+chunk, so peak memory does not depend on the file length. Two modes:
+1. "causal": forward-only sosfilt with the filter state carried between
+   chunks (introduces phase lag)
+2. "zero_phase": sosfiltfilt over each chunk plus overlap rows of context
+   on both sides; with enough overlap the output matches apply_filter()
+Only sensors with a fixed orientation (COM and DEV) can be streamed: the
+shank sensors (LA, RA) are rotated by a matrix computed from operator
+chosen still sections of the whole recording, so they are read whole.
+
+Dependencies:
+numpy, pandas, scipy
+'''
+import os
+
+import numpy as np
+import pandas as pd
+import scipy.signal as signal
+
+import binary_io
+import utils
+import profiling
+
+STREAM_CHUNK_ROWS = 100000
+# context rows on each side of a zero phase chunk, 120 s at 51.2 Hz covers
+# the decay of the 0.1 Hz highpass impulse response
+STREAM_OVERLAP_ROWS = 6144
+
+def read_chunks(fname, chunk_rows=STREAM_CHUNK_ROWS):
+    '''
+    Iterate over a Shimmer csv in DataFrame chunks of chunk_rows rows.
+
+    Keyword arguments:
+    fname -- the Shimmer csv
+    chunk_rows -- rows per chunk
+
+    '''
+    # row 0 is device name, row 1 is signal name, row 2 is Raw or Cal, row 3 is units
+    return pd.read_csv(fname, skiprows=[0, 2, 3], header=0, index_col=0, chunksize=chunk_rows)
+
+def causal_filter_chunks(chunks, sensor_loc, fs=utils.SHIMMER_FS):
+    '''
+    Filter DataFrame chunks forward only, carrying the filter state over.
+    The state starts at the steady state of the first sample.
+
+    Keyword arguments:
+    chunks -- iterable of DataFrame chunks in time order
+    sensor_loc -- HIP, WALKER, LA, RA or CANE
+    fs -- sampling rate [Hz]
+
+    '''
+    labels = utils.accel_labels + utils.gyro_labels
+    high_sos, low_sos, gyro_sos = utils.get_filter_design(sensor_loc, fs)
+    zi = None
+    for chunk in chunks:
+        buf = np.array(chunk[labels].values, dtype=np.float64)
+        if len(buf) == 0:
+            continue
+        if zi is None:
+            first = buf[0]
+            zi = [signal.sosfilt_zi(high_sos)[:, :, None] * first[None, None, :3], \
+                  None, \
+                  signal.sosfilt_zi(gyro_sos)[:, :, None] * first[None, None, 3:]]
+        high, zi[0] = signal.sosfilt(high_sos, buf[:, :3], axis=0, zi=zi[0])
+        if zi[1] is None:
+            # the highpass output starts at zero
+            zi[1] = np.zeros((low_sos.shape[0], 2, 3))
+        buf[:, :3], zi[1] = signal.sosfilt(low_sos, high, axis=0, zi=zi[1])
+        buf[:, 3:], zi[2] = signal.sosfilt(gyro_sos, buf[:, 3:], axis=0, zi=zi[2])
+        
+        chunk = chunk.copy()
+        chunk[labels] = buf
+        yield chunk
+
+def zero_phase_filter_chunks(chunks, sensor_loc, fs=utils.SHIMMER_FS, overlap=STREAM_OVERLAP_ROWS):
+    '''
+    Filter DataFrame chunks forward-backward with overlap rows of context
+    on each side. At most one chunk plus 2 * overlap rows are held at once.
+
+    Keyword arguments:
+    chunks -- iterable of DataFrame chunks in time order
+    sensor_loc -- HIP, WALKER, LA, RA or CANE
+    fs -- sampling rate [Hz]
+    overlap -- context rows on each side of a chunk
+
+    '''
+    labels = utils.accel_labels + utils.gyro_labels
+    window = None
+    # leading rows of window that were already written and are only context
+    n_ctx = 0
+    for chunk in chunks:
+        window = chunk if window is None else pd.concat([window, chunk])
+        # rows that have a full overlap of right context
+        ready = len(window) - n_ctx - overlap
+        if ready <= 0:
+            continue
+        yield _filter_window(window, labels, sensor_loc, fs).iloc[n_ctx:n_ctx + ready]
+        start = max(0, n_ctx + ready - overlap)
+        n_ctx = n_ctx + ready - start
+        window = window.iloc[start:]
+    
+    if window is not None and len(window) > n_ctx:
+        yield _filter_window(window, labels, sensor_loc, fs).iloc[n_ctx:]
+
+def _filter_window(window, labels, sensor_loc, fs):
+    buf = utils.load_buffer(window, labels, np.float64)
+    utils.filter_channels(buf, sensor_loc, fs)
+    filtered = window.copy()
+    filtered[labels] = buf
+    
+    return filtered
+
+def stream_filter(fname, out_fname, sensor_loc, mode="zero_phase", transform=None, \
+                  fs=utils.SHIMMER_FS, chunk_rows=STREAM_CHUNK_ROWS, overlap=STREAM_OVERLAP_ROWS):
+    '''
+    Filter a Shimmer csv chunk by chunk and write it in the write_data()
+    format, csv or binary as binary_io.output_format() selects.
+
+    Keyword arguments:
+    fname -- the Shimmer csv, its header is copied to the output
+    out_fname -- the output file
+    sensor_loc -- HIP, WALKER, LA, RA or CANE
+    mode -- "zero_phase" or "causal"
+    transform -- optional per-sample function applied to each chunk before
+                 filtering, e.g. utils.orient_COM
+    fs -- sampling rate [Hz]
+    chunk_rows -- rows read per chunk
+    overlap -- context rows on each side of a chunk in zero_phase mode
+
+    '''
+    print "stream_filter(): sensor_loc %s, mode %s" %(sensor_loc, mode)
+    chunks = read_chunks(fname, chunk_rows)
+    if transform is not None:
+        chunks = (transform(chunk) for chunk in chunks)
+    if mode == "causal":
+        filtered = causal_filter_chunks(chunks, sensor_loc, fs)
+    elif mode == "zero_phase":
+        filtered = zero_phase_filter_chunks(chunks, sensor_loc, fs, overlap)
+    else:
+        raise ValueError("unknown streaming mode: %s" %(mode))
+    
+    header = utils.read_header(fname)
+    output_format = binary_io.output_format()
+    with profiling.stage("stream_filter", sensor_loc=sensor_loc, mode=mode) as rec:
+        # as in write_data(), outputs of the other format and an old gap
+        # report are removed so they are not read instead
+        if os.path.isfile(utils.gap_report_fname(out_fname)):
+            os.remove(utils.gap_report_fname(out_fname))
+        rows = 0
+        if output_format != "csv":
+            if os.path.isfile(out_fname):
+                os.remove(out_fname)
+            writer = binary_io.ChunkWriter(out_fname, header, binary_io.OUTPUT_DTYPES[output_format])
+            for chunk in filtered:
+                writer.write(chunk)
+                rows += len(chunk)
+            writer.close()
+        else:
+            binary_io.remove(out_fname)
+            fout = open(out_fname, "w")
+            fout.writelines(header)
+            for chunk in filtered:
+                utils.write_rows(fout, chunk)
+                rows += len(chunk)
+            fout.close()
+        rec.rows = rows
+    
+    return rows
@@ -0,0 +1,183 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- synthetic.py
+Created on Oct 17, 2026
+
+Synthetic Shimmer3 recordings for testing and benchmarking without
+participant data. A recording starts with a leg horizontal and a leg
+vertical still section (gravity on sensor Z, then on sensor X, see
+detect.SHANK_AXIS) followed by alternating walking and resting segments.
+Files are generated and written in chunks, so recordings of several days
+use little memory.
+
+Dependencies:
+numpy, pandas
+'''
+import os
+
+import numpy as np
+import pandas as pd
+
+import utils
+
+GRAVITY = 9.80665
+START_TS = 0.0
+CALIBRATION_SEC = 10.0
+WALK_SEC = 120.0
+REST_SEC = 60.0
+# walking cadence [Hz], about 114 steps per minute
+CADENCE_HZ = 1.9
+GENERATE_CHUNK_ROWS = 100000
+
+HEADER = ["Shimmer_SYN0,Shimmer_SYN0,Shimmer_SYN0,Shimmer_SYN0,Shimmer_SYN0,Shimmer_SYN0,Shimmer_SYN0\n",
+          "Timestamp," + ",".join(utils.accel_labels + utils.gyro_labels) + "\n",
+          "CAL,CAL,CAL,CAL,CAL,CAL,CAL\n",
+          "mSecs,m/(sec^2),m/(sec^2),m/(sec^2),deg/sec,deg/sec,deg/sec\n"]
+
+def default_segments(duration_sec):
+    '''
+    The default segment schedule: calibration, then walking and resting
+    until duration_sec. Returns a list of (kind, seconds), kind is one of
+    "horizontal", "vertical", "walk" or "rest".
+
+    Keyword arguments:
+    duration_sec -- total length [s]
+
+    '''
+    segments = [("horizontal", CALIBRATION_SEC), ("vertical", CALIBRATION_SEC)]
+    remaining = duration_sec - 2 * CALIBRATION_SEC
+    pattern = [("rest", REST_SEC), ("walk", WALK_SEC)]
+    i = 0
+    while remaining > 0:
+        kind, sec = pattern[i % 2]
+        segments.append((kind, min(sec, remaining)))
+        remaining -= sec
+        i += 1
+    
+    return segments
+
+def segment_signal(kind, t, rng, noise):
+    '''
+    Accel and gyro samples of one kind of segment at times t.
+
+    Keyword arguments:
+    kind -- "horizontal", "vertical", "walk" or "rest"
+    t -- sample times [s]
+    rng -- numpy RandomState
+    noise -- accel noise std [m/s^2], gyro noise is 20 times larger [deg/s]
+
+    '''
+    n = len(t)
+    accel = np.zeros((n, 3))
+    gyro = np.zeros((n, 3))
+    if kind == "horizontal":
+        accel[:, 2] = GRAVITY
+    elif kind in ("vertical", "rest"):
+        accel[:, 0] = GRAVITY
+    else:
+        phase = 2 * np.pi * CADENCE_HZ * t
+        accel[:, 0] = GRAVITY + 3.0 * np.sin(phase) + 1.0 * np.sin(2 * phase)
+        accel[:, 1] = 2.0 * np.sin(phase + 1.0)
+        accel[:, 2] = 1.5 * np.sin(0.5 * phase)
+        gyro[:, 2] = 120.0 * np.sin(0.5 * phase)
+        gyro[:, 0] = 20.0 * np.sin(phase + 0.5)
+        gyro[:, 1] = 15.0 * np.sin(phase)
+    
+    accel += rng.randn(n, 3) * noise
+    gyro += rng.randn(n, 3) * noise * 20
+    
+    return np.hstack([accel, gyro])
+
+def generate(fname, duration_sec, fs=utils.SHIMMER_FS, noise=0.05, seed=0, segments=None, \
+             start_ts=START_TS, chunk_rows=GENERATE_CHUNK_ROWS):
+    '''
+    Write a synthetic Shimmer3 csv with the 4-line header and a timestamp
+    index [ms]. Returns the segment schedule with sample positions as
+    (kind, start, stop).
+
+    Keyword arguments:
+    fname -- the output csv
+    duration_sec -- length of the recording [s]
+    fs -- sampling rate [Hz]
+    noise -- accel noise std [m/s^2]
+    seed -- random seed
+    segments -- (kind, seconds) schedule, defaults to default_segments()
+    start_ts -- first timestamp [ms]
+    chunk_rows -- rows generated and written per chunk
+
+    '''
+    if segments is None:
+        segments = default_segments(duration_sec)
+    rng = np.random.RandomState(seed)
+    
+    # sample position of every segment boundary
+    bounds = np.concatenate([[0], np.cumsum([int(round(sec * fs)) for _, sec in segments])])
+    kinds = np.repeat(np.arange(len(segments)), np.diff(bounds))
+    n = bounds[-1]
+    
+    fout = open(fname, "w")
+    fout.writelines(HEADER)
+    for start in range(0, n, chunk_rows):
+        stop = min(start + chunk_rows, n)
+        pos = np.arange(start, stop)
+        t = pos / fs
+        values = np.empty((stop - start, 6))
+        for k in np.unique(kinds[start:stop]):
+            mask = kinds[start:stop] == k
+            values[mask] = segment_signal(segments[k][0], t[mask], rng, noise)
+        chunk = pd.DataFrame(values, index=start_ts + pos * (1000.0 / fs), \
+                             columns=utils.accel_labels + utils.gyro_labels)
+        utils.write_rows(fout, chunk)
+    fout.close()
+    
+    return [(kind, bounds[i], bounds[i + 1]) for i, (kind, _) in enumerate(segments)]
+
+def generate_session(root, duration_sec, session="000/000_S1", fs=utils.SHIMMER_FS, seed=0):
+    '''
+    Write a synthetic session: LA, RA, HIP and WALKER recordings, the
+    DEV_axes.txt file and two trial META files. Returns the session's
+    Timestamp_Aligned directory.
+
+    Keyword arguments:
+    root -- the Participant_Data directory to create the session in
+    duration_sec -- length of each recording [s]
+    session -- the session's path below root
+    fs -- sampling rate [Hz]
+    seed -- random seed of the first sensor
+
+    '''
+    session_path = os.path.join(root, session)
+    path = os.path.join(session_path, "Timestamp_Aligned")
+    for dirname in [path, os.path.join(session_path, "Filtered_Ankle_Corrected", "Orientation_Parameters"), \
+                    os.path.join(session_path, "Trials")]:
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+    
+    for i, sensor_loc in enumerate(["LA", "RA", "HIP", "WALKER"]):
+        generate(os.path.join(path, sensor_loc + ".csv"), duration_sec, fs, seed=seed + i)
+    
+    fout = open(os.path.join(path, "DEV_axes.txt"), "w")
+    fout.write("new,orig,modifier\nX,Z,-1\nY,Y,1\nZ,X,1\n")
+    fout.close()
+    for prefix in ["T001", "T002"]:
+        fout = open(os.path.join(session_path, "Trials", prefix + "_META.csv"), "w")
+        fout.close()
+    
+    return path
@@ -32,13 +32,83 @@ pandas
 
 @author: Gina Sprint and Vladimir Borisov
 '''
+import json
+import os
+import re
+from collections import namedtuple
+
 import numpy as np
 import pandas as pd
 import scipy.signal as signal
 import matplotlib.pyplot as plt
 
+import binary_io
+import detect
+import fft_filter
+import parallel_filter
+import profiling
+import qc_plot
+import shimmer_cache
+
 TS_OFFSET = 500
 
+# number of rows formatted and written per block by write_data()
+WRITE_CHUNK_ROWS = 50000
+
+# SHIMMER DEFAULT sampling rate [Hz]
+SHIMMER_FS = 51.2
+
+# sensor_loc: (accel highpass, accel lowpass, gyro lowpass) cutoffs [Hz]
+# the 0.1 Hz highpass has always been designed as 0.00388 * nyquist
+# gyro lowpass cutoff at 4Hz (Tong and Granat 1999)
+FILTER_CUTOFFS = {"HIP": (0.00388 * 25.6, 3.0, 4.0), \
+                  "WALKER": (0.00388 * 25.6, 3.0, 4.0), \
+                  "LA": (0.00388 * 25.6, 10.0, 4.0), \
+                  "RA": (0.00388 * 25.6, 10.0, 4.0), \
+                  "CANE": (0.00388 * 25.6, 10.0, 4.0)}
+FILTER_ORDER = 4
+
+# max abs deviation of the sos filters from the old ba form filtfilt output,
+# relative to the channel's peak magnitude, measured on 51.2 Hz recordings
+FILTER_SOS_TOLERANCE = 1e-6
+
+# cached second-order-section designs keyed by (sensor_loc, fs, cutoffs)
+_filter_designs = {}
+
+# zero-phase filtering engine per sensor_loc, "sos" (sosfiltfilt) or "fft"
+# (overlap-save, see fft_filter); the environment variable is one engine for
+# every location or a list such as "HIP=fft,LA=fft"
+FILTER_ENGINE_ENV = "SENSOR_FILTER_ENGINE"
+FILTER_ENGINES = ["sos", "fft"]
+# max abs deviation of the fft engine from sos, relative to the channel's peak magnitude (see benchmark.engine_benchmarks)
+FFT_FILTER_TOLERANCE = 1e-6
+# sensor_loc -> engine, None holds the default
+_filter_engines = dict(spec.split("=", 1) if "=" in spec else (None, spec) \
+                       for spec in os.environ.get(FILTER_ENGINE_ENV, "sos").split(","))
+
+# processes the sos engine spreads the six channels over (see
+# parallel_filter), 1 filters serially; buffers shorter than
+# PARALLEL_MIN_ROWS are always filtered serially, forking costs more
+FILTER_WORKERS_ENV = "SENSOR_FILTER_WORKERS"
+PARALLEL_MIN_ROWS = 2 ** 17
+_filter_workers = int(os.environ.get(FILTER_WORKERS_ENV, "1"))
+
+# working precision of the sensor channels, "float64" or "float32"; the
+# index stays float64 and the filters always run in float64
+PRECISION_ENV = "SENSOR_PRECISION"
+PRECISION_DTYPES = {"float64": np.float64, "float32": np.float32}
+# max abs deviation of float32 orient and filter output from float64,
+# relative to the channel's peak magnitude; benchmark.check_precision()
+# raises above it
+FLOAT32_TOLERANCE = 1e-6
+_precision = os.environ.get(PRECISION_ENV, "float64")
+
+# marks candidate times in a notes file that the operator has not confirmed
+NEEDS_REVIEW_NOTE = "Needs review: confirm or correct these times in an interactive run"
+
+# a still calibration section should have an accel norm std below this [m/s^2]
+STILLNESS_NORM_STD = 0.5
+
 accel_labels = ["Wide Range Accelerometer X", \
                 "Wide Range Accelerometer Y", \
                 "Wide Range Accelerometer Z"]
@@ -46,22 +116,134 @@ accel_labels = ["Wide Range Accelerometer X", \
 gyro_labels = ["Gyroscope X", \
                "Gyroscope Y", \
                "Gyroscope Z"]
+
+# (axes file, size, mtime) -> compiled axes matrix, see compile_axes()
+_axes_matrices = {}
+
+# GS: swapping X and Z to align with the international society of biomechanics
+# where X is in the direction of travel (mounted backwards on COM, *-1)
+# Y is vertical
+COM_ROTATION = np.array([[0.0, 0.0, -1.0], \
+                         [0.0, 1.0, 0.0], \
+                         [1.0, 0.0, 0.0]])
+
+def set_precision(precision):
+    '''
+    Select the working precision of the sensor channels: "float64" or "float32".
+
+    Keyword arguments:
+    precision -- the precision
+
+    '''
+    global _precision
+    if precision not in PRECISION_DTYPES:
+        raise ValueError("unknown precision: %s" %(precision))
+    _precision = precision
+
+def work_dtype():
+    '''
+    The dtype of the sensor channels while reading, orienting and filtering.
+
+    Keyword arguments:
+
+    '''
+    return PRECISION_DTYPES[_precision]
+
+SectionStats = namedtuple("SectionStats", ["mean_norm", "norm_std", "axis_means", \
+                                           "axis_var", "count"])
+
+class NeedsReview(Exception):
+    '''
+    Raised in headless mode instead of prompting when no times were saved
+    and the detected ones are not confident enough to use unattended. The
+    candidates are saved in the notes (see write_notes()) for the operator
+    to confirm in an interactive run.
+
+    '''
     
+class TimestampLookup(object):
+    '''
+    Sorted view over a sensor index for batch nearest-timestamp lookups.
+    The view is built once and every query is answered with a binary search,
+    reproducing closest_timestamp() exactly: on equal distance the value that
+    occurs first in the original index wins.
+
+    Keyword arguments:
+    ind_list -- the sensor index (DataFrame index, list or array of timestamps)
+
+    '''
+    def __init__(self, ind_list):
+        values = np.asarray(ind_list)
+        if values.dtype == object:
+            values = values.astype(np.float64)
+        if values.dtype.kind == 'f':
+            values = values[~np.isnan(values)]
+        if len(values) == 0:
+            raise IndexError("cannot look up timestamps in an empty index")
+        if np.all(values[1:] > values[:-1]):
+            # already strictly increasing, index order == sorted order
+            self.values = values
+            self.first_pos = None
+        else:
+            # np.unique returns the position of the first occurrence of each value
+            self.values, self.first_pos = np.unique(values, return_index=True)
+
+    def nearest(self, ts, mode="nearest", tie="first", offset=0):
+        '''
+        Find the index values closest to one or more query timestamps.
+
+        Keyword arguments:
+        ts -- a query timestamp or an array of query timestamps
+        mode -- "nearest", "after" (nearest value not before ts) or
+                "before" (nearest value not after ts); when no value
+                satisfies the constraint the closest end of the index is used
+        tie -- on equal distance pick the "first" value in index order
+               (closest_timestamp behavior), the "earlier" or the "later" one
+        offset -- added to every query first, e.g. -TS_OFFSET
+
+        '''
+        vals = self.values
+        last = len(vals) - 1
+        q = np.asarray(ts, dtype=np.float64) + offset
+        right = np.searchsorted(vals, q, side='left')
+
+        if mode == "after":
+            idx = np.minimum(right, last)
+        elif mode == "before":
+            idx = np.maximum(np.searchsorted(vals, q, side='right') - 1, 0)
+        elif mode == "nearest":
+            lo = np.clip(right - 1, 0, last)
+            hi = np.clip(right, 0, last)
+            d_lo = np.abs(vals[lo] - q)
+            d_hi = np.abs(vals[hi] - q)
+            if tie == "first":
+                if self.first_pos is None:
+                    prefer_hi = np.zeros(q.shape, dtype=bool)
+                else:
+                    prefer_hi = self.first_pos[hi] < self.first_pos[lo]
+            elif tie == "earlier":
+                prefer_hi = np.zeros(q.shape, dtype=bool)
+            elif tie == "later":
+                prefer_hi = np.ones(q.shape, dtype=bool)
+            else:
+                raise ValueError("unknown tie rule: %s" %(tie))
+            idx = np.where((d_hi < d_lo) | ((d_hi == d_lo) & prefer_hi), hi, lo)
+        else:
+            raise ValueError("unknown lookup mode: %s" %(mode))
+
+        return vals[idx]
+
 def closest_timestamp(ind_list, ts):
     '''
     Find the nearest value in an index given an estimated timestamp.
+    For more than one lookup on the same index build a TimestampLookup once.
 
     Keyword arguments:
+    ind_list -- the sensor index
+    ts -- the estimated timestamp
 
     '''
-    closest = ind_list[0]
-    for val in ind_list:
-        delta = abs(val-ts)
-
-        if delta < abs(closest - ts):
-            closest = val
-            
-    return closest
+    return TimestampLookup(ind_list).nearest(ts)
 
 def compute_vector_norm(vec): 
     '''
@@ -72,101 +254,253 @@ def compute_vector_norm(vec):
     '''
     return np.linalg.norm(vec)   
 
+def compute_section_stats(XYZ_df):
+    '''
+    Compute the accel statistics of a static section in one vectorized pass:
+    mean and std of the accel norm, per-axis means and variances and the
+    number of samples. A large norm std means the sensor was not still.
+
+    Keyword arguments:
+    XYZ_df -- DataFrame containing the accel_labels columns
+
+    '''
+    accel = np.ascontiguousarray(XYZ_df[accel_labels].values, dtype=np.float64)
+    norms = np.sqrt(np.einsum('ij,ij->i', accel, accel))
+    
+    return SectionStats(mean_norm=norms.mean(), norm_std=norms.std(), \
+                        axis_means=accel.mean(axis=0), axis_var=accel.var(axis=0), \
+                        count=len(accel))
+
 def compute_avg_accel_norm(XYZ_df): 
     '''
-    Compute vector norm.
+    Compute the average accel vector norm.
+
+    Keyword arguments:
+    XYZ_df -- DataFrame containing the accel_labels columns
+
+    '''
+    return compute_section_stats(XYZ_df).mean_norm
+
+def check_stillness(stats, section_name):
+    '''
+    Warn if a calibration section moves too much to be used for orientation.
+
+    Keyword arguments:
+    stats -- SectionStats of the section
+    section_name -- name used in the printed warning
+
+    '''
+    if stats.count == 0 or stats.norm_std > STILLNESS_NORM_STD:
+        print "WARNING: %s section is not still (%d samples, norm std %.3lf)" \
+            %(section_name, stats.count, stats.norm_std)
+        return False
+    return True
+
+def get_filter_design(sensor_loc, fs=SHIMMER_FS):
+    '''
+    Butterworth designs in second-order-section form for a sensor location,
+    cached by (sensor_loc, fs, cutoffs). Cutoffs come from FILTER_CUTOFFS and
+    are normalized to the nyquist frequency, e.g. at 51.2Hz:
+    3Hz => 0.1171875, 10Hz => 0.390625, 4Hz => 0.15625.
 
     Keyword arguments:
+    sensor_loc -- HIP, WALKER, LA, RA or CANE
+    fs -- sampling rate [Hz]
 
     '''
-    norms = []
+    if sensor_loc not in FILTER_CUTOFFS:
+        raise ValueError("no filter cutoffs for sensor location: %s" %(sensor_loc))
+    cutoffs = FILTER_CUTOFFS[sensor_loc]
+    key = (sensor_loc, fs, cutoffs)
+    if key not in _filter_designs:
+        nyquist = fs / 2.0
+        high, low, gyro_low = cutoffs
+        _filter_designs[key] = \
+            (signal.butter(FILTER_ORDER, high / nyquist, 'highpass', output='sos'), \
+             signal.butter(FILTER_ORDER, low / nyquist, 'lowpass', output='sos'), \
+             signal.butter(FILTER_ORDER, gyro_low / nyquist, 'lowpass', output='sos'))
     
-    for i in range(len(XYZ_df)):
-        norms.append(compute_vector_norm(np.array(XYZ_df.iloc[i][accel_labels])))
+    return _filter_designs[key]
+
+def set_filter_engine(engine, sensor_locs=None):
+    '''
+    Select the zero-phase filtering engine used by filter_channels().
+
+    Keyword arguments:
+    engine -- "sos" or "fft"
+    sensor_locs -- locations to set, None sets the default for all others
+
+    '''
+    if engine not in FILTER_ENGINES:
+        raise ValueError("unknown filter engine: %s" %(engine))
+    for sensor_loc in [None] if sensor_locs is None else sensor_locs:
+        _filter_engines[sensor_loc] = engine
+
+def filter_engine(sensor_loc):
+    '''
+    The zero-phase filtering engine selected for a sensor location.
+
+    Keyword arguments:
+    sensor_loc -- HIP, WALKER, LA, RA or CANE
+
+    '''
+    engine = _filter_engines.get(sensor_loc, _filter_engines.get(None, "sos"))
+    if engine not in FILTER_ENGINES:
+        raise ValueError("unknown filter engine for %s: %s" %(sensor_loc, engine))
+    return engine
+
+def set_filter_workers(workers):
+    '''
+    Set the number of processes filter_channels() uses by default.
+
+    Keyword arguments:
+    workers -- process count, 1 filters serially
+
+    '''
+    global _filter_workers
+    _filter_workers = max(int(workers), 1)
+
+def filter_channels(buf, sensor_loc, fs=SHIMMER_FS, engine=None, workers=None):
+    '''
+    Zero-phase filter a (samples, 6) buffer holding the accel channels followed
+    by the gyro channels. All accel channels are filtered as one 2-D array along
+    the time axis, then all gyro channels, and the results are written back
+    into buf. The filters run in float64, a float32 buf is rounded on the
+    write back. Matches the old per-column ba form filtfilt within
+    FILTER_SOS_TOLERANCE (sos is better conditioned at the 0.1Hz highpass).
+    The "fft" engine applies the same |H|^2 response to all six channels
+    with fft_filter instead, within FFT_FILTER_TOLERANCE; buffers too short
+    for its kernel fall back to sosfiltfilt. With more than one worker the
+    sos engine filters each channel in its own process (see parallel_filter),
+    with an identical result; inside batch workers, which may not fork, and
+    for buffers below PARALLEL_MIN_ROWS it filters serially.
+
+    Keyword arguments:
+    buf -- float array of shape (samples, 6), modified in place
+    sensor_loc -- HIP, WALKER, LA, RA or CANE
+    fs -- sampling rate [Hz]
+    engine -- "sos" or "fft", defaults to set_filter_engine() or the
+              SENSOR_FILTER_ENGINE environment variable
+    workers -- process count for the sos engine, defaults to
+               set_filter_workers() or the SENSOR_FILTER_WORKERS
+               environment variable
+
+    '''
+    high_sos, low_sos, gyro_sos = get_filter_design(sensor_loc, fs)
+    chains = [(high_sos, low_sos)] * 3 + [(gyro_sos,)] * 3
+    engine = filter_engine(sensor_loc) if engine is None else engine
+    if engine == "fft":
+        key = (sensor_loc, fs, FILTER_CUTOFFS[sensor_loc])
+        if len(buf) >= fft_filter.kernel_min_rows(chains, key):
+            return fft_filter.filter_buffer(buf, chains, key)
+        profiling.debug("filter_fallback", "filter_channels(): %d samples is too short for the fft kernel, using sos" \
+                        %(len(buf)), samples=len(buf))
+    
+    workers = _filter_workers if workers is None else workers
+    if workers > 1 and len(buf) >= PARALLEL_MIN_ROWS and parallel_filter.can_fork_workers():
+        return parallel_filter.filter_buffer(buf, chains, workers)
+    
+    accel = buf[:, :3]
+    accel[:] = signal.sosfiltfilt(low_sos, signal.sosfiltfilt(high_sos, accel, axis=0), axis=0)
+    gyro = buf[:, 3:]
+    gyro[:] = signal.sosfiltfilt(gyro_sos, gyro, axis=0)
+    
+    return buf
+
+def load_buffer(df, labels, dtype):
+    '''
+    Copy columns of df into a new column-major buffer, one column at a
+    time, so the channels are copied once and no intermediate frame or
+    row-major array is made.
+
+    Keyword arguments:
+    df -- the sensor data
+    labels -- the columns to load, in buffer order
+    dtype -- the buffer dtype
+
+    '''
+    buf = np.empty((len(df), len(labels)), dtype=dtype, order='F')
+    for j, label in enumerate(labels):
+        buf[:, j] = df[label].values
     
-    return np.mean(norms)
+    return buf
 
-def apply_filter(df, sensor_loc):
+@profiling.profiled("apply_filter")
+def apply_filter(df, sensor_loc, fs=SHIMMER_FS):
     '''
     Applied filters according to the following:
-    SHIMMER DEFAULT == 51.2Hz
-    [0-1] 0-nyquist= (sampling rate)/2
-    NYQUIST == 25.6Hz
-    0.1171875->3hz  0.00390625->.1Hz
-    10 Hz Add reference... => .390625
+    accel: 0.1Hz highpass then 3Hz (HIP, WALKER) or 10Hz (LA, RA, CANE) lowpass
+    gyro: 4Hz lowpass
+    See FILTER_CUTOFFS and filter_channels().
         
     Keyword arguments:
+    df -- DataFrame with the accel_labels and gyro_labels columns, modified in place
+    sensor_loc -- HIP, WALKER, LA, RA or CANE
+    fs -- sampling rate [Hz]
         
     '''
-    print "apply_filter(): sensor_loc " + sensor_loc
-    if sensor_loc == "HIP" or sensor_loc == "WALKER":         
-        B,A = signal.butter(4, 0.00388, 'highpass') # 0.1 Hz
-        D,C = signal.butter(4, 0.1171875, 'lowpass') # 3 HZ
-    elif sensor_loc == "LA" or sensor_loc == "RA" or sensor_loc == "CANE":
-        B,A = signal.butter(4, 0.00388, 'highpass')  # 0.1 Hz
-        D,C = signal.butter(4, 0.390625, 'lowpass')  # 10 Hz
-        
-    # Gyro filter lowpass cutoff at 4Hz (Tong and Granat 1999)
-    E, F = signal.butter(4, 0.15625, 'lowpass') # 4Hz => .15625
-    
-    for label in accel_labels:
-        ser = df[label]
-        high = signal.filtfilt(B, A, ser)
-        band = signal.filtfilt(D, C, high)
-        df[label] = band
-        
-    for label in gyro_labels:
-        ser = df[label]
-        low = signal.filtfilt(E, F, ser)
-        df[label] = low
+    profiling.debug("apply_filter_start", "apply_filter(): sensor_loc " + sensor_loc, sensor_loc=sensor_loc)
+    labels = accel_labels + gyro_labels
+    # one contiguous buffer per channel for filtering along the time axis
+    buf = load_buffer(df, labels, work_dtype())
+    filter_channels(buf, sensor_loc, fs)
+    df[labels] = buf
  
     return df
 
-def orient_shank(horiz_df, vert_df, df, sensor_loc):
+def compute_rotation_matrix(horiz_df, vert_df, sensor_loc):
     '''
-    Orient the shank sensors.
+    Compute the shank rotation matrix from the leg horizontal and leg
+    vertical calibration sections.
 
     Keyword arguments:
+    horiz_df -- the leg horizontal section
+    vert_df -- the leg vertical section
+    sensor_loc -- LA or RA, for the printout
 
     '''
-    print "**Orienting sensor location: " + sensor_loc + "**\n"
-    horiz_avg_norm = compute_avg_accel_norm(horiz_df)
-    print "Average horizontal norm: %.2lf" %(horiz_avg_norm)
-    vert_avg_norm = compute_avg_accel_norm(vert_df)
-    print "Average vertical norm: %.2lf\n" %(vert_avg_norm)
+    profiling.debug("orient_start", "**Orienting sensor location: " + sensor_loc + "**\n", sensor_loc=sensor_loc)
+    horiz_stats = compute_section_stats(horiz_df)
+    profiling.debug("section_norm", "Average horizontal norm: %.2lf (std %.3lf)" \
+                    %(horiz_stats.mean_norm, horiz_stats.norm_std), section="horizontal", \
+                    mean_norm=horiz_stats.mean_norm, norm_std=horiz_stats.norm_std)
+    vert_stats = compute_section_stats(vert_df)
+    profiling.debug("section_norm", "Average vertical norm: %.2lf (std %.3lf)\n" \
+                    %(vert_stats.mean_norm, vert_stats.norm_std), section="vertical", \
+                    mean_norm=vert_stats.mean_norm, norm_std=vert_stats.norm_std)
+    check_stillness(horiz_stats, "Horizontal")
+    check_stillness(vert_stats, "Vertical")
 
     # Orientation from local to body coordinate system
     # Chen (thesis) 2011 2.3.3 Mounting Calibration in 
     # Gait feature extraction from inertial body sensor networks for medical applications
-    x_horiz = np.mean(horiz_df["Wide Range Accelerometer X"] * -1)
-    y_horiz = np.mean(horiz_df["Wide Range Accelerometer Y"])
-    z_horiz = np.mean(horiz_df["Wide Range Accelerometer Z"])
+    g_prime = horiz_stats.axis_means * np.array([-1.0, 1.0, 1.0]) / horiz_stats.mean_norm
 
-    g_prime = np.array([x_horiz, y_horiz, z_horiz]) / horiz_avg_norm
-
-    x_vert = np.mean(vert_df["Wide Range Accelerometer X"])
-    y_vert = np.mean(vert_df["Wide Range Accelerometer Y"])
-    z_vert = np.mean(vert_df["Wide Range Accelerometer Z"])
-
-    Y_B = np.array([x_vert,y_vert,z_vert]) / vert_avg_norm
+    Y_B = vert_stats.axis_means / vert_stats.mean_norm
     Z_B = np.cross(Y_B, g_prime)
     X_B = np.cross(Y_B, Z_B)
     
-    print "G' vector: ",
-    print g_prime
-    print "X body vector: ",
-    print X_B
-    print "Y body vector: ",
-    print Y_B
-    print "Z body vector: ",
-    print Z_B
-
     rotation_mat = np.array([X_B, Y_B, Z_B]).transpose()
 
-    print "\nRotation matrix:"
-    print rotation_mat
-    print "\n"
+    profiling.debug("rotation_matrix", "G' vector:  %s\nX body vector:  %s\nY body vector:  %s\n" \
+                    "Z body vector:  %s\n\nRotation matrix:\n%s\n\n" %(g_prime, X_B, Y_B, Z_B, rotation_mat), \
+                    sensor_loc=sensor_loc, rotation_mat=rotation_mat.tolist())
     
+    return rotation_mat
+
+@profiling.profiled("orient")
+def orient_shank(horiz_df, vert_df, df, sensor_loc):
+    '''
+    Orient the shank sensors.
+
+    Keyword arguments:
+    horiz_df -- the leg horizontal section
+    vert_df -- the leg vertical section
+    df -- the data to orient
+    sensor_loc -- LA or RA
+
+    '''
+    rotation_mat = compute_rotation_matrix(horiz_df, vert_df, sensor_loc)
     accel = np.array([df["Wide Range Accelerometer X"], \
                       df["Wide Range Accelerometer Y"], \
                       df["Wide Range Accelerometer Z"]])
@@ -187,54 +521,121 @@ def orient_shank(horiz_df, vert_df, df, sensor_loc):
     
     return oriented_df
 
-def orient_COM(df):
+def is_signed_permutation(mat):
+    '''
+    True if every row and column of mat has a single entry of 1 or -1.
+
+    Keyword arguments:
+    mat -- 3x3 matrix
+
+    '''
+    nonzero = mat != 0
+    return bool(np.all(np.abs(mat[nonzero]) == 1) and np.all(nonzero.sum(axis=0) == 1) \
+                and np.all(nonzero.sum(axis=1) == 1))
+
+def remap_axes(df, mat):
+    '''
+    Apply a 3x3 axis mapping to the accel block and to the gyro block.
+    Returns a copy. Signed permutations (axis swaps) are applied by
+    indexing, so a missing value stays in its own channel; other rotations
+    are a matrix multiply per block, which never mixes accel and gyro.
+
+    Keyword arguments:
+    df -- the data to orient
+    mat -- 3x3 rotation or signed permutation, new = mat.orig
+
+    '''
+    mat = np.asarray(mat, dtype=np.float64)
+    oriented_df = df.copy()
+    for labels in [accel_labels, gyro_labels]:
+        values = df[labels].values
+        if is_signed_permutation(mat):
+            perm = np.abs(mat).argmax(axis=1)
+            oriented = values[:, perm] * mat[np.arange(3), perm]
+        else:
+            oriented = np.dot(values, mat.T)
+        for i, label in enumerate(labels):
+            oriented_df[label] = oriented[:, i]
+    
+    return oriented_df
+
+@profiling.profiled("orient")
+def orient_COM(df, verbose=True):
     '''
     Orient the COM sensor.
 
     Keyword arguments:
+    df -- the data to orient
+    verbose -- print the sensor location, off for the chunks of a
+               streamed file, which is announced once by the caller
 
     '''
-    print "**Orienting sensor location: COM**\n"
+    if verbose:
+        profiling.debug("orient_start", "**Orienting sensor location: COM**\n", sensor_loc="COM")
 
     # GS: swapping X and Z to align with the international society of biomechanics
     # where X is in the direction of travel (mounted backwards on COM, *-1)
     # Y is vertical
-    oriented_df = df.copy()
-    oriented_df["Gyroscope X"] = df["Gyroscope Z"] * -1
-    oriented_df["Gyroscope Y"] = df["Gyroscope Y"]
-    oriented_df["Gyroscope Z"] = df["Gyroscope X"]
-    
-    oriented_df["Wide Range Accelerometer X"] = df["Wide Range Accelerometer Z"] * -1
-    oriented_df["Wide Range Accelerometer Y"] = df["Wide Range Accelerometer Y"]
-    oriented_df["Wide Range Accelerometer Z"] = df["Wide Range Accelerometer X"]
-    
-    return oriented_df
+    return remap_axes(df, COM_ROTATION)
 
-def orient_assistive_device(df, axes_df):
+@profiling.profiled("orient")
+def orient_assistive_device(df, axes_df, verbose=True):
     '''
     Orient the assistive device sensor.
 
     Keyword arguments:
+    df -- the data to orient
+    axes_df -- the session's DEV_axes.txt or its axes_matrix()
+    verbose -- print the sensor location, off for the chunks of a
+               streamed file, which is announced once by the caller
 
     '''
-    print "**Orienting sensor location: DEV**\n"
+    if verbose:
+        profiling.debug("orient_start", "**Orienting sensor location: DEV**\n", sensor_loc="DEV")
 
     # GS: swapping X and Z to align with the international society of biomechanics
     # where X is in the direction of travel
     # Y is vertical
-    oriented_df = df.copy()
-    oriented_df["Gyroscope X"] = df["Gyroscope " + axes_df.ix["X"]["orig"]] * axes_df.ix["X"]["modifier"]
-    oriented_df["Gyroscope Y"] = df["Gyroscope " + axes_df.ix["Y"]["orig"]] * axes_df.ix["Y"]["modifier"]
-    oriented_df["Gyroscope Z"] = df["Gyroscope " + axes_df.ix["Z"]["orig"]] * axes_df.ix["Y"]["modifier"]
+    if isinstance(axes_df, pd.DataFrame):
+        axes_df = axes_matrix(axes_df)
+    return remap_axes(df, axes_df)
+
+def axes_matrix(axes_df):
+    '''
+    Compile an axes file into the signed permutation matrix applied to both
+    the accel and the gyro channels.
+
+    Keyword arguments:
+    axes_df -- the session's DEV_axes.txt, indexed by the new axis with
+               the orig axis and a modifier (1 or -1)
+
+    '''
+    # files written as "new, orig, modifier" have padded names
+    axes_df = axes_df.rename(columns=lambda col: str(col).strip(), index=lambda axis: str(axis).strip())
+    mat = np.zeros((3, 3))
+    for row, axis in enumerate(["X", "Y", "Z"]):
+        col = ["X", "Y", "Z"].index(str(axes_df.loc[axis]["orig"]).strip())
+        mat[row, col] = float(axes_df.loc[axis]["modifier"])
+    if not np.all(np.abs(mat).sum(axis=0) == 1) or not np.all(np.abs(mat).sum(axis=1) == 1):
+        raise ValueError("axes file does not map each axis once:\n%s" %(axes_df))
     
-    oriented_df["Wide Range Accelerometer X"] = \
-        df["Wide Range Accelerometer " + axes_df.ix["X"]["orig"]] * axes_df.ix["X"]["modifier"]
-    oriented_df["Wide Range Accelerometer Y"] = \
-        df["Wide Range Accelerometer " + axes_df.ix["Y"]["orig"]] * axes_df.ix["Y"]["modifier"]
-    oriented_df["Wide Range Accelerometer Z"] = \
-        df["Wide Range Accelerometer " + axes_df.ix["Z"]["orig"]] * axes_df.ix["Z"]["modifier"]
+    return mat
+
+def compile_axes(axes_fname):
+    '''
+    The axes_matrix() of an axes file. Compiled matrices are cached per
+    file, so each file is only parsed once while it is unchanged.
+
+    Keyword arguments:
+    axes_fname -- the session's DEV_axes.txt
+
+    '''
+    st = os.stat(axes_fname)
+    key = (os.path.abspath(axes_fname), st.st_size, st.st_mtime)
+    if key not in _axes_matrices:
+        _axes_matrices[key] = axes_matrix(pd.read_csv(axes_fname, header=0, index_col=0, skipinitialspace=True))
     
-    return oriented_df
+    return _axes_matrices[key]
 
 def choose_subsection(ind_list):
     '''
@@ -243,35 +644,70 @@ def choose_subsection(ind_list):
     Keyword arguments:
 
     '''
+    lookup = TimestampLookup(ind_list)
     horiz_start = float(raw_input("Enter the leg horizontal start time: "))
     horiz_end = float(raw_input("Enter the leg horizontal end time: "))
-    horiz_start = closest_timestamp(ind_list, horiz_start)
-    horiz_end = closest_timestamp(ind_list, horiz_end)
+    horiz_start, horiz_end = lookup.nearest([horiz_start, horiz_end])
     print "Leg horizontal start: %lf" %(horiz_start)
     print "Leg horizontal end: %lf" %(horiz_end)
     
     vert_start = float(raw_input("Enter the leg vertical start time: "))
     vert_end = float(raw_input("Enter the leg vertical end time: "))
-    vert_start = closest_timestamp(ind_list, vert_start)
-    vert_end = closest_timestamp(ind_list, vert_end)
+    vert_start, vert_end = lookup.nearest([vert_start, vert_end])
     print "Leg vertical start: %lf" %(vert_start)
     print "Leg  end: %lf" %(vert_end)
     
     return (horiz_start, horiz_end, vert_start, vert_end)
 
 def get_user_defined_sections(fname, notes_fname, section_plot_fname, \
-                              horiz_df_fname, vert_df_fname, df, sensor_loc):
+                              horiz_df_fname, vert_df_fname, df, sensor_loc, headless=False):
     '''
     Orient and filter the shank sensors.
 
     Keyword arguments:
+    headless -- replay the section times saved in notes_fname without
+                plotting; if none were saved the sections are detected
+                automatically. Headless mode never prompts: a detection
+                confidence below detect.AUTO_CONFIDENCE_MIN saves the
+                candidates in the notes and raises NeedsReview, and an
+                interactive run proposes them first. The section plot is
+                saved off-screen (see qc_plot).
 
     '''
     labels = ["Horiz", "Vert"]
-    response = 'n'
+    section_times = read_notes(notes_fname, df.index) if headless else None
+    if section_times is not None:
+        profiling.debug("replay", "Replaying saved section times from " + notes_fname, notes=notes_fname)
+        horiz_df = df[section_times[0]:section_times[1]]
+        vert_df = df[section_times[2]:section_times[3]]
+        if binary_io.existing(horiz_df_fname) is None:
+            write_data(fname, horiz_df_fname, horiz_df)
+        if binary_io.existing(vert_df_fname) is None:
+            write_data(fname, vert_df_fname, vert_df)
+        if not os.path.isfile(section_plot_fname):
+            qc_plot.save_acceleration_plot(df, sensor_loc, section_plot_fname, section_times, labels)
+        return horiz_df, vert_df
+    
+    confidence = None
+    if headless:
+        section_times, confidence = detect.detect_static_sections(df[accel_labels].values, \
+                                                                  df.index, SHIMMER_FS)
+        profiling.debug("detected", "Detected sections with confidence %.2lf" %(confidence), \
+                        confidence=confidence)
+        if confidence < detect.AUTO_CONFIDENCE_MIN:
+            save_review(notes_fname, section_times, labels, confidence, df, sensor_loc, section_plot_fname)
+            raise NeedsReview("%s sections detected with confidence %.2lf, review %s" \
+                              %(sensor_loc, confidence, notes_fname))
+    
+    response = 'n' if section_times is None else 'y'
+    section_times = read_review(notes_fname, df.index) if section_times is None else section_times
+    if section_times is not None and response == 'n':
+        print "Proposing the detected section times saved for review in " + notes_fname
+        plot_acceleration_data(df, sensor_loc, section_plot_fname, section_times, labels)
+        response = raw_input("Are these sections correct?: Y/N\n")
     while response != ('y' or 'yes' or 'Y'):
         plot_acceleration_data(df, sensor_loc)
-        section_times = choose_subsection(df.index.tolist())
+        section_times = choose_subsection(df.index)
         
         plot_acceleration_data(df, sensor_loc, section_plot_fname, section_times, labels)
         response = raw_input("Are these sections correct?: Y/N\n")    
@@ -279,9 +715,11 @@ def get_user_defined_sections(fname, notes_fname, section_plot_fname, \
     horiz_df = df[section_times[0]:section_times[1]]
     vert_df = df[section_times[2]:section_times[3]]
     
-    write_notes(notes_fname, section_times, labels)
+    write_notes(notes_fname, section_times, labels, confidence)
     write_data(fname, horiz_df_fname, horiz_df)
     write_data(fname, vert_df_fname, vert_df)
+    if headless:
+        qc_plot.save_acceleration_plot(df, sensor_loc, section_plot_fname, section_times, labels)
     
     return horiz_df, vert_df
 
@@ -292,49 +730,119 @@ def choose_trial_subsection(ind_list):
     Keyword arguments:
 
     '''
+    lookup = TimestampLookup(ind_list)
     start = float(raw_input("Enter the first trial start time: "))
     end = float(raw_input("Enter the first trial end time: "))
     # COM start time is taking to be the literally start time i.e. time 0
-    start = closest_timestamp(ind_list, start)
+    start = lookup.nearest(start)
     # add an offset to the end to accomodate META file times
-    end = closest_timestamp(ind_list, end + TS_OFFSET)
+    end = lookup.nearest(end, offset=TS_OFFSET)
     print "First trial start: %lf" %(start)
     print "First trial end: %lf" %(end)
     
     start2 = float(raw_input("Enter the second trial start time: "))
     end2 = float(raw_input("Enter the second trial end time: "))
-    start2 = closest_timestamp(ind_list, start2)
-    end2 = closest_timestamp(ind_list, end2 + TS_OFFSET)
+    start2 = lookup.nearest(start2)
+    end2 = lookup.nearest(end2, offset=TS_OFFSET)
     print "Second trial start: %lf" %(start2)
     print "Second trial end: %lf" %(end2)
     
     return (start, end, start2, end2)
 
+def detect_trial_times(df, fs=SHIMMER_FS):
+    '''
+    Propose the trial times from the filtered HIP data with the same
+    TS_OFFSET handling as choose_trial_subsection(). Returns (trial_times,
+    confidence), trial_times is None if two trials could not be found.
+
+    Keyword arguments:
+    df -- the oriented and filtered HIP data
+    fs -- sampling rate [Hz]
+
+    '''
+    trial_times, confidence = detect.detect_trials(df[accel_labels].values, df.index, fs)
+    if trial_times is None:
+        return None, confidence
+    
+    lookup = TimestampLookup(df.index)
+    start, start2 = lookup.nearest([trial_times[0], trial_times[2]])
+    # add an offset to the end to accomodate META file times
+    end, end2 = lookup.nearest([trial_times[1], trial_times[3]], offset=TS_OFFSET)
+    
+    return (start, end, start2, end2), confidence
 
 def get_user_defined_trial_times(fname, notes_fname, chopped_plot_fname, \
-                                 chopped_df_fname, chopped_df_fname2):
+                                 chopped_df_fname, chopped_df_fname2, headless=False):
     '''
     Chop the files into the trials.
 
     Keyword arguments:
+    headless -- replay the trial times saved in notes_fname without
+                plotting; if none were saved the trials are detected
+                automatically, and a detection confidence below
+                detect.AUTO_CONFIDENCE_MIN raises NeedsReview
+
+    '''
+    df = read_shimmer(fname)
+    section_times = choose_trial_times(df, notes_fname, chopped_plot_fname, headless)
+        
+    chopped_df = df[section_times[0]:section_times[1]]
+    chopped_df2 = df[section_times[2]:section_times[3]]
+    
+    write_data(fname, chopped_df_fname, chopped_df)
+    write_data(fname, chopped_df_fname2, chopped_df2)
+    
+    return section_times
+
+def choose_trial_times(df, notes_fname, chopped_plot_fname, headless=False):
+    '''
+    Get the trial times of the HIP data: replayed from notes_fname, detected
+    or entered by the user (see get_user_defined_trial_times()). New times
+    are saved to notes_fname. Headless mode never prompts: a detection below
+    detect.AUTO_CONFIDENCE_MIN is saved as candidates and NeedsReview is
+    raised. An interactive run proposes saved candidates first.
+
+    Keyword arguments:
+    df -- the oriented and filtered HIP data
+    notes_fname -- the chopping notes
+    chopped_plot_fname -- where the plot of the chosen trials is saved
+    headless -- replay or detect the times, the plot is saved off-screen
 
     '''
     labels = ["T1", "T2"]
-    df = pd.read_csv(fname, skiprows=[0, 2, 3], header=0, index_col=0)
-    response = 'n'
+    section_times = read_notes(notes_fname, df.index) if headless else None
+    if section_times is not None:
+        profiling.debug("replay", "Replaying saved trial times from " + notes_fname, notes=notes_fname)
+        if not os.path.isfile(chopped_plot_fname):
+            qc_plot.save_acceleration_plot(df, "HIP", chopped_plot_fname, section_times, labels)
+        return section_times
+    
+    confidence = None
+    if headless:
+        section_times, confidence = detect_trial_times(df)
+        profiling.debug("detected", "Detected trials with confidence %.2lf" %(confidence), \
+                        confidence=confidence)
+        if confidence < detect.AUTO_CONFIDENCE_MIN:
+            save_review(notes_fname, section_times, labels, confidence, df, "HIP", chopped_plot_fname)
+            raise NeedsReview("trial times detected with confidence %.2lf, review %s" \
+                              %(confidence, notes_fname))
+    
+    response = 'n' if section_times is None else 'y'
+    section_times = read_review(notes_fname, df.index) if section_times is None else section_times
+    if section_times is not None and response == 'n':
+        print "Proposing the detected trial times saved for review in " + notes_fname
+        plot_acceleration_data(df, "HIP", chopped_plot_fname, section_times, labels)
+        response = raw_input("Are these sections correct?: Y/N\n")
     while response != ('y' or 'yes' or 'Y'):
         plot_acceleration_data(df, "HIP")
-        section_times = choose_trial_subsection(df.index.tolist())
+        section_times = choose_trial_subsection(df.index)
         
         plot_acceleration_data(df, "HIP", chopped_plot_fname, section_times, labels)
         response = raw_input("Are these sections correct?: Y/N\n")    
-        
-    chopped_df = df[section_times[0]:section_times[1]]
-    chopped_df2 = df[section_times[2]:section_times[3]]
     
-    write_notes(notes_fname, section_times, labels)
-    write_data(fname, chopped_df_fname, chopped_df)
-    write_data(fname, chopped_df_fname2, chopped_df2)
+    write_notes(notes_fname, section_times, labels, confidence)
+    if headless:
+        qc_plot.save_acceleration_plot(df, "HIP", chopped_plot_fname, section_times, labels)
     
     return section_times
 
@@ -345,21 +853,31 @@ def chop_dependent_data(loc_fname, chopped_df_fname, chopped_df_fname2, trial_ti
     Keyword arguments:
 
     '''
-    df = pd.read_csv(loc_fname, skiprows=[0, 2, 3], header=0, index_col=0)
-    ind_list = df.index
-    
-    # add an offset before COM start in order to account for nearest timestamps coming before start
-    start = closest_timestamp(ind_list, trial_times[0] - TS_OFFSET)
-    end = closest_timestamp(ind_list, trial_times[1])
-    start2 = closest_timestamp(ind_list, trial_times[2] - TS_OFFSET)
-    end2 = closest_timestamp(ind_list, trial_times[3])
-    
-    first_trial_df = df[start:end]
-    second_trial_df = df[start2:end2]
+    df = read_shimmer(loc_fname)
+    first_trial_df, second_trial_df = chop_trials(df, trial_times)
     
     write_data(loc_fname, chopped_df_fname, first_trial_df)
     write_data(loc_fname, chopped_df_fname2, second_trial_df)
     
+@profiling.profiled("chop")
+def chop_trials(df, trial_times):
+    '''
+    Slice the two trials out of a dependent sensor's data given the COM trial times.
+
+    Keyword arguments:
+    df -- the dependent sensor's data
+    trial_times -- (start, end, start2, end2) of the COM trials
+
+    '''
+    lookup = TimestampLookup(df.index)
+    
+    # add an offset before COM start in order to account for nearest timestamps coming before start
+    start, start2 = lookup.nearest([trial_times[0], trial_times[2]], offset=-TS_OFFSET)
+    end, end2 = lookup.nearest([trial_times[1], trial_times[3]])
+    
+    return df[start:end], df[start2:end2]
+    
+@profiling.profiled("plot")
 def plot_acceleration_data(df, sensor_loc, fname=None, section_times=None, labels=None):
     '''
     Plot the acceleration so the user can find the horiz and vert sections.
@@ -388,6 +906,7 @@ def plot_acceleration_data(df, sensor_loc, fname=None, section_times=None, label
         plt.savefig(fname)
     plt.show()   
     
+@profiling.profiled("plot")
 def plot_oriented_filtered_data(df, oriented_df, oriented_filtered_df, sensor_loc):
     '''
     Plot the final oriented and filtered data.
@@ -439,52 +958,266 @@ def plot_oriented_filtered_data(df, oriented_df, oriented_filtered_df, sensor_lo
     
     plt.show()
     
-def write_notes(fname, section_times, labels):
+def write_notes(fname, section_times, labels, confidence=None, review=False):
     '''
-    Write the horiz and vert sections timestamps for record.
+    Write the horiz and vert sections timestamps for record. Times that were
+    detected automatically, not chosen by the operator, are marked as such
+    in the notes and in the json sidecar. Times saved for review are only
+    candidates, read_notes() does not replay them (see read_review()).
 
     Keyword arguments:
+    fname -- the notes file
+    section_times -- (start, end, start2, end2)
+    labels -- the names of the two sections
+    confidence -- the detection confidence, None if the operator chose the times
+    review -- the times are candidates the operator still has to confirm
 
     '''
-    print "Saving section times..."
-    print labels[0] + " [%lf:%lf]" %(section_times[0], section_times[1])
-    print labels[1] + "Vertical [%lf:%lf]" %(section_times[2], section_times[3])
+    profiling.debug("save_notes", "Saving section times...\n" + \
+                    labels[0] + " [%lf:%lf]\n" %(section_times[0], section_times[1]) + \
+                    labels[1] + "Vertical [%lf:%lf]" %(section_times[2], section_times[3]), \
+                    notes=fname, section_times=[float(t) for t in section_times])
     
     fout = open(fname, "w")
     fout.write(labels[0] + " [%lf:%lf]\n" %(section_times[0], section_times[1]))
     fout.write(labels[1] + "Vertical [%lf:%lf]" %(section_times[2], section_times[3]))
+    if confidence is not None:
+        fout.write("\nDetected automatically (confidence %.2lf), not chosen by the operator" %(confidence))
+    if review:
+        fout.write("\n" + NEEDS_REVIEW_NOTE)
+    fout.close()
+    
+    # exact times for headless replay, see read_notes()
+    if review:
+        source = "needs_review"
+    else:
+        source = "operator" if confidence is None else "detected"
+    fout = open(notes_sidecar_fname(fname), "w")
+    json.dump({"labels": labels, "section_times": [float(t) for t in section_times], \
+               "source": source, "confidence": confidence}, fout)
     fout.close()
+
+def save_review(notes_fname, section_times, labels, confidence, df, sensor_loc, plot_fname):
+    '''
+    Save low confidence detected times as candidates for the operator: in
+    the notes, marked as needing review, with the plot saved off-screen.
+    Nothing is saved if nothing was detected.
+
+    Keyword arguments:
+    notes_fname -- the notes file
+    section_times -- the detected (start, end, start2, end2), or None
+    labels -- the names of the two sections
+    confidence -- the detection confidence
+    df -- the data the times were detected in
+    sensor_loc -- the sensor location, used in the plot title
+    plot_fname -- where the plot of the candidates is saved
+
+    '''
+    if section_times is None:
+        profiling.debug("review", "Nothing detected to save for review in " + notes_fname, notes=notes_fname)
+        return
+    write_notes(notes_fname, section_times, labels, confidence, review=True)
+    qc_plot.save_acceleration_plot(df, sensor_loc, plot_fname, section_times, labels)
+
+def notes_sidecar_fname(fname):
+    '''
+    The json sidecar written next to a notes file, e.g. LA_notes.json.
+
+    Keyword arguments:
+    fname -- the notes file
+
+    '''
+    return os.path.splitext(fname)[0] + ".json"
+
+def gap_report_fname(fname):
+    '''
+    The resampling gap report written next to an output, e.g.
+    HIP_oriented_filtered_gaps.json (see resample.py).
+
+    Keyword arguments:
+    fname -- the output csv
+
+    '''
+    return os.path.splitext(fname)[0] + "_gaps.json"
+
+def read_notes(fname, ind_list=None, review=False):
+    '''
+    Read the section times saved by write_notes(). The json sidecar is used
+    if present, otherwise the two [start:end] ranges are parsed from the notes
+    text. Returns None if nothing was saved, or if the times were saved for
+    review and not yet confirmed.
+
+    Keyword arguments:
+    fname -- the notes file
+    ind_list -- optional sensor index, times are snapped to its nearest values
+                since the notes text only keeps 6 decimals
+    review -- return only times saved for review instead
+
+    '''
+    sidecar_fname = notes_sidecar_fname(fname)
+    if os.path.isfile(sidecar_fname):
+        fin = open(sidecar_fname, "r")
+        sidecar = json.load(fin)
+        fin.close()
+        if (sidecar.get("source") == "needs_review") != review:
+            return None
+        section_times = sidecar["section_times"]
+    elif os.path.isfile(fname):
+        fin = open(fname, "r")
+        text = fin.read()
+        fin.close()
+        ranges = re.findall(r"\[([^:\]]+):([^\]]+)\]", text)
+        if len(ranges) != 2 or (NEEDS_REVIEW_NOTE in text) != review:
+            return None
+        section_times = [float(t) for pair in ranges for t in pair]
+    else:
+        return None
+    
+    if ind_list is not None:
+        section_times = TimestampLookup(ind_list).nearest(section_times)
+    
+    return tuple(section_times)
+
+def read_review(fname, ind_list=None):
+    '''
+    The candidate times saved for review by save_review(), or None.
+
+    Keyword arguments:
+    fname -- the notes file
+    ind_list -- optional sensor index, times are snapped to its nearest values
+
+    '''
+    return read_notes(fname, ind_list, review=True)
+    
+@profiling.profiled("read")
+def read_shimmer(fname, use_cache=True):
+    '''
+    Read a Shimmer csv. Row 0 is device name, row 1 is signal name,
+    row 2 is Raw or Cal, row 3 is units. Parsed raw sensor recordings are
+    kept in an on-disk cache next to the source (see shimmer_cache.py).
+    Outputs that were written in the binary format are read from it (see
+    binary_io.py). In float32 precision the channels are parsed straight
+    into float32, and cached or binary float64 data is cast from its memory
+    map, so no float64 copy is held; the index stays float64.
+
+    Keyword arguments:
+    fname -- the Shimmer csv
+    use_cache -- load from and store to the cache
+
+    '''
+    use_cache = use_cache and shimmer_cache.is_cached_source(fname)
+    dtype = work_dtype()
+    if not os.path.isfile(fname) and binary_io.existing(fname) is not None:
+        return as_work_dtype(binary_io.read(fname, dtype=dtype))
+    if use_cache:
+        df = shimmer_cache.load(fname, dtype)
+        if df is not None:
+            return as_work_dtype(df)
+    
+    # columns by position, 0 is the index
+    n_columns = read_header(fname)[1].count(",") + 1
+    col_dtypes = None if dtype == np.float64 else dict((i, dtype) for i in range(1, n_columns))
+    df = pd.read_csv(fname, skiprows=[0, 2, 3], header=0, index_col=0, dtype=col_dtypes)
+    if use_cache:
+        try:
+            shimmer_cache.store(fname, df, read_header(fname))
+        except (IOError, OSError) as e:
+            profiling.debug("cache_error", "read_shimmer(): could not cache %s: %s" %(fname, e), \
+                            fname=fname, error=str(e))
+    
+    return as_work_dtype(df)
+
+def as_work_dtype(df):
+    '''
+    df with its float channels cast to work_dtype(), or df itself if they
+    already are or the precision is float64.
+
+    Keyword arguments:
+    df -- the recording
+
+    '''
+    dtype = work_dtype()
+    cast = dict((col, dtype) for col, col_dtype in df.dtypes.iteritems() if col_dtype == np.float64)
+    if dtype == np.float64 or not cast:
+        return df
     
-def write_data(orig_fname, section_fname, df):
+    return df.astype(cast)
+
+def read_header(orig_fname):
     '''
-    Write the horiz and vert sections for record.
+    Read the 4-line Shimmer header: device name, signal name, Raw or Cal, units.
 
     Keyword arguments:
+    orig_fname -- the Shimmer csv to read the header from
 
     '''
-    # read in the original header
+    if not os.path.isfile(orig_fname) and binary_io.existing(orig_fname) is not None:
+        return binary_io.read_header(orig_fname)
     fin = open(orig_fname, "r")
+    header = [fin.readline() for _ in range(4)]
+    fin.close()
+    
+    return header
+
+@profiling.profiled("write_data")
+def write_data(orig_fname, section_fname, df, float_format=None, chunk_rows=WRITE_CHUNK_ROWS):
+    '''
+    Write the horiz and vert sections for record. The header is copied from the
+    original file and the rows are formatted and written in blocks of chunk_rows.
+    With the default float_format the output is byte-identical to str() on each
+    value joined by ", ". If binary_io.output_format() is not "csv" the
+    binary files are written in place of section_fname. An older output of
+    the other format is removed so it is not read instead, and so is an
+    older gap report, which the caller writes again if it resampled.
+
+    Keyword arguments:
+    orig_fname -- the Shimmer csv to copy the header from
+    section_fname -- the output file
+    df -- the data to write
+    float_format -- optional printf format for the data values, e.g. "%.6f"
+    chunk_rows -- number of rows formatted per block
+
+    '''
+    header = read_header(orig_fname)
+    if os.path.isfile(gap_report_fname(section_fname)):
+        os.remove(gap_report_fname(section_fname))
+    if binary_io.output_format() != "csv":
+        if os.path.isfile(section_fname):
+            os.remove(section_fname)
+        binary_io.write(section_fname, df, header, binary_io.OUTPUT_DTYPES[binary_io.output_format()])
+        return
+    binary_io.remove(section_fname)
     fout = open(section_fname, "w")
     # write out the original header
-    fout.write(fin.readline())
-    fout.write(fin.readline())
-    fout.write(fin.readline())
-    fout.write(fin.readline())
-    fin.close()
+    fout.writelines(header)
     
     # write out the orientation sections
-    index = df.index.tolist()
-    for i in range(len(index)):
-        fout.write(str(index[i]))
-        fout.write(", ")
-        
-        row = df.iloc[i].tolist()
-        for j in range(len(row) - 1):
-            fout.write(str(row[j]))
-            fout.write(", ")
-        fout.write(str(row[len(row) - 1]))
-        fout.write("\n")
+    write_rows(fout, df, float_format, chunk_rows)
     fout.close()
+
+def write_rows(fout, df, float_format=None, chunk_rows=WRITE_CHUNK_ROWS):
+    '''
+    Write the rows of df to an open file in the write_data() format.
+
+    Keyword arguments:
+    fout -- the open output file
+    df -- the data to write
+    float_format -- optional printf format for the data values, e.g. "%.6f"
+    chunk_rows -- number of rows formatted per block
+
+    '''
+    index = df.index.tolist()
+    values = df.values
+    ncols = values.shape[1]
+    cell_fmt = "%s" if float_format is None else float_format
+    row_fmt = "%s, " + ", ".join([cell_fmt] * ncols) + "\n"
+    for start in range(0, len(index), chunk_rows):
+        stop = min(start + chunk_rows, len(index))
+        # python objects so that "%s" formats exactly like str()
+        block = np.empty((stop - start, ncols + 1), dtype=object)
+        block[:, 0] = index[start:stop]
+        block[:, 1:] = values[start:stop].tolist()
+        fout.write((row_fmt * (stop - start)) % tuple(block.ravel()))
     
     
     
\ No newline at end of file
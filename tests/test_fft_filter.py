@@ -0,0 +1,82 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- test_fft_filter.py
+Created on Oct 17, 2026
+
+The fft filtering engine stays within utils.FFT_FILTER_TOLERANCE of
+sosfiltfilt on a synthetic recording.
+
+Usage:
+python -m unittest discover -s tests
+
+Dependencies:
+numpy, pandas, scipy
+'''
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+# the modules import each other by name from src
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src"), ROOT]
+
+import synthetic
+import utils
+
+# 20 minutes is several fft blocks plus both edge sections
+DURATION_SEC = 20 * 60
+
+class FFTEngineTest(unittest.TestCase):
+    '''
+    filter_channels() with the fft engine against the sos engine.
+
+    '''
+    @classmethod
+    def setUpClass(cls):
+        path = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(path, "HIP.csv")
+            synthetic.generate(fname, DURATION_SEC)
+            df = utils.read_shimmer(fname, use_cache=False)
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+        cls.buf = utils.load_buffer(df, utils.accel_labels + utils.gyro_labels, np.float64)
+
+    def filtered(self, sensor_loc, engine, rows=None):
+        buf = np.array(self.buf[:rows], order='F')
+        return utils.filter_channels(buf, sensor_loc, engine=engine, workers=1)
+
+    def test_deviation_within_tolerance(self):
+        for sensor_loc in ["HIP", "LA"]:
+            ref = self.filtered(sensor_loc, "sos")
+            deviation = (np.abs(self.filtered(sensor_loc, "fft") - ref).max(axis=0) \
+                         / np.abs(ref).max(axis=0)).max()
+            self.assertLessEqual(deviation, utils.FFT_FILTER_TOLERANCE, sensor_loc)
+
+    def test_short_buffer_falls_back_to_sos(self):
+        rows = 1000
+        self.assertTrue(np.array_equal(self.filtered("HIP", "fft", rows), self.filtered("HIP", "sos", rows)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+'''
+Copyright (C) 2015 Gina L. Sprint
+Email: Gina Sprint <gsprint@eecs.wsu.edu>
+
+This file is part of sensor_data_preprocessing.
+
+sensor_data_preprocessing is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+sensor_data_preprocessing is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of 
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the 
+GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License
+along with sensor_data_preprocessing.  If not, see <http://www.gnu.org/licenses/>.
+
+OrientationFiltering --- test_precision.py
+Created on Oct 17, 2026
+
+The float32 working precision stays within utils.FLOAT32_TOLERANCE of
+float64 on a synthetic recording.
+
+Usage:
+python -m unittest discover -s tests
+
+Dependencies:
+numpy, pandas, scipy
+'''
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# the modules import each other by name from src
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src"), ROOT]
+
+import benchmark
+import synthetic
+import utils
+
+# 20 minutes covers every segment kind of synthetic.default_segments()
+DURATION_SEC = 20 * 60
+
+class PrecisionTest(unittest.TestCase):
+    '''
+    float32 orient and filter output against float64.
+
+    '''
+    @classmethod
+    def setUpClass(cls):
+        cls.path = tempfile.mkdtemp()
+        cls.fname = os.path.join(cls.path, "LA.csv")
+        synthetic.generate(cls.fname, DURATION_SEC)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path, ignore_errors=True)
+
+    def test_deviation_within_tolerance(self):
+        for sensor_loc in ["LA", "HIP"]:
+            deviation = benchmark.precision_deviation(self.fname, sensor_loc)
+            self.assertLessEqual(deviation, utils.FLOAT32_TOLERANCE, sensor_loc)
+
+    def test_check_precision_raises_above_tolerance(self):
+        self.assertRaises(ValueError, benchmark.check_precision, self.fname, "LA", 0.0)
+
+    def test_precision_restored(self):
+        precision = utils._precision
+        benchmark.precision_deviation(self.fname)
+        self.assertEqual(utils._precision, precision)
+
+if __name__ == '__main__':
+    unittest.main()